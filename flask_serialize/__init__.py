@@ -14,6 +14,33 @@
 
 
 from .flask_serialize import FlaskSerializeMixin, FlaskSerialize
+from .instrumentation import (
+    FlaskSerializeMemoryExporter,
+    FlaskSerializeOpenTelemetryExporter,
+    FlaskSerializeProfiler,
+    FlaskSerializeQueryCounter,
+    FlaskSerializeQueryCountExceeded,
+    FlaskSerializeQueryCountWarning,
+    FlaskSerializeServerTiming,
+    FlaskSerializeSpan,
+    FlaskSerializeSpanExporter,
+    FlaskSerializeTracer,
+)
+from .properties import fs_cached_property
 
-__all__ = ("FlaskSerializeMixin", "FlaskSerialize")
+__all__ = (
+    "FlaskSerializeMixin",
+    "FlaskSerialize",
+    "FlaskSerializeMemoryExporter",
+    "FlaskSerializeOpenTelemetryExporter",
+    "FlaskSerializeProfiler",
+    "FlaskSerializeQueryCounter",
+    "FlaskSerializeQueryCountExceeded",
+    "FlaskSerializeQueryCountWarning",
+    "FlaskSerializeServerTiming",
+    "FlaskSerializeSpan",
+    "FlaskSerializeSpanExporter",
+    "FlaskSerializeTracer",
+    "fs_cached_property",
+)
 __package__ = "flask_serialize"
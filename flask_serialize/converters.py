@@ -0,0 +1,322 @@
+import re
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from types import MappingProxyType
+
+# ISO 8601 variants fromisoformat does not accept on older Pythons, ie: Z suffix,
+# more than 6 fractional digits, +hhmm offsets
+_ISO_DATETIME = re.compile(
+    r"(\d{4})-(\d{2})-(\d{2})"
+    r"(?:[T ](\d{2}):(\d{2})(?::(\d{2})(?:[.,](\d{1,6})\d*)?)?)?"
+    r"\s*(Z|[+-]\d{2}(?::?\d{2})?)?$"
+)
+_ISO_TIME = re.compile(
+    r"(\d{2}):(\d{2})(?::(\d{2})(?:[.,](\d{1,6})\d*)?)?\s*(Z|[+-]\d{2}(?::?\d{2})?)?$"
+)
+
+
+def _utc_naive(value):
+    """
+    convert a timezone aware datetime to naive UTC, as stored by __fs_timestamp_stamper__
+    """
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _offset(text: str):
+    if not text:
+        return None
+    if text == "Z":
+        return timezone.utc
+    sign = -1 if text[0] == "-" else 1
+    digits = text[1:].replace(":", "")
+    return timezone(
+        sign * timedelta(hours=int(digits[:2]), minutes=int(digits[2:4] or 0))
+    )
+
+
+def _from_isoformat(value: str):
+    return datetime.fromisoformat(value)
+
+
+def _from_pattern(value: str):
+    match = _ISO_DATETIME.match(value)
+    if not match:
+        raise ValueError(f"not ISO 8601: {value}")
+    year, month, day, hour, minute, second, fraction, offset = match.groups()
+    return datetime(
+        int(year),
+        int(month),
+        int(day),
+        int(hour or 0),
+        int(minute or 0),
+        int(second or 0),
+        int((fraction or "0").ljust(6, "0")),
+        _offset(offset),
+    )
+
+
+def _time_from_isoformat(value: str):
+    return time.fromisoformat(value)
+
+
+def _time_from_pattern(value: str):
+    match = _ISO_TIME.match(value)
+    if not match:
+        # a full date and time
+        return _from_pattern(value).timetz()
+    hour, minute, second, fraction, offset = match.groups()
+    return time(
+        int(hour),
+        int(minute),
+        int(second or 0),
+        int((fraction or "0").ljust(6, "0")),
+        _offset(offset),
+    )
+
+
+class FsDateParser:
+    """
+    parse ISO 8601 strings from forms or JSON for a DATETIME, DATE or TIME column.
+    Tries the parser that last succeeded for this column first, then datetime.fromisoformat
+    and then a precompiled pattern.  Timezone aware values become naive UTC.
+    """
+
+    __slots__ = ("kind", "parsers", "last")
+
+    def __init__(self, kind: str = "datetime"):
+        """
+        :param kind: datetime, date or time
+        """
+        if kind not in ("datetime", "date", "time"):
+            raise ValueError(f"kind must be datetime, date or time not: {kind}")
+        self.kind = kind
+        if kind == "time":
+            self.parsers = (_time_from_isoformat, _time_from_pattern)
+        else:
+            self.parsers = (_from_isoformat, _from_pattern)
+        self.last = self.parsers[0]
+
+    @classmethod
+    def for_column_type(cls, c_type: str):
+        """
+        parser for a column type name
+
+        :param c_type: ie: DATETIME, DATE, TIME, TIMESTAMP
+        :return: FsDateParser or None when not a date or time column
+        """
+        if c_type == "DATE":
+            return cls("date")
+        if c_type == "TIME":
+            return cls("time")
+        if c_type.startswith("DATE") or c_type.startswith("TIMESTAMP"):
+            return cls("datetime")
+        return None
+
+    def _result(self, value):
+        if self.kind == "time":
+            if isinstance(value, datetime):
+                value = _utc_naive(value).time()
+            elif value.tzinfo is not None:
+                value = value.replace(tzinfo=None)
+            return value
+        value = _utc_naive(value)
+        if self.kind == "date" and isinstance(value, datetime):
+            return value.date()
+        return value
+
+    def __call__(self, value):
+        """
+        convert value
+
+        :param value: str, datetime, date or time
+        :return: datetime, date or time as per kind
+        :throws: Exception when value is not ISO 8601
+        """
+        if isinstance(value, (datetime, date, time)):
+            if isinstance(value, date) and not isinstance(value, datetime):
+                if self.kind == "datetime":
+                    return datetime(value.year, value.month, value.day)
+                return value
+            return self._result(value)
+        if isinstance(value, str):
+            value = value.strip()
+            try:
+                return self._result(self.last(value))
+            except ValueError:
+                pass
+            for parser in self.parsers:
+                if parser is self.last:
+                    continue
+                try:
+                    result = self._result(parser(value))
+                except ValueError:
+                    continue
+                self.last = parser
+                return result
+        raise Exception(f"could not covert: {value} to {self.kind}")
+
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MILLISECOND = timedelta(milliseconds=1)
+
+
+def _epoch_ms(value) -> int:
+    if not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    # naive datetimes are UTC as per __fs_timestamp_stamper__
+    return (value - (_EPOCH if value.tzinfo is None else _EPOCH_UTC)) // _MILLISECOND
+
+
+def _iso(value) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat(timespec="seconds")
+    return value.isoformat()
+
+
+def _iso_us(value) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat(timespec="microseconds")
+    return value.isoformat()
+
+
+class FsDatetimeFormatter:
+    """
+    serialize datetime values using the model __fs_datetime_format__, one of:
+
+    * iso - 2020-01-02T03:04:05
+    * iso_us - 2020-01-02T03:04:05.000000
+    * epoch_ms - milliseconds since 1970-01-01 UTC as an int, naive datetimes are UTC
+    * a strftime format, ie: %d/%m/%Y %H:%M
+    """
+
+    __slots__ = ("mode", "_format")
+
+    modes = dict(iso=_iso, iso_us=_iso_us, epoch_ms=_epoch_ms)
+
+    def __init__(self, mode: str):
+        """
+        :param mode: iso, iso_us, epoch_ms or a strftime format
+        """
+        self.mode = mode
+        if mode in self.modes:
+            self._format = self.modes[mode]
+        elif "%" in mode:
+            self._format = lambda value: value.strftime(mode)
+        else:
+            raise ValueError(
+                f"__fs_datetime_format__ must be one of {list(self.modes)} or a strftime format not: {mode}"
+            )
+
+    def __repr__(self):
+        return f"FsDatetimeFormatter({self.mode})"
+
+    def __call__(self, value):
+        """
+        format a single datetime
+
+        :param value: datetime or date
+        :return: str or int
+        """
+        return self._format(value)
+
+    def column(self, values: list) -> list:
+        """
+        format a column of datetime values at once, None becomes "" as in fs_as_dict
+
+        :param values: list of datetime or None
+        :return: list of str or int
+        """
+        if self._format is _epoch_ms:
+            # common case of naive datetimes in one subtraction and division per value
+            try:
+                return [
+                    "" if v is None else (v - _EPOCH) // _MILLISECOND for v in values
+                ]
+            except TypeError:
+                pass
+        elif self._format is _iso:
+            try:
+                return [
+                    "" if v is None else v.isoformat(timespec="seconds") for v in values
+                ]
+            except TypeError:
+                pass
+        fmt = self._format
+        return ["" if v is None else fmt(v) for v in values]
+
+
+# types a str(type) key of __fs_convert_types__ may name
+_CONVERT_TYPES = (
+    bool,
+    int,
+    float,
+    str,
+    bytes,
+    dict,
+    list,
+    datetime,
+    date,
+    time,
+    Decimal,
+)
+
+
+class FsConvertTypes:
+    """
+    converters of values written to the database, keyed by type.  Built once per model and
+    database dialect and read only after, so lookups need no lock.  A type without a
+    converter of its own uses that of its nearest base class.
+    """
+
+    __slots__ = ("types", "names")
+
+    def __init__(self, layers, known_types=()):
+        """
+        :param layers: dicts of type or str(type) to converter, later layers replace earlier
+        :param known_types: other types str(type) keys may name, ie: column python types
+        """
+        by_name = {str(t): t for t in (*_CONVERT_TYPES, *known_types)}
+        types = {}
+        names = {}
+        for layer in layers:
+            for key, converter in (layer or {}).items():
+                if isinstance(key, type):
+                    types[key] = converter
+                elif key in by_name:
+                    types[by_name[key]] = converter
+                else:
+                    # a type not known until a value of it is converted
+                    names[key] = converter
+        self.types = MappingProxyType(types)
+        self.names = MappingProxyType(names)
+
+    def __repr__(self):
+        return f"FsConvertTypes({[getattr(t, '__name__', t) for t in self.types]})"
+
+    def get(self, value_type):
+        """
+        the converter registered for exactly value_type
+
+        :param value_type: type of the value
+        :return: converter or None
+        """
+        converter = self.types.get(value_type)
+        if converter is None and self.names:
+            converter = self.names.get(str(value_type))
+        return converter
+
+    def lookup(self, value_type):
+        """
+        the converter for value_type or its nearest base class
+
+        :param value_type: type of the value
+        :return: converter or None
+        """
+        for t in value_type.__mro__:
+            converter = self.get(t)
+            if converter is not None:
+                return converter
+        return None
@@ -1,10 +1,65 @@
 import ast
 import json
-from datetime import datetime, time
+from copy import deepcopy
+from datetime import datetime
+from itertools import islice, repeat
+from threading import RLock
+from time import perf_counter
 from typing import Type, List
 
-from flask import request, jsonify, abort, current_app, Response
+from flask import (
+    request,
+    abort,
+    current_app,
+    Response,
+    has_request_context,
+)
 from permissive_dict import PermissiveDict
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm.attributes import instance_state
+
+from .converters import FsDateParser, FsDatetimeFormatter, FsConvertTypes
+from .formats import (
+    NDJSON_TYPES,
+    fs_output_scope,
+    fs_native_bytes,
+    fs_encode_response,
+    fs_accepted_stream,
+    fs_json_lines,
+    fs_csv_lines,
+    fs_stream_response,
+    fs_read_json_lines,
+    fs_arrow_available,
+    fs_arrow_schema,
+    fs_arrow_array,
+    fs_arrow_response,
+    fs_json_rows,
+    fs_json_rows_response,
+)
+from .properties import (
+    FlaskSerializeCachedProperty,
+    fs_include_scope,
+    fs_included,
+)
+from .related import (
+    FsRelatedPage,
+    FsRelationship,
+    fs_memo,
+    fs_memo_scope,
+    fs_memo_stats,
+    fs_path_enter,
+    fs_path_exit,
+    fs_path_key,
+)
+from .instrumentation import (
+    fs_source,
+    fs_phase,
+    fs_phase_iter,
+    fs_span,
+    fs_span_attribute,
+    fs_count_rows,
+    _FsInstrumentation,
+)
 
 
 TRUTHY_VALUES = ("y", "Y", "yes", "Yes", "YES", True, "true", "True", "TRUE", 1, "1")
@@ -24,6 +79,30 @@ class FlaskSerializeNoDb(Exception):
         super().__init__('FlaskSerializeMixin property "db" is not set')
 
 
+# a field fs_as_dict leaves out of the dict
+_FS_MISSING = object()
+# LOB values that binary formats serialize without decoding
+_FS_BYTES = (bytes, bytearray, memoryview)
+# converted values of fs_cached_property copied in and out of the cache
+_FS_MUTABLE = (dict, list, set)
+
+
+class _FsCompiled(PermissiveDict):
+    """
+    compiled model properties and fields, a PermissiveDict whose attributes are also
+    stored as plain attributes so that serialization reads them without the fuzzy key
+    lookup of PermissiveDict
+    """
+
+    def __init__(self, d=None, **kwargs):
+        super().__init__(d, **kwargs)
+        self.__dict__.update(self)
+
+    def __setattr__(self, key, value):
+        super().__setattr__(key, value)
+        self.__dict__[key] = value
+
+
 class FlaskSerializeMixin:
     """
     Base mix in class to implement serialization and update methods for use
@@ -48,9 +127,19 @@ class FlaskSerializeMixin:
     __fs_timestamp_stamper__ = datetime.utcnow
     # list of property names that are relationships to be included in serialization
     __fs_relationship_fields__ = []
+    # serialize this model once per response when related to several rows
+    __fs_memo_related__ = True
+    # levels of related objects serialized in full below this model, None for no limit
+    __fs_relationship_depth__ = None
+    # property and relationship names only serialized when included, ie: ?include=stats
+    __fs_on_demand_fields__ = []
+    # column_property and hybrid_property names serialized as columns, selected with the row
+    __fs_expression_fields__ = []
     # add your own converters here
     __fs_column_type_converters__ = {}
-    # add or replace conversion types to the DB
+    # DATETIME serialization: None for __fs_to_date_short__, iso, iso_us, epoch_ms or a strftime format
+    __fs_datetime_format__ = None
+    # add or replace conversion types to the DB, keyed by type or str(type)
     __fs_convert_types__ = {
         str(bool): lambda v: "y" if v else "n",
         str(bytes): lambda v: v.encode(),
@@ -59,6 +148,8 @@ class FlaskSerializeMixin:
     __fs_convert_types_original__ = __fs_convert_types__.copy()
     # types that can be converted to json
     __fs_json_types = [str, dict, list, int, float, bool]
+    # ISO 8601 parser for datetime values without a column
+    __fs_datetime_parser = FsDateParser("datetime")
     # default field name when restricting to a particular user
     __fs_user_field__ = "user"
     # properties or fields to return when updating using get or post
@@ -69,10 +160,31 @@ class FlaskSerializeMixin:
     db = None
     # cache model properties
     __fs_model_props = {}
+    __fs_props_lock = RLock()
     # previous values of an instance before update attempted
     __fs_previous_field_value__ = {}
     # current version
     __fs_version__ = "2.2.0"
+    # list output formats by format request arg
+    __fs_list_formats = dict(
+        rows=lambda cls, *args: cls.__fs_json_table(*args),
+        columns=lambda cls, *args: cls.__fs_json_table(*args),
+        ndjson=lambda cls, *args: cls.__fs_stream_list(*args),
+        csv=lambda cls, *args: cls.__fs_stream_list(*args),
+    )
+    if fs_arrow_available():
+        __fs_list_formats.update(
+            arrow=lambda cls, *args: cls.__fs_arrow_list(*args),
+            parquet=lambda cls, *args: cls.__fs_arrow_list(*args),
+        )
+    # rows read from the database and committed at a time when streaming NDJSON or CSV
+    __fs_stream_batch_size__ = 1000
+    # request args that are not filter_by fields, unless they name a field of the model
+    __fs_reserved_args = ["format", "depth", "include"]
+    # tracing operation of fs_get_delete_put_post for a single item by request method
+    __fs_method_operations = dict(
+        GET="get", POST="update", PUT="update", DELETE="delete"
+    )
 
     @staticmethod
     def __fs_json_converter__(value):
@@ -142,7 +254,11 @@ class FlaskSerializeMixin:
             kwargs[cls.__fs_user_field__] = user
 
         query = cls.query.filter_by(**kwargs)
-        items = [item for item in query if item.__fs_can_access__()]
+        items = [
+            item
+            for item in fs_phase_iter(query, "hydrate")
+            if item.__fs_access_allowed()
+        ]
 
         return items
 
@@ -161,8 +277,9 @@ class FlaskSerializeMixin:
         kwargs = {"id": item_id}
         if user:
             kwargs[cls.__fs_user_field__] = user
-        item = cls.query.filter_by(**kwargs).first_or_404()
-        if not item.__fs_can_access__():
+        with fs_phase("hydrate"):
+            item = cls.query.filter_by(**kwargs).first_or_404()
+        if not item.__fs_access_allowed():
             abort(404)
         return item
 
@@ -185,13 +302,17 @@ class FlaskSerializeMixin:
         :param item_id: {primary key} the primary key of the item to get
         :return: flask response with json item, or {} if not found or no access
         """
-        item = cls.query.get(item_id)
-        if not item or not item.__fs_can_access__():
-            return jsonify({})
-        return item.fs_as_json
+        with fs_output_scope(), cls.__fs_memo_scope(), fs_span("get", cls):
+            with fs_span("query", cls), fs_phase("hydrate"):
+                item = cls.query.get(item_id)
+            with fs_span("access", cls):
+                allowed = item and item.__fs_access_allowed()
+            if not allowed:
+                return cls.__fs_response({})
+            return item.fs_as_json
 
     @classmethod
-    def fs_json_list(cls, query_result, prop_filters=None):
+    def fs_json_list(cls, query_result, prop_filters=None, include=None, output=None):
         """
         Return a list in json format from the query_result.
         When __fs_order_by_field__ is defined sort by that field in ascending order.
@@ -199,25 +320,726 @@ class FlaskSerializeMixin:
 
         :param query_result: sql alchemy query result
         :param prop_filters: dictionary of filter elements to restrict results
+        :param include: (optional) list of __fs_on_demand_fields__ to serialize
+        :param output: (optional) list format, objects, rows, columns, ndjson, csv, arrow
+        or parquet
         :return: flask response with json list of results
+        :throws: ValueError when the output format is not supported
         """
-        items = [
-            item.__fs_as_exclude_json_dict()
-            for item in query_result
-            if item.__fs_can_access__()
+        if output == "objects":
+            output = None
+        if output and output not in cls.__fs_list_formats:
+            raise ValueError(f"unsupported format: {output}")
+        with fs_output_scope(), cls.__fs_memo_scope(), cls.__fs_include_scope(include):
+            return cls.__fs_json_list(query_result, prop_filters, output)
+
+    @classmethod
+    def __fs_json_list(cls, query_result, prop_filters=None, output=None):
+        """
+        private: fs_json_list in the output format
+        """
+        if output:
+            return cls.__fs_list_formats[output](
+                cls, query_result, prop_filters, output
+            )
+
+        with fs_span("list", cls):
+            names, items = cls.__fs_serialize_table(query_result)
+            if names is not None:
+                rows = None
+                if not fs_native_bytes():
+                    with fs_span("serialize", cls), fs_phase("serialize"):
+                        rows = cls.__fs_json_rows(names, items, prop_filters)
+                if rows is not None:
+                    fs_span_attribute("rows", len(rows))
+                    with fs_span("encode"), fs_phase("encode"):
+                        response = fs_json_rows_response(rows)
+                    fs_span_attribute("payload_bytes", response.content_length)
+                    return response
+                items = cls.__fs_columns_to_dicts(names, items)
+
+            if len(items) <= 0:
+                return cls.__fs_response(items)
+
+            with fs_span("serialize", cls), fs_phase("serialize"):
+                items = cls.__fs_filter_sort(items, prop_filters)
+            fs_span_attribute("rows", len(items))
+
+            return cls.__fs_response(items)
+
+    @classmethod
+    def __fs_request_format(cls):
+        """
+        private: the list output format of fs_get_delete_put_post from the format request
+        arg, or ndjson or csv when the Accept header prefers application/x-ndjson or text/csv
+
+        :return: None for a list of objects or a key of __fs_list_formats
+        :throws: 400 when the format is not supported
+        """
+        if not has_request_context():
+            return None
+        output = None
+        if "format" in cls.__fs_props().request_args:
+            output = request.args.get("format")
+        if not output:
+            output = fs_accepted_stream()
+        if not output or output == "objects":
+            return None
+        if output not in cls.__fs_list_formats:
+            abort(400, f"unsupported format: {output}")
+        return output
+
+    @classmethod
+    def __fs_memo_scope(cls, share=True, strict=True):
+        """
+        private: fs_memo_scope using the depth request arg unless it is a field of the model
+
+        :param share: False to give each row a copy of the related dicts reused
+        :param strict: abort when the depth request arg is not valid, only the response
+            methods do
+        """
+        return fs_memo_scope("depth" in cls.__fs_props().request_args, share, strict)
+
+    @classmethod
+    def __fs_include_scope(cls, include=None):
+        """
+        private: fs_include_scope using the include request arg unless it is a field of the
+        model
+        """
+        return fs_include_scope(include, "include" in cls.__fs_props().request_args)
+
+    @classmethod
+    def __fs_json_table(cls, query_result, prop_filters=None, output="columns"):
+        """
+        private: fs_json_list as field names and value arrays, without repeating the field
+        name in every row.  ?format=rows gives {"fields": [...], "rows": [[...], ...]} and
+        ?format=columns gives {"fields": [...], "columns": [[...], ...]}, a list per field.
+        Fields a row does not have are null.
+
+        :param query_result: sql alchemy query result
+        :param prop_filters: dictionary of filter elements to restrict results
+        :param output: rows or columns
+        :return: flask response with json fields and rows or columns
+        """
+        with fs_span("list", cls):
+            if (
+                prop_filters
+                or cls.__fs_order_by_field__
+                or cls.__fs_order_by_field_desc__
+            ):
+                # filter and sort as objects
+                items = cls.__fs_serialize_list(query_result)
+                with fs_span("serialize", cls), fs_phase("serialize"):
+                    names, columns = cls.__fs_dicts_to_columns(
+                        cls.__fs_filter_sort(items, prop_filters)
+                    )
+            else:
+                names, columns = cls.__fs_serialize_table(query_result)
+                if names is None:
+                    names, columns = cls.__fs_dicts_to_columns(columns)
+                else:
+                    columns = [
+                        (
+                            [None if v is _FS_MISSING else v for v in column]
+                            if _FS_MISSING in column
+                            else column
+                        )
+                        for column in columns
+                    ]
+            fs_span_attribute("rows", len(columns[0]) if columns else 0)
+            if output == "rows":
+                return cls.__fs_response(dict(fields=names, rows=list(zip(*columns))))
+            return cls.__fs_response(dict(fields=names, columns=columns))
+
+    @classmethod
+    def __fs_stream_list(cls, query_result, prop_filters=None, output="ndjson"):
+        """
+        private: fs_json_list as newline delimited JSON, one object per line, or CSV with
+        a header row of the serialized field names, streamed from the query
+        __fs_stream_batch_size__ rows at a time using yield_per and gzip compressed when
+        accepted.  A field __fs_order_by_field__ or __fs_order_by_field_desc__ is ordered
+        by the database, a callable order is sorted in memory before streaming.
+
+        :param query_result: sql alchemy query result
+        :param prop_filters: dictionary of filter elements to restrict results
+        :param output: ndjson or csv
+        :return: streamed flask response of application/x-ndjson or text/csv
+        """
+        query_result, in_memory = cls.__fs_stream_order(query_result)
+        # the fields included when the response is streamed
+        include = fs_included()
+        if in_memory:
+            items = cls.__fs_serialize_list(query_result)
+            batches = [cls.__fs_filter_sort(items, prop_filters)]
+        elif output == "ndjson":
+            return fs_stream_response(
+                cls.__fs_json_line_chunks(query_result, prop_filters, include),
+                NDJSON_TYPES[0],
+            )
+        else:
+            batches = cls.__fs_stream_batches(query_result, prop_filters, include)
+
+        if output == "csv":
+            names = [c.name for c in cls.__fs_stream_fields()]
+            response = fs_stream_response(fs_csv_lines(names, batches), "text/csv")
+            response.headers["Content-Disposition"] = (
+                f"attachment; filename={cls.__table__.name}.csv"
+            )
+            return response
+        return fs_stream_response(fs_json_lines(batches), NDJSON_TYPES[0])
+
+    @classmethod
+    def __fs_stream_batches(cls, query_result, prop_filters=None, include=None):
+        """
+        private: load, access check, serialize and filter the query_result
+        __fs_stream_batch_size__ rows at a time, reading Core rows when possible
+
+        :param query_result: sql alchemy query result
+        :param prop_filters: dictionary of filter elements to restrict results
+        :param include: on demand fields to serialize
+        :return: generator of lists of dict
+        """
+        for names, batch in cls.__fs_stream_tables(query_result, include):
+            if names is not None:
+                batch = cls.__fs_columns_to_dicts(names, batch)
+            yield cls.__fs_prop_filter(batch, prop_filters)
+
+    @classmethod
+    def __fs_json_line_chunks(cls, query_result, prop_filters=None, include=None):
+        """
+        private: NDJSON text of the query_result a batch at a time, writing the JSON of
+        rows serialized a column at a time directly
+
+        :param query_result: sql alchemy query result
+        :param prop_filters: dictionary of filter elements to restrict results
+        :param include: on demand fields to serialize
+        :return: generator of str
+        """
+        for names, batch in cls.__fs_stream_tables(query_result, include):
+            if names is not None:
+                rows = cls.__fs_json_rows(names, batch, prop_filters, sort=False)
+                if rows is not None:
+                    if rows:
+                        yield "\n".join(rows) + "\n"
+                    continue
+                batch = cls.__fs_columns_to_dicts(names, batch)
+            yield from fs_json_lines([cls.__fs_prop_filter(batch, prop_filters)])
+
+    @classmethod
+    def __fs_stream_tables(cls, query_result, include=None):
+        """
+        private: load, access check and serialize the query_result
+        __fs_stream_batch_size__ rows at a time, reading Core rows when possible
+
+        :param query_result: sql alchemy query result
+        :param include: on demand fields to serialize
+        :return: generator of (names, columns) or (None, list of dict)
+        """
+        with fs_include_scope(include, request_arg=False):
+            fields = cls.__fs_core_fields(query_result)
+        if fields:
+            for rows in cls.__fs_core_select(
+                query_result, fields, cls.__fs_stream_batch_size__
+            ):
+                yield cls.__fs_core_columns(fields, rows)
+            return
+        for items in cls.__fs_accessible_batches(query_result):
+            # related objects are serialized once per batch, the depth request arg was
+            # checked by the response method
+            with cls.__fs_memo_scope(strict=False), fs_include_scope(
+                include, request_arg=False
+            ):
+                if cls.__fs_can_serialize_columns(items):
+                    table = cls.__fs_columns(items)
+                else:
+                    table = None, [item.__fs_as_exclude_json_dict() for item in items]
+            yield table
+
+    @classmethod
+    def __fs_arrow_list(cls, query_result, prop_filters=None, output="arrow"):
+        """
+        private: fs_json_list as an Arrow IPC stream, a record batch per
+        __fs_stream_batch_size__ rows, or a Parquet file, a row group per batch.  Columns
+        are typed from the compiled field list and read without the serialization
+        converters.  JSON columns, properties and relationships are strings and private
+        fields are null.
+
+        :param query_result: sql alchemy query result
+        :param prop_filters: dictionary of filter elements to restrict results
+        :param output: arrow or parquet
+        :return: streamed flask response of an arrow stream or parquet file
+        """
+        fields = cls.__fs_stream_fields()
+        schema = fs_arrow_schema(fields)
+        query_result, in_memory = cls.__fs_stream_order(query_result)
+        if in_memory or prop_filters:
+            # filter and sort as objects
+            items = cls.__fs_load_accessible(query_result)
+            dicts = [item.__fs_as_exclude_json_dict() for item in items]
+            by_dict = {id(d): item for d, item in zip(dicts, items)}
+            items = [by_dict[id(d)] for d in cls.__fs_filter_sort(dicts, prop_filters)]
+            batch_size = cls.__fs_stream_batch_size__
+            item_batches = [
+                items[i : i + batch_size] for i in range(0, len(items), batch_size)
+            ]
+        else:
+            item_batches = cls.__fs_accessible_batches(query_result)
+
+        batches = (
+            cls.__fs_arrow_arrays(fields, schema, items) for items in item_batches
+        )
+        response = fs_arrow_response(schema, batches, output)
+        if output == "parquet":
+            response.headers["Content-Disposition"] = (
+                f"attachment; filename={cls.__table__.name}.parquet"
+            )
+        return response
+
+    @classmethod
+    def __fs_arrow_arrays(cls, fields: list, schema, items: list) -> list:
+        """
+        private: an arrow array per field of items
+
+        :param fields: fields from __fs_stream_fields
+        :param schema: arrow schema of fields
+        :param items: list of model instances
+        :return: list of pyarrow Array
+        """
+        fs_count_rows(len(items))
+        private = (
+            cls.__fs_private_field__ is not FlaskSerializeMixin.__fs_private_field__
+        )
+        arrays = []
+        for c, arrow_field in zip(fields, schema):
+            if c.source:
+                # properties and relationships as serialized
+                with fs_source(c.source):
+                    values = [
+                        None if v is _FS_MISSING else v
+                        for v in cls.__fs_convert_column(c, items)
+                    ]
+            else:
+                values = [getattr(item, c.name, None) for item in items]
+            if private:
+                values = [
+                    None if item.__fs_private_field__(c.name) else v
+                    for item, v in zip(items, values)
+                ]
+            arrays.append(fs_arrow_array(c.name, values, arrow_field.type))
+        return arrays
+
+    @classmethod
+    def __fs_stream_order(cls, query_result) -> tuple:
+        """
+        private: order the query by a field __fs_order_by_field__ or
+        __fs_order_by_field_desc__ in the database
+
+        :param query_result: sql alchemy query result
+        :return: (query_result, True when to be sorted in memory)
+        """
+        order = cls.__fs_order_by_field__ or cls.__fs_order_by_field_desc__
+        if order is None:
+            return query_result, False
+        if not callable(order) and hasattr(query_result, "order_by"):
+            column = getattr(cls, cls._fs_get_field_name(order), None)
+            if hasattr(column, "desc"):
+                if not cls.__fs_order_by_field__:
+                    column = column.desc()
+                return query_result.order_by(column), False
+        return query_result, True
+
+    @classmethod
+    def __fs_stream_fields(cls) -> list:
+        """
+        private: the compiled field list without __fs_exclude_json_serialize_fields__
+
+        :return: list of fields
+        """
+        return [
+            c
+            for c in cls.__fs_field_list(cls.__fs_props())
+            if c.name not in cls.__fs_exclude_json_serialize_fields__
         ]
 
-        if len(items) <= 0:
-            return jsonify(items)
+    @staticmethod
+    def __fs_field_list(props) -> list:
+        """
+        private: the compiled field list and the on demand fields included by the call site
+        or the include request arg
+
+        :param props: properties from _fs_get_props
+        :return: list of fields
+        """
+        if not props.on_demand:
+            return props.field_list
+        included = fs_included()
+        if not included or props.on_demand_names.isdisjoint(included):
+            return props.field_list
+        return props.field_list + [f for f in props.on_demand if f.name in included]
+
+    @staticmethod
+    def __fs_core_field(f) -> bool:
+        """
+        private: True when field f can be serialized from a Core row
+        """
+        return not f.source and (
+            not f.method_converter
+            or f.converter is FlaskSerializeMixin.__fs_to_date_short__
+        )
+
+    @classmethod
+    def __fs_accessible_batches(cls, query_result):
+        """
+        private: load the query_result __fs_stream_batch_size__ rows at a time, keeping
+        those that __fs_can_access__()
+
+        :param query_result: sql alchemy query result
+        :return: generator of lists of model instances
+        """
+        batch_size = cls.__fs_stream_batch_size__
+        if hasattr(query_result, "yield_per"):
+            # server side cursor where the driver supports it
+            query_result = query_result.yield_per(batch_size)
+        rows = iter(query_result)
+        while True:
+            items = list(islice(rows, batch_size))
+            if not items:
+                return
+            yield [item for item in items if item.__fs_access_allowed()]
+
+    @staticmethod
+    def __fs_dicts_to_columns(items: list) -> tuple:
+        """
+        private: field names and a list of values per field from a list of dict
+
+        :param items: list of dict
+        :return: (names, columns)
+        """
+        names = {}
+        for item in items:
+            for k in item:
+                names[k] = None
+        names = list(names)
+        return names, [[item.get(k) for item in items] for k in names]
+
+    @classmethod
+    def __fs_load_accessible(cls, query_result) -> list:
+        """
+        private: load the query_result, keeping those that __fs_can_access__()
+
+        :param query_result: sql alchemy query result
+        :return: list of model instances
+        """
+        with fs_span("query", cls), fs_phase("hydrate"):
+            items = list(query_result)
+        with fs_span("access", cls) as span:
+            items = [item for item in items if item.__fs_access_allowed()]
+            span.set_attribute("rows", len(items))
+        return items
+
+    @classmethod
+    def __fs_can_serialize_columns(cls, items: list) -> bool:
+        """
+        private: True when items can be serialized a column at a time
+        """
+        return (
+            items
+            and not _FsInstrumentation.profiler
+            and all(type(item) is cls for item in items)
+            and items[0]._fs_get_props().columnar
+        )
+
+    @classmethod
+    def __fs_serialize_list(cls, query_result) -> list:
+        """
+        private: load the query_result, keep those that __fs_can_access__() and serialize
+        them to a list of dict without __fs_exclude_json_serialize_fields__
+
+        :param query_result: sql alchemy query result
+        :return: list of dict objects
+        """
+        names, items = cls.__fs_serialize_table(query_result)
+        if names is None:
+            return items
+        return cls.__fs_columns_to_dicts(names, items)
+
+    @classmethod
+    def __fs_serialize_table(cls, query_result) -> tuple:
+        """
+        private: load the query_result, keep those that __fs_can_access__() and serialize
+        them without __fs_exclude_json_serialize_fields__, a column at a time when possible
 
+        :param query_result: sql alchemy query result
+        :return: (names, columns), or (None, list of dict) when serialized an item at a time
+        """
+        fields = cls.__fs_core_fields(query_result)
+        if fields:
+            with fs_span("query", cls), fs_phase("hydrate"):
+                (rows,) = cls.__fs_core_select(query_result, fields)
+            with fs_span("serialize", cls):
+                return cls.__fs_core_columns(fields, rows)
+
+        items = cls.__fs_load_accessible(query_result)
+        with fs_span("serialize", cls):
+            if cls.__fs_can_serialize_columns(items):
+                return cls.__fs_columns(items)
+            return None, [item.__fs_as_exclude_json_dict() for item in items]
+
+    @classmethod
+    def __fs_json_rows(
+        cls, names: list, columns: list, prop_filters=None, sort=True
+    ) -> list:
+        """
+        private: the JSON text of each serialized row with prop_filters and
+        __fs_order_by_field__ or __fs_order_by_field_desc__ applied to the columns, as
+        __fs_filter_sort does to dicts
+
+        :param names: field names
+        :param columns: a list of serialized values per field name
+        :param prop_filters: dictionary of filter elements to restrict results
+        :param sort: False when the rows are already ordered
+        :return: list of str, or None to serialize dicts
+        """
+        order = cls.__fs_order_by_field__ or cls.__fs_order_by_field_desc__
+        if (sort and callable(order)) or any(_FS_MISSING in c for c in columns):
+            return None
+        by_name = dict(zip(names, columns))
+        index = None
         if prop_filters:
-            filtered_result = []
-            for item in items:
-                for k, v in prop_filters.items():
-                    if item.get(k) == v:
-                        filtered_result.append(item)
-                        break
-            items = filtered_result
+            # any matching field, missing fields are None
+            index = [
+                i
+                for i in range(len(columns[0]) if columns else 0)
+                if any(
+                    (by_name[k][i] if k in by_name else None) == v
+                    for k, v in prop_filters.items()
+                )
+            ]
+        if sort and order:
+            name = cls._fs_get_field_name(order)
+            if name not in by_name:
+                return None
+            index = sorted(
+                range(len(columns[0])) if index is None else index,
+                key=by_name[name].__getitem__,
+                reverse=not cls.__fs_order_by_field__,
+            )
+        return fs_json_rows(names, columns, index, response=sort)
+
+    @classmethod
+    def __fs_core_fields(cls, query_result) -> list:
+        """
+        private: the fields to select when query_result can be read with a Core select()
+        of the columns, serializing rows without hydrating model instances.  Only when
+        the query is of this model alone and the model has no property or relationship
+        fields, __fs_can_access__, __fs_private_field__ or method converters that need
+        an instance.
+
+        :param query_result: sql alchemy query result
+        :return: list of fields or None to load instances
+        """
+        if _FsInstrumentation.profiler or not hasattr(query_result, "with_entities"):
+            return None
+        descriptions = query_result.column_descriptions
+        if (
+            len(descriptions) != 1
+            or descriptions[0]["entity"] is not cls
+            or descriptions[0]["type"] is not cls
+            or cls.__mapper__.inherits is not None
+            or cls.__mapper__.polymorphic_on is not None
+        ):
+            return None
+        fields = cls.__fs_stream_fields()
+        props = cls.__fs_props()
+        if not fields or not props.core:
+            return None
+        if props.on_demand and not all(cls.__fs_core_field(c) for c in fields):
+            return None
+        return fields
+
+    @classmethod
+    def __fs_core_select(cls, query_result, fields: list, batch_size: int = None):
+        """
+        private: execute query_result as a Core select() of the fields and the primary key,
+        keeping its filters, order, limit and offset
+
+        :param query_result: sql alchemy query
+        :param fields: fields from __fs_core_fields
+        :param batch_size: rows per batch using yield_per, None for all the rows at once
+        :return: iterable of lists of Row
+        """
+        table = cls.__table__
+        expressions = cls.__fs_props().expressions
+        names = [c.name for c in fields]
+        # the primary key keeps DISTINCT queries distinct by row
+        names += [c.name for c in table.primary_key.columns if c.name not in names]
+        statement = query_result.with_entities(
+            *[
+                expressions[n].label(n) if n in expressions else table.c[n]
+                for n in names
+            ]
+        ).statement
+        if batch_size is None:
+            return [query_result.session.execute(statement).all()]
+        result = query_result.session.execute(
+            statement, execution_options=dict(yield_per=batch_size)
+        )
+        return result.partitions()
+
+    @classmethod
+    def __fs_core_columns(cls, fields: list, rows: list) -> tuple:
+        """
+        private: serialize Core rows a column at a time with the compiled converters
+
+        :param fields: fields from __fs_core_fields
+        :param rows: list of Row from __fs_core_select
+        :return: (names, columns) a list of converted values per field name
+        """
+        fs_count_rows(len(rows))
+        with fs_phase("serialize"):
+            names = [c.name for c in fields]
+            if not rows:
+                return names, [[] for _ in fields]
+            return names, [
+                cls.__fs_convert_values(c, list(values))
+                for c, values in zip(fields, zip(*rows))
+            ]
+
+    @staticmethod
+    def __fs_columns_to_dicts(names: list, columns: list) -> list:
+        """
+        private: a dict per row of serialized columns, leaving out _FS_MISSING values
+
+        :param names: field names
+        :param columns: a list of serialized values per field name
+        :return: list of dict objects
+        """
+        if any(_FS_MISSING in column for column in columns):
+            return [
+                {k: v for k, v in zip(names, row) if v is not _FS_MISSING}
+                for row in zip(*columns)
+            ]
+        return [dict(zip(names, row)) for row in zip(*columns)]
+
+    @classmethod
+    def __fs_columns(cls, items: list) -> tuple:
+        """
+        private: serialize items of this class a column at a time using the compiled
+        field list without __fs_exclude_json_serialize_fields__
+
+        :param items: list of model instances
+        :return: (names, columns) a list of converted values per field name
+        """
+        fs_count_rows(len(items))
+        with fs_phase("serialize"):
+            names = []
+            columns = []
+            for c in cls.__fs_field_list(items[0]._fs_get_props()):
+                if c.name in cls.__fs_exclude_json_serialize_fields__:
+                    continue
+                names.append(c.name)
+                if c.source:
+                    with fs_source(c.source):
+                        columns.append(cls.__fs_convert_column(c, items))
+                else:
+                    columns.append(cls.__fs_convert_column(c, items))
+            return names, columns
+
+    @staticmethod
+    def __fs_convert_column(c, items: list) -> list:
+        """
+        private: read and convert field c of every item as fs_as_dict does
+
+        :param c: field from _fs_get_props field_list
+        :param items: list of model instances
+        :return: list of converted values, _FS_MISSING where fs_as_dict would omit the key
+        """
+        if c.cached:
+            return [item.__fs_cached_value(c) for item in items]
+        if c.related:
+            # one query for the related objects of all the items
+            try:
+                values = c.related.load(items)
+            except Exception as e:
+                values = [str(e)] * len(items)
+            return FlaskSerializeMixin.__fs_convert_values(c, values, items)
+        name = c.name
+        converter = c.converter
+        values = []
+        failed = False
+        for item in items:
+            try:
+                values.append(getattr(item, name, ""))
+            except Exception as e:
+                failed = True
+                values.append(str(e) if converter else _FS_MISSING)
+        return FlaskSerializeMixin.__fs_convert_values(c, values, items, failed)
+
+    @staticmethod
+    def __fs_convert_values(c, values: list, items=None, failed=False) -> list:
+        """
+        private: convert the values of field c as fs_as_dict does
+
+        :param c: field from _fs_get_props field_list
+        :param values: list of values read from items or Core rows
+        :param items: model instances of values, None for Core rows
+        :param failed: True when reading a value failed
+        :return: list of converted values
+        """
+        converter = c.converter
+        if not converter:
+            return ["" if v is None else v for v in values]
+        if items is None:
+            items = repeat(None)
+        native = c.binary and fs_native_bytes()
+        if c.column_converter and not failed and not native:
+            try:
+                return c.column_converter(values)
+            except Exception:
+                # convert one by one to report the failing value
+                pass
+        convert = FlaskSerializeMixin.__fs_convert_value
+        return [convert(c, item, v) for item, v in zip(items, values)]
+
+    @staticmethod
+    def __fs_convert_value(c, item, v):
+        """
+        private: convert value v of field c as fs_as_dict does, failures become an error
+        message
+
+        :param c: field from _fs_get_props field_list
+        :param item: model instance of v, None for Core rows
+        :param v: value read
+        :return: the converted value
+        """
+        if v is None:
+            return ""
+        if c.binary and isinstance(v, _FS_BYTES) and fs_native_bytes():
+            return bytes(v)
+        if not c.converter:
+            return v
+        try:
+            if c.method_converter:
+                return c.converter(item, v)
+            return c.converter(v)
+        except Exception as e:
+            error = 'Error:"{}". Failed to convert [{}] type:{} value:{}'.format(
+                e, c.name, c.c_type, v
+            )
+            current_app.logger.warning(error)
+            return error
+
+    @classmethod
+    def __fs_filter_sort(cls, items: list, prop_filters=None) -> list:
+        """
+        private: apply prop_filters and __fs_order_by_field__ or __fs_order_by_field_desc__
+        to a list of serialized items
+
+        :param items: list of dict
+        :param prop_filters: dictionary of filter elements to restrict results
+        :return: the filtered and sorted list
+        """
+        items = cls.__fs_prop_filter(items, prop_filters)
 
         # ascending
         if cls.__fs_order_by_field__:
@@ -240,23 +1062,60 @@ class FlaskSerializeMixin:
                 reverse=True,
             )
 
-        return jsonify(items)
+        return items
+
+    @staticmethod
+    def __fs_prop_filter(items: list, prop_filters=None) -> list:
+        """
+        private: keep the serialized items matching any of the prop_filters
+
+        :param items: list of dict
+        :param prop_filters: dictionary of filter elements to restrict results
+        :return: the filtered list
+        """
+        if not prop_filters:
+            return items
+        filtered_result = []
+        for item in items:
+            for k, v in prop_filters.items():
+                if item.get(k) == v:
+                    filtered_result.append(item)
+                    break
+        return filtered_result
+
+    @staticmethod
+    def __fs_response(data):
+        """
+        private: encode data as a flask response, JSON or the binary format negotiated by
+        fs_output_scope
+
+        :param data: dict or list to encode
+        :return: flask response
+        """
+        with fs_span("encode"), fs_phase("encode"):
+            response = fs_encode_response(data)
+        fs_span_attribute("payload_bytes", response.content_length)
+        return response
 
     @classmethod
-    def fs_dict_list(cls, query_result):
+    def fs_dict_list(cls, query_result, include=None):
         """
         return a list of dictionary objects from the sql query result
         without __fs_exclude_serialize_fields__ fields
         for only those than __fs_can_access__()
 
         :param query_result: sql alchemy query result
+        :param include: (optional) list of __fs_on_demand_fields__ to serialize
         :return: list of dict objects
         """
-        return [
-            item.__fs_as_exclude_json_dict()
-            for item in query_result
-            if item.__fs_can_access__()
-        ]
+        # the dicts are the caller's to alter, so rows do not share related dicts
+        with fs_span("list", cls) as span, cls.__fs_memo_scope(
+            share=False, strict=False
+        ):
+            with cls.__fs_include_scope(include):
+                items = cls.__fs_serialize_list(query_result)
+            span.set_attribute("rows", len(items))
+            return items
 
     @property
     def fs_as_json(self):
@@ -265,7 +1124,9 @@ class FlaskSerializeMixin:
 
         :return: flask response json object
         """
-        return jsonify(self.__fs_as_exclude_json_dict())
+        with fs_span("serialize", self.__class__):
+            data = self.__fs_as_exclude_json_dict()
+        return self.__fs_response(data)
 
     def __fs_private_field__(self, field_name):
         """
@@ -284,11 +1145,13 @@ class FlaskSerializeMixin:
 
         :return: dictionary
         """
-        return {
-            k: v
-            for k, v in self.fs_as_dict.items()
-            if k not in self.__fs_exclude_json_serialize_fields__
-        }
+        fs_count_rows()
+        with fs_phase("serialize"):
+            return {
+                k: v
+                for k, v in self.fs_as_dict.items()
+                if k not in self.__fs_exclude_json_serialize_fields__
+            }
 
     def __fs_property_converter__(self, value):
         """
@@ -307,29 +1170,119 @@ class FlaskSerializeMixin:
         if value is None:
             return None
         if isinstance(value, datetime):
+            formatter = self._fs_get_props().datetime_formatter
+            if formatter:
+                return formatter(value)
             return self.__fs_to_date_short__(value)
         if isinstance(value, set):
             return list(value)
         if isinstance(value, FlaskSerializeMixin):
-            return value.fs_as_dict
+            return self.__fs_related(value)
         if type(value) not in self.__fs_json_types:
             return str(value)
         return value
 
-    @staticmethod
-    def __fs_relationship_converter(relationships):
+    def __fs_relationship_converter(self, relationships):
         """
         convert a child SQLAlchemy result set into a python
-        dictionary list.
+        dictionary list.  Related objects deeper than __fs_relationship_depth__ or the
+        depth request arg, or already being serialized, become {primary key: value}
 
         :param relationships: SQLAlchemy result set
         :return: list of dict objects
         """
-        if isinstance(relationships, FlaskSerializeMixin):
-            return relationships.fs_as_dict
-        if isinstance(relationships, str):
+        if isinstance(relationships, (str, int)):
+            # an error or a count
             return relationships
-        return [item.fs_as_dict for item in relationships]
+        if isinstance(relationships, FsRelatedPage):
+            items = relationships.items
+            if not relationships.ids:
+                items = self.__fs_related(items)
+            if not relationships.paged:
+                return items
+            return dict(items=items, total=relationships.total, next=relationships.next)
+        return self.__fs_related(relationships)
+
+    def __fs_related(self, related):
+        """
+        private: serialize related, a model instance or a list of them, one level below
+        this object on the path of the current serialization
+
+        :param related: model instance or list of model instances
+        :return: dict or list of dict
+        """
+        path, token = fs_path_enter()
+        path.calls += 1
+        keys = path.keys
+        limit = path.limit
+        if self.__fs_relationship_depth__ is not None:
+            # this object is at level len(keys)
+            path.limit = min(limit, len(keys) + self.__fs_relationship_depth__)
+        full = len(keys) < path.limit
+        keys.append(instance_state(self).key or id(self))
+        try:
+            if isinstance(related, FlaskSerializeMixin):
+                if full:
+                    return related.__fs_related_dict(path)
+                return related.__fs_reference()
+            if full:
+                return [item.__fs_related_dict(path) for item in related]
+            return [item.__fs_reference() for item in related]
+        finally:
+            keys.pop()
+            path.limit = limit
+            fs_path_exit(token)
+
+    def __fs_reference(self) -> dict:
+        """
+        private: a related object not serialized in full
+
+        :return: {primary key field: value}
+        """
+        primary_key_field = self._fs_get_props().primary_key_field
+        return {primary_key_field: getattr(self, primary_key_field)}
+
+    def __fs_related_dict(self, path) -> dict:
+        """
+        private: fs_as_dict of a related object one level below the end of path, or a
+        reference when it is on the path.  Serialized once per response by the memo of
+        fs_memo_scope
+
+        :param path: path of the current serialization
+        :return: dict, shared by the rows of a response that relate to this object
+        """
+        identity = instance_state(self).key
+        if (identity or id(self)) in path.keys:
+            return self.__fs_reference()
+        memo = fs_memo()
+        if memo is None or identity is None:
+            return self.fs_as_dict
+        props = self._fs_get_props()
+        if not props.memo:
+            return self.fs_as_dict
+        if props.columnar and not props.on_demand:
+            names = props.field_names
+        else:
+            names = tuple(c.name for c in self._fs_get_fields())
+        key = memo.key(identity, names, path)
+        d = memo.get(key)
+        if d is None:
+            calls = path.calls
+            d = self.fs_as_dict
+            # the relationships it follows depend on the path
+            memo.add(key, d, path.calls != calls, path)
+        return d
+
+    @staticmethod
+    def fs_memo_stats(reset: bool = False) -> dict:
+        """
+        hits and misses of the related object memo by model name, where a hit is a related
+        object referenced again in the same response and serialized only once
+
+        :param reset: clear the totals after reading them
+        :return: dict of model name: dict(hits, misses)
+        """
+        return fs_memo_stats(reset)
 
     @staticmethod
     def __fs_lob_converter(value):
@@ -384,26 +1337,14 @@ class FlaskSerializeMixin:
     def __fs_sqlite_to_date_converter(value):
         """
         convert an ISO-9 date or datetime from a form etc into a datetime as sqlite does
-        not handle date conversions nicely
+        not handle date conversions nicely.  Date and time columns use their own
+        parser from _fs_get_props date_parsers
 
         :param value: form / json data to convert
         :return: corrected datetime or time
         """
-        if isinstance(value, datetime) or isinstance(value, time):
-            return value
         # assumes ISO 8601 as per javascript standard for dates
-        for date_format in [
-            "%Y-%m-%dT%H:%M:%S",
-            "%Y-%m-%dT%H:%M",
-            "%Y-%m-%d %H:%M:%S",
-            "%Y-%m-%d %H:%M",
-            "%Y-%m-%d",
-        ]:
-            try:
-                return datetime.strptime(value, date_format)
-            except:
-                pass
-        raise Exception(f"could not covert: {value} to datetime")
+        return FlaskSerializeMixin.__fs_datetime_parser(value)
 
     def _fs_get_props(self):
         """
@@ -411,83 +1352,279 @@ class FlaskSerializeMixin:
 
         :return: properties PermissiveDict
         """
-        props = self.__fs_model_props.get(self.__table__)
-        if not props:
-            props = PermissiveDict(
-                name=self.__table__.name, id=0, primary_key_field="id"
-            )
+        return self.__fs_model_props.get(self.__table__) or self.__fs_props()
+
+    @classmethod
+    def __fs_props(cls):
+        """
+        private: the properties of this model table, compiled once under a lock so that
+        concurrent first requests do not race
+
+        :return: properties PermissiveDict
+        """
+        props = cls.__fs_model_props.get(cls.__table__)
+        if props:
+            return props
+        with FlaskSerializeMixin.__fs_props_lock:
+            props = cls.__fs_model_props.get(cls.__table__)
+            if props:
+                return props
+            props = _FsCompiled(name=cls.__table__.name, id=0, primary_key_field="id")
+            # model methods are stored unbound and called with the instance being
+            # converted so that the cache does not keep a reference to this instance
             props.converters = {
-                "DATETIME": self.__fs_to_date_short__,
-                "PROPERTY": self.__fs_property_converter__,
-                "RELATIONSHIP": self.__fs_relationship_converter,
+                "DATETIME": cls.__fs_to_date_short__,
+                "PROPERTY": cls.__fs_property_converter__,
+                "RELATIONSHIP": cls.__fs_relationship_converter,
                 "NUMERIC": float,
                 "DECIMAL": float,
-                "LOB": self.__fs_lob_converter,
-                "BLOB": self.__fs_lob_converter,
-                "CLOB": self.__fs_lob_converter,
+                "LOB": cls.__fs_lob_converter,
+                "BLOB": cls.__fs_lob_converter,
+                "CLOB": cls.__fs_lob_converter,
             }
+            props.method_converters = [
+                props.converters["DATETIME"],
+                props.converters["PROPERTY"],
+                props.converters["RELATIONSHIP"],
+            ]
+            props.datetime_formatter = None
+            if cls.__fs_datetime_format__:
+                # compiled once per model
+                props.datetime_formatter = FsDatetimeFormatter(
+                    cls.__fs_datetime_format__
+                )
+                props.converters["DATETIME"] = props.datetime_formatter
+                props.converters["TIMESTAMP"] = props.datetime_formatter
 
             # SQL columns
+            # lists can be serialized a column at a time unless fields are chosen per instance
+            props.columnar = (
+                cls.fs_as_dict is FlaskSerializeMixin.fs_as_dict
+                and cls._fs_get_fields is FlaskSerializeMixin._fs_get_fields
+                and cls.__fs_private_field__ is FlaskSerializeMixin.__fs_private_field__
+            )
+
             props.__exclude_fields = [
                 "fs_as_dict",
                 "fs_as_json",
-            ] + [
-                self._fs_get_field_name(f) for f in self.__fs_exclude_serialize_fields__
-            ]
-            field_list = list(self.__table__.columns)
-            if "sqlite" in self.__table__.dialect_options:
-                props.DIALECT = "sqlite"
-                self.__fs_convert_types__[
-                    str(datetime)
-                ] = self.__fs_sqlite_to_date_converter
-                self.__fs_convert_types__[
-                    str(dict)
-                ] = self.__fs_sqlite_to_dict_json_converter
-                props.converters["JSON"] = self.__fs_sqlite_from_str_json_converter
-
-            for o, v in self.__fs_convert_types_original__.items():
-                if o not in self.__fs_convert_types__:
-                    self.__fs_convert_types__[o] = v
+            ] + [cls._fs_get_field_name(f) for f in cls.__fs_exclude_serialize_fields__]
+            field_list = list(cls.__table__.columns)
+            # SQL expressions are serialized as columns and selected by Core reads
+            props.expressions = {}
+            for name in cls.__fs_expression_fields__:
+                name = cls._fs_get_field_name(name)
+                props.expressions[name] = cls.__fs_expression(name)
+                field_list.append(
+                    _FsCompiled(name=name, type=props.expressions[name].type)
+                )
+            props.DIALECT = cls.__fs_dialect_name()
+            dialect_convert_types = {}
+            if props.DIALECT == "sqlite":
+                dialect_convert_types = {
+                    datetime: cls.__fs_sqlite_to_date_converter,
+                    dict: cls.__fs_sqlite_to_dict_json_converter,
+                }
+                props.converters["JSON"] = cls.__fs_sqlite_from_str_json_converter
 
             # detect primary field
             for f in field_list:
                 if f.primary_key:
-                    props.id = str(getattr(self, f.name, ""))
                     props.primary_key_field = f.name
                     break
 
             # add class properties
             field_list += [
-                PermissiveDict(name=p, type="PROPERTY")
-                for p in dir(self.__class__)
-                if isinstance(getattr(self.__class__, p), property)
-            ]
-            # add relationships
-            field_list += [
-                PermissiveDict(name=self._fs_get_field_name(p), type="RELATIONSHIP")
-                for p in self.__fs_relationship_fields__
+                _FsCompiled(name=p, type="PROPERTY")
+                for p in dir(cls)
+                if isinstance(getattr(cls, p), property)
             ]
+            # add relationships, collections with options, (relationship, options), are
+            # loaded for all the rows at once when not serialized in full
+            props.relationships = {}
+            for p in cls.__fs_relationship_fields__:
+                options = None
+                if isinstance(p, tuple):
+                    p, options = p
+                name = cls._fs_get_field_name(p)
+                if options is not None:
+                    props.relationships[name] = FsRelationship(cls, name, options)
+                field_list.append(_FsCompiled(name=name, type="RELATIONSHIP"))
+            # the reserved args that are not attributes of the model to filter by
+            attributes = set(cls.__mapper__.all_orm_descriptors.keys())
+            props.request_args = frozenset(
+                arg
+                for arg in cls.__fs_reserved_args
+                + [arg for r in props.relationships.values() for arg in r.args]
+                if arg not in attributes
+            )
             # add custom converters
-            for converter, method in self.__fs_column_type_converters__.items():
+            for converter, method in cls.__fs_column_type_converters__.items():
                 props.converters[converter] = method
             # exclude fields / props
             props.field_list = []
+            props.on_demand = []
+            on_demand = [cls._fs_get_field_name(f) for f in cls.__fs_on_demand_fields__]
+            columns = sorted(set(on_demand) & set(cls.__table__.columns.keys()))
+            if columns:
+                raise ValueError(
+                    f"{cls.__name__}.__fs_on_demand_fields__ must be properties or relationships not columns: {columns}"
+                )
+            props.date_parsers = {}
             for f in field_list:
                 if f.name not in props.__exclude_fields:
                     f.c_type = str(f.type).split("(")[0]
+                    if props.DIALECT == "sqlite":
+                        date_parser = FsDateParser.for_column_type(f.c_type)
+                        if date_parser:
+                            props.date_parsers[f.name] = date_parser
                     f.converter = props.converters.get(f.c_type)
+                    f.method_converter = f.converter in props.method_converters
+                    f.column_converter = getattr(f.converter, "column", None)
+                    f.python_type = cls.__fs_python_type(f)
+                    f.binary = f.python_type is bytes
+                    f.update_type = cls.__fs_update_type(f.c_type)
+                    f.related = props.relationships.get(f.name)
+                    prop = getattr(cls, f.name, None)
+                    f.cached = (
+                        prop
+                        if f.c_type == "PROPERTY"
+                        and isinstance(prop, FlaskSerializeCachedProperty)
+                        else None
+                    )
+                    f.source = (
+                        f"fs_as_dict:{f.name}"
+                        if f.c_type in ("PROPERTY", "RELATIONSHIP")
+                        else None
+                    )
                     if not f.converter:
                         # any non json supported types gets a str
                         if (
                             getattr(f.type, "python_type", None)
-                            not in self.__fs_json_types
+                            not in cls.__fs_json_types
                         ):
                             f.converter = str
-                    props.field_list.append(f)
+                    f.converter_name = (
+                        f"{f.c_type}:{getattr(f.converter, '__qualname__', f.converter)}"
+                        if f.converter
+                        else ""
+                    )
+                    if f.name in on_demand:
+                        props.on_demand.append(f)
+                    else:
+                        props.field_list.append(f)
+            props.field_names = tuple(f.name for f in props.field_list)
+            props.on_demand_names = frozenset(f.name for f in props.on_demand)
+            props.cached = [
+                f.cached for f in props.field_list + props.on_demand if f.cached
+            ]
+            # related objects can be reused when serialized by fs_as_dict of the mixin
+            props.memo = (
+                cls.__fs_memo_related__
+                and cls.fs_as_dict is FlaskSerializeMixin.fs_as_dict
+            )
 
-            self.__fs_model_props[self.__table__] = props
+            # to db conversions of this model and dialect, the defaults, then the model's
+            # own and then those of the dialect
+            props.convert_types = FsConvertTypes(
+                [
+                    FlaskSerializeMixin.__fs_convert_types_original__,
+                    cls.__fs_convert_types__,
+                    dialect_convert_types,
+                ],
+                known_types={f.python_type for f in props.field_list if f.python_type},
+            )
+            props.update_converters = {}
+            for f in props.field_list:
+                converter = f.update_type and props.convert_types.get(f.update_type)
+                if converter:
+                    props.update_converters[f.name] = converter
+
+            # lists can be read with a Core select() of the columns when no field or
+            # access check needs an instance
+            props.core = (
+                props.columnar
+                and cls.__fs_can_access__ is FlaskSerializeMixin.__fs_can_access__
+                and all(
+                    cls.__fs_core_field(f)
+                    for f in props.field_list
+                    if f.name not in cls.__fs_exclude_json_serialize_fields__
+                )
+            )
+
+            cls.__fs_model_props[cls.__table__] = props
         return props
 
+    @classmethod
+    def fs_compile_models(cls) -> list:
+        """
+        compile the properties of every mapped model using this mixin now rather than on
+        their first serialization
+
+        :return: list of the models compiled
+        """
+        models = []
+        pending = cls.__subclasses__()
+        while pending:
+            model = pending.pop()
+            pending.extend(model.__subclasses__())
+            if model not in models and getattr(model, "__table__", None) is not None:
+                model.__fs_props()
+                models.append(model)
+        return models
+
+    @classmethod
+    def fs_init_app(cls, app) -> list:
+        """
+        compile the models already imported, and the rest on the first request of the app,
+        so models imported after this, as with FlaskSerialize(db, app) before the models,
+        are compiled too.  Called before the first request of the app, once the models are
+        imported and before the workers fork, ie: gunicorn --preload, the properties are
+        shared by the workers and no first request per model and worker pays for them.
+
+        :param app: Flask app
+        :return: list of the models compiled now
+        """
+        pending = [True]
+
+        def compile_models():
+            if pending:
+                cls.fs_compile_models()
+                pending.clear()
+
+        app.before_request(compile_models)
+        with app.app_context():
+            return cls.fs_compile_models()
+
+    @classmethod
+    def __fs_expression(cls, name: str):
+        """
+        private: the SQL expression of a column_property or hybrid_property of the model
+
+        :param name: field name from __fs_expression_fields__
+        :return: class attribute of the expression
+        """
+        mapper = cls.__mapper__
+        if (
+            name in mapper.column_attrs and name not in cls.__table__.columns
+        ) or isinstance(mapper.all_orm_descriptors.get(name), hybrid_property):
+            return getattr(cls, name)
+        raise ValueError(
+            f"{cls.__name__}.__fs_expression_fields__ must be column_property or hybrid_property: {name}"
+        )
+
+    @staticmethod
+    def __fs_python_type(field):
+        """
+        private: python type of a column or None
+
+        :param field: column or property
+        :return: type or None
+        """
+        try:
+            return field.type.python_type
+        except (AttributeError, NotImplementedError):
+            return None
+
     def _fs_get_fields(self) -> List[str]:
         """
         return a list of field objects that are valid
@@ -497,7 +1634,7 @@ class FlaskSerializeMixin:
         :return: list of strings
         """
         fields = []
-        for c in self._fs_get_props().field_list:
+        for c in self.__fs_field_list(self._fs_get_props()):
             if not self.__fs_private_field__(c.name):
                 fields.append(c)
         return fields
@@ -514,92 +1651,194 @@ class FlaskSerializeMixin:
         :return {dict} the item as a dict
         """
 
+        profiler = _FsInstrumentation.profiler
+        if profiler:
+            return self.__fs_as_dict_profiled(profiler)
+
         # built in converters
         # can be replaced using __fs_column_type_converters__
         d = {}
-
+        read = self.__fs_read_field
+        convert = self.__fs_convert_value
         for c in self._fs_get_fields():
-            try:
-                d[c.name] = v = getattr(self, c.name, "")
-            except Exception as e:
-                v = str(e)
-
-            if v is None:
-                d[c.name] = ""
-            elif c.converter:
-                try:
-                    d[c.name] = c.converter(v)
-                except Exception as e:
-                    d[
-                        c.name
-                    ] = 'Error:"{}". Failed to convert [{}] type:{} value:{}'.format(
-                        e, c.name, c.c_type, v
-                    )
-                    current_app.logger.warning(d[c.name])
+            if c.cached:
+                v = self.__fs_cached_value(c)
+            else:
+                v = convert(c, self, read(c))
+            if v is not _FS_MISSING:
+                d[c.name] = v
         return d
 
-    def __fs_get_update_field_type(self, field, value):
+    def __fs_read_field(self, c):
         """
-        get the type of the update to db field from cached table properties
+        private: read field c as fs_as_dict does, a failed read becomes the error message
+        or _FS_MISSING when the field has no converter
 
-        :param field: the field to lookup
-        :param value: unused
-        :return: class of the type
+        :param c: field from _fs_get_props field_list
+        :return: the value read
         """
-        props = self._fs_get_props()
-        if props:
-            for f in props.field_list:
-                if f.name == field:
-                    if (
-                        f.c_type.startswith("VARCHAR")
-                        or f.c_type.startswith("CHAR")
-                        or f.c_type.startswith("TEXT")
-                    ):
-                        return str
-                    if f.c_type.startswith("INTEGER"):
-                        return int
-                    if (
-                        f.c_type.startswith("FLOAT")
-                        or f.c_type.startswith("REAL")
-                        or f.c_type.startswith("NUMERIC")
-                    ):
-                        return float
-                    if f.c_type.startswith("DATE") or f.c_type.startswith("TIME"):
-                        return datetime
-                    if f.c_type.startswith("BOOLEAN"):
-                        return bool
-                    if "JSON" in f.c_type:
-                        return dict
-                    if "LOB" in f.c_type:
-                        return bytes
+        try:
+            if not c.source:
+                return getattr(self, c.name, "")
+            # relationships and properties may issue SQL
+            with fs_source(c.source):
+                if c.related:
+                    return c.related.load([self])[0]
+                return getattr(self, c.name, "")
+        except Exception as e:
+            return str(e) if c.converter else _FS_MISSING
+
+    def __fs_cached_value(self, c):
+        """
+        private: the converted value of fs_cached_property field c, from its cache when
+        read within the ttl.  Values are cached per path, depth and include as related
+        rows depend on them, and copied so that callers cannot alter the cache.  Failed
+        reads are not cached.
 
+        :param c: field from _fs_get_props field_list
+        :return: the converted value
+        """
+        key = c.cached.key(self)
+        if key is not None:
+            context = (fs_path_key(), fs_included(), fs_native_bytes())
+            v = c.cached.cache.get(key, context, _FS_MISSING)
+            if v is not _FS_MISSING:
+                return deepcopy(v) if isinstance(v, _FS_MUTABLE) else v
+        try:
+            with fs_source(c.source):
+                v = getattr(self, c.name, "")
+        except Exception as e:
+            return self.__fs_convert_value(c, self, str(e))
+        v = self.__fs_convert_value(c, self, v)
+        if key is not None:
+            c.cached.cache.set(
+                key, context, deepcopy(v) if isinstance(v, _FS_MUTABLE) else v
+            )
+        return v
+
+    def __fs_invalidate_cached(self) -> None:
+        """
+        private: drop the fs_cached_property values of this row, on update and delete
+        """
+        caches = self.__fs_props().cached
+        if not caches:
+            return
+        key = caches[0].key(self)
+        if key is not None:
+            for cached in caches:
+                cached.cache.discard(key)
+
+    def __fs_as_dict_profiled(self, profiler) -> dict:
+        """
+        private: fs_as_dict recording the time taken to read and convert each field
+
+        :param profiler: FlaskSerializeProfiler to record with
+        :return {dict} the item as a dict
+        """
+        d = {}
+        model = self.__class__.__name__
+        as_dict_start = perf_counter()
+        for c in self._fs_get_fields():
+            start = perf_counter()
+            if c.cached:
+                # read and converted, or taken from the cache
+                v = self.__fs_cached_value(c)
+                read = perf_counter()
+            else:
+                v = self.__fs_read_field(c)
+                read = perf_counter()
+                v = self.__fs_convert_value(c, self, v)
+            if v is not _FS_MISSING:
+                d[c.name] = v
+            profiler.record_field(
+                model, c.name, c.converter_name, read - start, perf_counter() - read
+            )
+        profiler.record_model(model, perf_counter() - as_dict_start)
+        return d
+
+    @staticmethod
+    def __fs_update_type(c_type):
+        """
+        private: the type of the update to a db column of type c_type, compiled once per field
+
+        :param c_type: column type name
+        :return: class of the type or None
+        """
+        if (
+            c_type.startswith("VARCHAR")
+            or c_type.startswith("CHAR")
+            or c_type.startswith("TEXT")
+        ):
+            return str
+        if c_type.startswith("INTEGER"):
+            return int
+        if (
+            c_type.startswith("FLOAT")
+            or c_type.startswith("REAL")
+            or c_type.startswith("NUMERIC")
+        ):
+            return float
+        if c_type.startswith("DATE") or c_type.startswith("TIME"):
+            return datetime
+        if c_type.startswith("BOOLEAN"):
+            return bool
+        if "JSON" in c_type:
+            return dict
+        if "LOB" in c_type:
+            return bytes
         return None
 
+    @classmethod
+    def __fs_dialect_name(cls):
+        """
+        private: name of the database dialect of the bind of this model, ie: sqlite
+
+        :return: str or None
+        """
+        try:
+            return cls.db.session.get_bind(mapper=cls.__mapper__).dialect.name
+        except Exception:
+            # no db or app context, the table has been created on sqlite
+            if "sqlite" in cls.__table__.dialect_options:
+                return "sqlite"
+            return None
+
     def __fs_convert_value_to_db_suitable_value(self, name, value):
         """
         convert the value based upon type to a representation suitable for saving to the db
         override built in conversions by setting the value of __fs_convert_types__.
-        First uses bare value to determine type and then uses db derived values
+        First uses the type of the bare value, then the type derived from the db column and
+        then the nearest base class of the value type
         ie:
-        __fs_convert_types__ = {str(bool): lambda x: not x}
+        __fs_convert_types__ = {bool: lambda x: not x}
 
         :param name: name of the field to update
         :param value: value to update with
         :return: the converted value
         """
-        lookup_key = str(type(value))
-        if lookup_key in self.__fs_convert_types__:
-            value = self.__fs_convert_types__[lookup_key](value)
-            return value
+        props = self._fs_get_props()
+        value_type = type(value)
+        converter = props.convert_types.get(value_type)
+        if converter is None:
+            converter = props.update_converters.get(name)
+            if converter is None:
+                converter = props.convert_types.lookup(value_type)
+                if converter is None:
+                    return value
+        return self.__fs_db_converter(name, converter)(value)
 
-        instance_type = self.__fs_get_update_field_type(name, value)
-        if instance_type:
-            lookup_key = str(instance_type)
-            if lookup_key in self.__fs_convert_types__:
-                value = self.__fs_convert_types__[lookup_key](value)
-                return value
+    def __fs_db_converter(self, name, converter):
+        """
+        private: converter, or for sqlite date conversion the date parser of field name,
+        which remembers the last format that worked
 
-        return value
+        :param name: name of the field to update
+        :param converter: converter from props convert_types
+        :return: converter
+        """
+        if converter is FlaskSerializeMixin.__fs_sqlite_to_date_converter:
+            return self._fs_get_props().date_parsers.get(name, converter)
+        return converter
 
     @classmethod
     def _fs_get_field_name(cls, field) -> str:
@@ -626,6 +1865,38 @@ class FlaskSerializeMixin:
         if not cls.db:
             raise FlaskSerializeNoDb()
 
+        with fs_span("create", cls):
+            return cls.__fs_request_create(**kwargs)
+
+    @classmethod
+    def __fs_request_create(cls, **kwargs):
+        """
+        private: create, commit and return a new item from the request
+
+        :return: the new created item
+        """
+        try:
+            json_data = request.get_json(force=True)
+        except:
+            json_data = request.form
+
+        new_item = cls.__fs_new_from_dict(json_data, **kwargs)
+        cls.db.session.add(new_item)
+        with fs_span("commit", cls), fs_phase("commit"):
+            cls.db.session.commit()
+        with fs_span("after_commit", cls), fs_phase("after-commit"):
+            new_item.__fs_after_commit__(create=True)
+        return new_item
+
+    @classmethod
+    def __fs_new_from_dict(cls, json_data, **kwargs):
+        """
+        private: a new item with the __fs_create_fields__ in json_data converted, verified
+        and timestamped.  Not added to the session.
+
+        :param json_data: dict of field values
+        :return: the new item
+        """
         new_item = cls(**kwargs)
 
         fs_create_fields = list(new_item.__fs_create_fields__)
@@ -637,27 +1908,22 @@ class FlaskSerializeMixin:
                 and c.name != new_item._fs_get_props().primary_key_field
             ]
 
-        try:
-            json_data = request.get_json(force=True)
-        except:
-            json_data = request.form
-
-        if len(json_data) > 0:
-            for field in fs_create_fields:
-                field = cls._fs_get_field_name(field)
-                if field in json_data:
-                    value = json_data.get(field)
-                    setattr(
-                        new_item,
-                        field,
-                        new_item.__fs_convert_value_to_db_suitable_value(field, value),
-                    )
+        with fs_phase("update"):
+            if len(json_data) > 0:
+                for field in fs_create_fields:
+                    field = cls._fs_get_field_name(field)
+                    if field in json_data:
+                        value = json_data.get(field)
+                        setattr(
+                            new_item,
+                            field,
+                            new_item.__fs_convert_value_to_db_suitable_value(
+                                field, value
+                            ),
+                        )
 
-        new_item.__fs_verify__(create=True)
-        new_item.__fs_update_timestamp__()
-        cls.db.session.add(new_item)
-        cls.db.session.commit()
-        new_item.__fs_after_commit__(create=True)
+            new_item.__fs_verify__(create=True)
+            new_item.__fs_update_timestamp__()
         return new_item
 
     def __fs_request_update(self, json_data: dict) -> bool:
@@ -666,18 +1932,166 @@ class FlaskSerializeMixin:
         :param json_data:
         :return: boolean
         """
-        if not self.__fs_can_update__():
-            return False
-        self.fs_update_from_dict(json_data)
-        self.__fs_verify__()
-        self.__fs_update_timestamp__()
-        if not self.db:
-            raise FlaskSerializeNoDb()
-        self.db.session.add(self)
-        self.db.session.commit()
-        self.__fs_after_commit__()
+        with fs_span("update", self.__class__):
+            if not self.__fs_apply_update(json_data):
+                return False
+            if not self.db:
+                raise FlaskSerializeNoDb()
+            self.db.session.add(self)
+            with fs_span("commit", self.__class__), fs_phase("commit"):
+                self.db.session.commit()
+            # values read before the commit by other sessions
+            self.__fs_invalidate_cached()
+            with fs_span("after_commit", self.__class__), fs_phase("after-commit"):
+                self.__fs_after_commit__()
+            return True
+
+    def __fs_apply_update(self, json_data) -> bool:
+        """
+        private: when __fs_can_update__() apply the update fields in json_data, verify and
+        timestamp without committing
+
+        :param json_data: dict of field values
+        :return: False when update is not allowed
+        """
+        with fs_span("access", self.__class__), fs_source(
+            "__fs_can_access__", "access-check"
+        ):
+            if not self.__fs_can_update__():
+                return False
+        with fs_phase("update"):
+            self.fs_update_from_dict(json_data)
+            self.__fs_verify__()
+            self.__fs_update_timestamp__()
         return True
 
+    @classmethod
+    def fs_ndjson_import(
+        cls, stream=None, batch_size=None, user=None, **kwargs
+    ) -> dict:
+        """
+        create or update items from newline delimited JSON, one object per line, read
+        incrementally from stream or the request body.  Lines with the primary key of an
+        existing item update it as fs_request_update_json, others are created as
+        fs_request_create_form, using **kwargs to set properties of the new items.
+        Rows are committed batch_size at a time, a failed line or batch is reported
+        in errors and does not stop the import.  The rows updated are locked until their
+        batch is committed, and a failed __fs_after_commit__ of a committed row is
+        reported in errors.
+
+        :param stream: file like object of lines, default request.stream
+        :param batch_size: rows per transaction, default __fs_stream_batch_size__
+        :param user: only update items of this user, as fs_get_by_user_or_404, and set
+        __fs_user_field__ of the new items to it
+        :return: dict of created, updated and errors, a list of dict(line, error)
+        """
+        if not cls.db:
+            raise FlaskSerializeNoDb()
+
+        if user is not None:
+            kwargs[cls.__fs_user_field__] = user
+        with fs_span("import", cls) as span:
+            summary = cls.__fs_ndjson_import(
+                request.stream if stream is None else stream,
+                batch_size or cls.__fs_stream_batch_size__,
+                user,
+                kwargs,
+            )
+            span.set_attribute("rows", summary["created"] + summary["updated"])
+            return summary
+
+    @classmethod
+    def __fs_ndjson_import(cls, stream, batch_size: int, user, kwargs: dict) -> dict:
+        """
+        private: fs_ndjson_import inside the import span
+        """
+        session = cls.db.session
+        keys = [c.name for c in cls.__table__.primary_key.columns]
+        summary = dict(created=0, updated=0, errors=[])
+        # (line, item, create) of the current transaction
+        pending = []
+
+        def commit():
+            try:
+                with fs_phase("commit"):
+                    session.commit()
+            except Exception as e:
+                session.rollback()
+                summary["errors"].append(
+                    dict(line=pending[0][0], to_line=pending[-1][0], error=str(e))
+                )
+                return
+            with fs_phase("after-commit"):
+                for line, item, create in pending:
+                    summary["created" if create else "updated"] += 1
+                    if not create:
+                        item.__fs_invalidate_cached()
+                    try:
+                        item.__fs_after_commit__(create=create)
+                    except Exception as e:
+                        # committed, but reported as the lines that fail are
+                        summary["errors"].append(dict(line=line, error=str(e)))
+
+        for line, row in fs_read_json_lines(stream):
+            if not isinstance(row, dict):
+                error = row if isinstance(row, Exception) else "not a JSON object"
+                summary["errors"].append(dict(line=line, error=str(error)))
+                continue
+            item = None
+            try:
+                if keys and all(row.get(k) is not None for k in keys):
+                    item = cls.__fs_import_item(session, keys, row, user)
+                if item is None:
+                    create = True
+                    item = cls.__fs_new_from_dict(row, **kwargs)
+                    session.add(item)
+                else:
+                    create = False
+                    if not item.__fs_apply_update(row):
+                        raise Exception("UPDATE forbidden")
+            except Exception as e:
+                if item is not None:
+                    # discard the partly applied update
+                    session.expire(item)
+                summary["errors"].append(dict(line=line, error=str(e)))
+                continue
+            pending.append((line, item, create))
+            if len(pending) >= batch_size:
+                commit()
+                pending.clear()
+        if pending:
+            commit()
+        return summary
+
+    @classmethod
+    def __fs_import_item(cls, session, keys: list, row: dict, user):
+        """
+        private: the existing item of an imported row with a primary key, found as
+        fs_get_by_user_or_404 when user is given.  The row is locked until the batch is
+        committed so concurrent imports of it do not lose updates.
+
+        :param session: db session
+        :param keys: primary key column names
+        :param row: dict of the line
+        :param user: the user to use as a filter or None
+        :return: the item or None to create it
+        """
+        with session.no_autoflush:
+            if user is not None:
+                filters = {k: row[k] for k in keys}
+                filters[cls.__fs_user_field__] = user
+                item = cls.query.filter_by(**filters).with_for_update().first()
+                if item is None:
+                    raise Exception("Not found")
+            else:
+                key = tuple(row[k] for k in keys)
+                item = session.get(
+                    cls, key[0] if len(key) == 1 else key, with_for_update=True
+                )
+        if item is not None and not item.__fs_access_allowed():
+            raise Exception("Access forbidden")
+        return item
+
     def fs_request_update_form(self):
         """
         update/create the item using form data from the request object
@@ -745,6 +2159,7 @@ class FlaskSerializeMixin:
                         field, data_dict[field]
                     ),
                 )
+        self.__fs_invalidate_cached()
 
     def __fs_can_access__(self):
         """
@@ -755,6 +2170,15 @@ class FlaskSerializeMixin:
         """
         return True
 
+    def __fs_access_allowed(self) -> bool:
+        """
+        private: __fs_can_access__() with any SQL statements attributed to access checks
+
+        :return: True/False
+        """
+        with fs_source("__fs_can_access__", "access-check"):
+            return self.__fs_can_access__()
+
     def __fs_can_update__(self):
         """
         hook to see if can update
@@ -803,7 +2227,14 @@ class FlaskSerializeMixin:
         }
 
     @classmethod
-    def fs_get_delete_put_post(cls, item_id=None, user=None, prop_filters=None):
+    def fs_get_delete_put_post(
+        cls,
+        item_id=None,
+        user=None,
+        prop_filters=None,
+        include=None,
+        ndjson_import=False,
+    ):
         """
         get, delete, post, put with JSON/FORM a single model item
 
@@ -813,14 +2244,36 @@ class FlaskSerializeMixin:
         :param item_id: the primary key of the item - if none and method is 'GET' returns all items
         :param user: user to use as query filter.
         :param prop_filters: dictionary of key:value pairs to limit results to.
+        :param include: (optional) list of __fs_on_demand_fields__ to serialize
+        :param ndjson_import: import a POST of NDJSON with fs_ndjson_import, as the user
         :return: json object: {message}, or the item.  throws error when problem
         """
+        if item_id is None:
+            operation = "create" if request.method == "POST" else "list"
+        else:
+            operation = cls.__fs_method_operations.get(request.method, "get")
+        with fs_output_scope(), cls.__fs_memo_scope(), cls.__fs_include_scope(
+            include
+        ), fs_span(operation, cls):
+            return cls.__fs_get_delete_put_post(
+                item_id, user, prop_filters, ndjson_import
+            )
+
+    @classmethod
+    def __fs_get_delete_put_post(cls, item_id, user, prop_filters, ndjson_import):
+        """
+        private: fs_get_delete_put_post inside the operation span
+        """
         item = None
         if user is not None and item_id is not None:
-            item = cls.fs_get_by_user_or_404(item_id, user=user)
+            with fs_span("query", cls):
+                item = cls.fs_get_by_user_or_404(item_id, user=user)
         elif item_id is not None:
-            item = cls.query.get_or_404(item_id)
-            if not item.__fs_can_access__():
+            with fs_span("query", cls), fs_phase("hydrate"):
+                item = cls.query.get_or_404(item_id)
+            with fs_span("access", cls):
+                allowed = item.__fs_access_allowed()
+            if not allowed:
                 return Response("Access forbidden", 403)
         elif request.method == "GET":
             return cls.__get_all(prop_filters, user)
@@ -828,6 +2281,10 @@ class FlaskSerializeMixin:
         try:
             if not item:
                 if request.method == "POST":
+                    if request.mimetype in NDJSON_TYPES:
+                        if not ndjson_import:
+                            return Response("NDJSON import not supported", 415)
+                        return cls.__fs_response(cls.fs_ndjson_import(user=user))
                     return cls.fs_request_create_form().fs_as_json
                 return Response("METHOD forbidden", 405)
 
@@ -837,15 +2294,16 @@ class FlaskSerializeMixin:
 
             elif request.method == "POST" or request.method == "PUT":
                 # update single item with locked row
-                item = cls.query.with_for_update(of=cls).get_or_404(item_id)
+                with fs_span("query", cls), fs_phase("hydrate"):
+                    item = cls.query.with_for_update(of=cls).get_or_404(item_id)
                 if item.fs_request_update_form():
-                    return jsonify(
-                        dict(
+                    with fs_span("serialize", cls):
+                        data = dict(
                             message="Updated",
                             item=item.__fs_as_exclude_json_dict(),
                             properties=item.__fs_return_properties(),
                         )
-                    )
+                    return cls.__fs_response(data)
                 cls.db.session.rollback()
                 return Response("UPDATE forbidden", 403)
 
@@ -853,10 +2311,18 @@ class FlaskSerializeMixin:
                 # delete a single item
                 if not cls.db:
                     raise FlaskSerializeNoDb()
-                if item.__fs_can_delete__():
+                with fs_span("access", cls), fs_source(
+                    "__fs_can_access__", "access-check"
+                ):
+                    can_delete = item.__fs_can_delete__()
+                if can_delete:
                     cls.db.session.delete(item)
-                    cls.db.session.commit()
-                    return jsonify(dict(item=item.fs_as_dict, message="Deleted"))
+                    with fs_span("commit", cls), fs_phase("commit"):
+                        cls.db.session.commit()
+                    with fs_span("serialize", cls), fs_phase("serialize"):
+                        data = dict(item=item.fs_as_dict, message="Deleted")
+                    item.__fs_invalidate_cached()
+                    return cls.__fs_response(data)
                 return Response("DELETE forbidden", 403)
 
         except Exception as e:
@@ -894,10 +2360,13 @@ class FlaskSerializeMixin:
                 pass
             return value
 
+        output = cls.__fs_request_format()
         kwargs = dict()
 
         if cls.__fs_filter_by__ and request.method == "GET":
             kwargs = dict(request.args)
+            for arg in cls.__fs_props().request_args:
+                kwargs.pop(arg, None)
 
         try:
             # don't allow filtering by excluded fields
@@ -914,7 +2383,8 @@ class FlaskSerializeMixin:
         except Exception as e:
             return str(e), cls.__fs_http_error_code
 
-        return cls.fs_json_list(result, prop_filters=prop_filters)
+        with fs_source("__get_all"):
+            return cls.fs_json_list(result, prop_filters=prop_filters, output=output)
 
     @classmethod
     def fs_json_first(cls, **kwargs):
@@ -925,20 +2395,25 @@ class FlaskSerializeMixin:
         :param kwargs: SQLAlchemy query.filter_by arguments
         :return: flask response json item or {} if no result
         """
-        item = cls.query.filter_by(**kwargs).first()
-        if not item or not item.__fs_can_access__():
-            return jsonify({})
+        with fs_output_scope(), cls.__fs_memo_scope(), fs_span("get", cls):
+            with fs_span("query", cls), fs_phase("hydrate"):
+                item = cls.query.filter_by(**kwargs).first()
+            if not item or not item.__fs_access_allowed():
+                return cls.__fs_response({})
 
-        return item.fs_as_json
+            return item.fs_as_json
 
 
-def FlaskSerialize(db=None) -> Type[FlaskSerializeMixin]:
+def FlaskSerialize(db=None, app=None) -> Type[FlaskSerializeMixin]:
     """
     Factory to
     return the FlaskSerializeMixin mixin class, optionally initialize the db values
 
     :param db: (optional) SQLAlchemy db instance
+    :param app: (optional) Flask app to compile the models with fs_init_app
     :return: FlaskSerializeMixin mixin
     """
     FlaskSerializeMixin.db = db
+    if app is not None:
+        FlaskSerializeMixin.fs_init_app(app)
     return FlaskSerializeMixin
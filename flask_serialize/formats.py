@@ -0,0 +1,523 @@
+import csv
+import io
+import json
+import zlib
+from contextlib import contextmanager
+from datetime import date, datetime, time
+from decimal import Decimal
+from contextvars import ContextVar
+
+from json.encoder import encode_basestring, encode_basestring_ascii
+
+from flask import current_app, has_request_context, request, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+MSGPACK_TYPES = [
+    "application/msgpack",
+    "application/x-msgpack",
+    "application/vnd.msgpack",
+]
+CBOR_TYPES = ["application/cbor"]
+NDJSON_TYPES = ["application/x-ndjson", "application/jsonl"]
+# streamed list formats by media type
+STREAM_TYPES = {media_type: "ndjson" for media_type in NDJSON_TYPES}
+STREAM_TYPES["text/csv"] = "csv"
+ARROW_TYPES = {
+    "application/vnd.apache.arrow.stream": "arrow",
+    "application/vnd.apache.parquet": "parquet",
+}
+if pyarrow is not None:
+    STREAM_TYPES.update(ARROW_TYPES)
+
+# negotiated binary media type of the response being serialized, None for JSON
+_fs_output = ContextVar("flask_serialize_output", default=None)
+
+
+def _json_default(value):
+    """
+    convert values JSON does not support as the app JSON provider does, ie: Decimal, date
+    """
+    default = getattr(current_app.json, "default", None)
+    if default is None:
+        return str(value)
+    return default(value)
+
+
+def _msgpack_encode(data) -> bytes:
+    return msgpack.packb(data, use_bin_type=True, default=_json_default)
+
+
+def _cbor_encode(data) -> bytes:
+    return cbor2.dumps(
+        data, default=lambda encoder, value: encoder.encode(_json_default(value))
+    )
+
+
+def fs_binary_encoders() -> dict:
+    """
+    binary encoders of the installed libraries
+
+    :return: dict of media type: encode function
+    """
+    encoders = {}
+    if msgpack is not None:
+        encoders.update({media_type: _msgpack_encode for media_type in MSGPACK_TYPES})
+    if cbor2 is not None:
+        encoders.update({media_type: _cbor_encode for media_type in CBOR_TYPES})
+    return encoders
+
+
+_encoders = fs_binary_encoders()
+
+
+def fs_negotiate() -> str:
+    """
+    the binary media type of the current request Accept header when preferred to JSON and
+    the library is installed
+
+    :return: media type or None for JSON
+    """
+    if not _encoders or not has_request_context():
+        return None
+    best = request.accept_mimetypes.best_match(["application/json"] + list(_encoders))
+    if best in _encoders and request.accept_mimetypes[best]:
+        return best
+    return None
+
+
+@contextmanager
+def fs_output_scope():
+    """
+    negotiate the response format for the duration of a mixin response method.  While a
+    binary format is active LOB columns are serialized as bytes.
+    """
+    token = _fs_output.set(fs_negotiate())
+    try:
+        yield
+    finally:
+        _fs_output.reset(token)
+
+
+def fs_native_bytes() -> bool:
+    """
+    :return: True when bytes can be serialized without decoding
+    """
+    return _fs_output.get() is not None
+
+
+def fs_encode_response(data):
+    """
+    encode data as the negotiated format
+
+    :param data: serialized dict or list
+    :return: flask response
+    """
+    media_type = _fs_output.get()
+    if media_type is None:
+        response = current_app.json.response(data)
+    else:
+        response = current_app.response_class(
+            _encoders[media_type](data), mimetype=media_type
+        )
+    if _encoders:
+        response.vary.add("Accept")
+    return response
+
+
+_JSON_FLOATS = {"nan": "NaN", "inf": "Infinity", "-inf": "-Infinity"}
+_JSON_CONSTANTS = {True: "true", False: "false", None: "null"}
+
+
+def _json_float(value: float) -> str:
+    text = float.__repr__(value)
+    return _JSON_FLOATS.get(text, text)
+
+
+def _json_writer_provider(response: bool):
+    """
+    the app JSON provider when its output can be written directly
+
+    :param response: True for a JSON response that may be indented in debug mode
+    :return: DefaultJSONProvider or None
+    """
+    provider = current_app.json
+    provider_class = type(provider)
+    if (
+        provider_class.dumps is not DefaultJSONProvider.dumps
+        or provider_class.response is not DefaultJSONProvider.response
+    ):
+        return None
+    if response and (
+        provider.compact is False or (provider.compact is None and current_app.debug)
+    ):
+        return None
+    return provider
+
+
+def _json_column(values: list, encode_str, dumps) -> list:
+    """
+    JSON text of each value of a column, by type for columns of one type
+    """
+    kinds = set(map(type, values))
+    if len(kinds) == 1:
+        kind = kinds.pop()
+        if kind is str:
+            return list(map(encode_str, values))
+        if kind is int:
+            return list(map(int.__repr__, values))
+        if kind is float:
+            return list(map(_json_float, values))
+    text = []
+    for v in values:
+        kind = type(v)
+        if kind is str:
+            text.append(encode_str(v))
+        elif kind is bool or v is None:
+            text.append(_JSON_CONSTANTS[v])
+        elif kind is int:
+            text.append(int.__repr__(v))
+        elif kind is float:
+            text.append(_json_float(v))
+        else:
+            text.append(dumps(v, separators=(",", ":")))
+    return text
+
+
+def fs_json_rows(names: list, columns: list, index=None, response: bool = True):
+    """
+    write serialized columns as the JSON text of each row without building a dict per
+    row, giving the same text as the app JSON provider for a dict of each row.  Each
+    column is encoded at once and rows are formatted from a template of the pre-encoded
+    keys.
+
+    :param names: field names
+    :param columns: a list of serialized values per field name
+    :param index: row numbers to write in order, default all
+    :param response: True when writing a JSON response, False for NDJSON lines
+    :return: list of str, or None when the app JSON provider is not the default
+    """
+    provider = _json_writer_provider(response)
+    if provider is None:
+        return None
+    if index is not None:
+        columns = [[column[i] for i in index] for column in columns]
+    encode_str = encode_basestring_ascii if provider.ensure_ascii else encode_basestring
+    order = range(len(names))
+    if provider.sort_keys:
+        order = sorted(order, key=names.__getitem__)
+    template = (
+        "{"
+        + ",".join(encode_str(names[n]).replace("%", "%%") + ":%s" for n in order)
+        + "}"
+    )
+    text = [_json_column(columns[n], encode_str, provider.dumps) for n in order]
+    if not text:
+        return [template] * (len(index) if index is not None else 0)
+    return [template % row for row in zip(*text)]
+
+
+def fs_json_rows_response(rows: list):
+    """
+    JSON list response of rows from fs_json_rows
+
+    :param rows: list of JSON text
+    :return: flask response
+    """
+    response = current_app.response_class(
+        "[" + ",".join(rows) + "]\n", mimetype=current_app.json.mimetype
+    )
+    if _encoders:
+        response.vary.add("Accept")
+    return response
+
+
+def fs_accepted_stream() -> str:
+    """
+    the streamed list format the current request Accept header prefers to JSON
+
+    :return: ndjson, csv or None
+    """
+    if not has_request_context():
+        return None
+    best = request.accept_mimetypes.best_match(
+        ["application/json"] + list(STREAM_TYPES)
+    )
+    if best in STREAM_TYPES and request.accept_mimetypes[best]:
+        return STREAM_TYPES[best]
+    return None
+
+
+def fs_json_lines(batches):
+    """
+    encode batches of serialized rows as newline delimited JSON, a chunk per batch
+
+    :param batches: iterable of lists of dict
+    :return: generator of str
+    """
+    dumps = current_app.json.dumps
+    for rows in batches:
+        if rows:
+            yield "".join(dumps(row, separators=(",", ":")) + "\n" for row in rows)
+
+
+def fs_read_json_lines(stream):
+    """
+    read newline delimited JSON one line at a time
+
+    :param stream: binary or text file like object
+    :return: generator of (line number, value or the exception decoding the line)
+    """
+    for number, line in enumerate(stream, 1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as e:
+            yield number, e
+
+
+def _csv_cell(value, dumps):
+    if isinstance(value, (dict, list)):
+        # relationships and JSON columns
+        return dumps(value, separators=(",", ":"))
+    return value
+
+
+def fs_csv_lines(fields: list, batches):
+    """
+    encode batches of serialized rows as CSV with a header row of fields, a chunk per
+    batch.  Fields a row does not have are empty, dict and list values are JSON.
+
+    :param fields: field names in column order
+    :param batches: iterable of lists of dict
+    :return: generator of str
+    """
+    dumps = current_app.json.dumps
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for rows in batches:
+        writer.writerows([_csv_cell(row.get(f), dumps) for f in fields] for row in rows)
+        if buffer.tell():
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def fs_stream_response(chunks, mimetype: str, compress: bool = True):
+    """
+    stream chunks as the response body in the current request context, gzip compressed
+    when the request Accept-Encoding allows
+
+    :param chunks: generator of str or bytes
+    :param mimetype: response media type
+    :param compress: False when the format is already compressed
+    :return: streamed flask response
+    """
+    gzip = compress and has_request_context() and request.accept_encodings["gzip"]
+    if gzip:
+        chunks = _gzip(chunks)
+    response = current_app.response_class(
+        stream_with_context(chunks), mimetype=mimetype
+    )
+    if gzip:
+        response.content_encoding = "gzip"
+    response.vary.update(("Accept", "Accept-Encoding"))
+    return response
+
+
+def fs_arrow_available() -> bool:
+    """
+    :return: True when pyarrow is installed
+    """
+    return pyarrow is not None
+
+
+def fs_arrow_schema(fields: list):
+    """
+    arrow schema of compiled fields
+
+    :param fields: fields from _fs_get_props field_list
+    :return: pyarrow Schema
+    """
+    return pyarrow.schema([(c.name, fs_arrow_type(c)) for c in fields])
+
+
+def fs_arrow_type(field):
+    """
+    arrow type of a compiled field from its column python type.  JSON columns, properties
+    and relationships are strings.
+
+    :param field: field from _fs_get_props field_list
+    :return: pyarrow DataType
+    """
+    if field.c_type in ("PROPERTY", "RELATIONSHIP"):
+        return pyarrow.string()
+    python_type = field.python_type
+    # bool before int as bool is an int
+    for types, arrow_type in (
+        ((bool,), pyarrow.bool_),
+        ((int,), pyarrow.int64),
+        ((float, Decimal), pyarrow.float64),
+        ((datetime,), lambda: pyarrow.timestamp("us")),
+        ((date,), pyarrow.date32),
+        ((time,), lambda: pyarrow.time64("us")),
+        ((bytes,), pyarrow.binary),
+    ):
+        if python_type in types:
+            return arrow_type()
+    return pyarrow.string()
+
+
+def _arrow_string(value, dumps):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return _csv_cell(value, dumps)
+    return str(value)
+
+
+def _arrow_value(value, arrow_type):
+    try:
+        return pyarrow.scalar(value, type=arrow_type).as_py()
+    except (pyarrow.ArrowException, TypeError, ValueError, OverflowError):
+        return None
+
+
+def fs_arrow_array(name: str, values: list, arrow_type):
+    """
+    convert a column of values to an arrow array, values that cannot be converted are null
+
+    :param name: field name for logging
+    :param values: list of values, None for null
+    :param arrow_type: pyarrow DataType from fs_arrow_type
+    :return: pyarrow Array
+    """
+    if pyarrow.types.is_string(arrow_type):
+        dumps = current_app.json.dumps
+        values = [_arrow_string(v, dumps) for v in values]
+    elif pyarrow.types.is_floating(arrow_type):
+        values = [v if v is None or isinstance(v, float) else _float(v) for v in values]
+    try:
+        return pyarrow.array(values, type=arrow_type)
+    except (pyarrow.ArrowException, TypeError, ValueError, OverflowError) as e:
+        current_app.logger.warning(
+            f'Error:"{e}". Failed to convert [{name}] to {arrow_type}, unconverted values are null'
+        )
+        return pyarrow.array(
+            [_arrow_value(v, arrow_type) for v in values], type=arrow_type
+        )
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    write only file collecting the bytes written since the last take, keeping the
+    position of the whole file for the parquet footer
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def fs_arrow_chunks(schema, batches, output: str = "arrow"):
+    """
+    encode batches of arrow arrays as an arrow IPC stream, a record batch per batch, or a
+    parquet file, a row group per batch
+
+    :param schema: pyarrow Schema
+    :param batches: iterable of lists of pyarrow Array in schema order
+    :param output: arrow or parquet
+    :return: generator of bytes
+    """
+    sink = _ChunkSink()
+    if output == "parquet":
+        writer = pyarrow.parquet.ParquetWriter(sink, schema)
+        write = lambda batch: writer.write_table(pyarrow.Table.from_batches([batch]))
+    else:
+        writer = pyarrow.ipc.new_stream(sink, schema)
+        write = writer.write_batch
+    try:
+        for arrays in batches:
+            write(pyarrow.RecordBatch.from_arrays(arrays, schema=schema))
+            data = sink.take()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+def fs_arrow_response(schema, batches, output: str = "arrow"):
+    """
+    stream batches of arrow arrays as an arrow IPC stream or a parquet file
+
+    :param schema: pyarrow Schema
+    :param batches: iterable of lists of pyarrow Array in schema order
+    :param output: arrow or parquet
+    :return: streamed flask response
+    """
+    media_type = next(k for k, v in ARROW_TYPES.items() if v == output)
+    # parquet pages are already compressed
+    return fs_stream_response(
+        fs_arrow_chunks(schema, batches, output),
+        media_type,
+        compress=output != "parquet",
+    )
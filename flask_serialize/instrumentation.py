@@ -0,0 +1,791 @@
+import itertools
+import threading
+import time
+import warnings
+from contextvars import ContextVar
+from time import perf_counter
+
+from flask import g, has_app_context, current_app, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+
+class FlaskSerializeQueryCountExceeded(Exception):
+    def __init__(self, summary: dict):
+        super().__init__(
+            "SQL statements per serialized row {per_row:.1f} exceeds {max_per_row}: {sources}".format(
+                **summary
+            )
+        )
+        self.summary = summary
+
+
+class FlaskSerializeQueryCountWarning(UserWarning):
+    pass
+
+
+class _FsInstrumentation:
+    """
+    state shared by the instrumentation points in FlaskSerializeMixin.
+    Instrumentation points do nothing unless a collector is installed.
+    """
+
+    # number of installed query counters
+    query_counters = 0
+    # number of installed server timing collectors
+    server_timings = 0
+    # enabled FlaskSerializeProfiler
+    profiler = None
+    # enabled FlaskSerializeTracer
+    tracer = None
+    # instrumentation point context managers by (source, phase)
+    points = {}
+
+
+def _phase_enter(name: str):
+    """
+    start timing phase name for the current request, pausing the enclosing phase so
+    that phase times are exclusive
+    """
+    timings = g.get("_fs_timings")
+    if timings is None:
+        return
+    now = perf_counter()
+    stack = g._fs_phase_stack
+    if stack:
+        outer = stack[-1]
+        timings[outer[0]] = timings.get(outer[0], 0.0) + now - outer[1]
+    stack.append([name, now])
+
+
+def _phase_exit(name: str):
+    """
+    stop timing phase name for the current request and resume the enclosing phase
+    """
+    timings = g.get("_fs_timings")
+    if timings is None:
+        return
+    stack = g._fs_phase_stack
+    if not stack or stack[-1][0] != name:
+        return
+    now = perf_counter()
+    _, start = stack.pop()
+    timings[name] = timings.get(name, 0.0) + now - start
+    if stack:
+        stack[-1][1] = now
+
+
+class _FsPoint:
+    """
+    context manager marking an instrumentation point in the mixin.  While active SQL
+    statements are attributed to source and time is recorded against phase.
+    """
+
+    __slots__ = ("source", "phase")
+
+    def __init__(self, source: str = None, phase: str = None):
+        self.source = source
+        self.phase = phase
+
+    def __enter__(self):
+        if (
+            not (_FsInstrumentation.query_counters or _FsInstrumentation.server_timings)
+            or not has_app_context()
+        ):
+            return
+        if self.source and _FsInstrumentation.query_counters:
+            g.setdefault("_fs_sources", []).append(self.source)
+        if self.phase and _FsInstrumentation.server_timings:
+            _phase_enter(self.phase)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if (
+            not (_FsInstrumentation.query_counters or _FsInstrumentation.server_timings)
+            or not has_app_context()
+        ):
+            return
+        if self.phase and _FsInstrumentation.server_timings:
+            _phase_exit(self.phase)
+        if self.source and _FsInstrumentation.query_counters:
+            sources = g.get("_fs_sources")
+            if sources:
+                sources.pop()
+
+
+def _fs_point(source: str = None, phase: str = None) -> _FsPoint:
+    point = _FsInstrumentation.points.get((source, phase))
+    if not point:
+        point = _FsInstrumentation.points[(source, phase)] = _FsPoint(source, phase)
+    return point
+
+
+def fs_source(name: str, phase: str = None) -> _FsPoint:
+    """
+    return a context manager that attributes SQL statements issued inside it to name
+
+    :param name: the mixin method or field, ie: __get_all, fs_as_dict:children
+    :param phase: (optional) also time it as this phase, ie: access-check
+    :return: context manager
+    """
+    return _fs_point(name, phase)
+
+
+def fs_phase(name: str) -> _FsPoint:
+    """
+    return a context manager that records the time inside it as phase name
+
+    :param name: the phase, ie: hydrate, serialize, encode, commit
+    :return: context manager
+    """
+    return _fs_point(None, name)
+
+
+def fs_phase_iter(iterable, name: str):
+    """
+    iterate over iterable recording the time taken to produce each item as phase name,
+    ie: ORM hydration of query results
+
+    :param iterable: query or list
+    :param name: the phase
+    :return: iterable
+    """
+    if not _FsInstrumentation.server_timings:
+        return iterable
+    return _phase_iter(iter(iterable), name)
+
+
+def _phase_iter(iterator, name: str):
+    while True:
+        with fs_phase(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+class FlaskSerializeSpan:
+    """
+    a timed operation or sub-phase of an operation in FlaskSerializeMixin.  Names are
+    flask_serialize.<operation>, ie: flask_serialize.list, flask_serialize.commit
+    """
+
+    __slots__ = (
+        "name",
+        "attributes",
+        "parent",
+        "span_id",
+        "start_time",
+        "end_time",
+        "duration",
+        "exporter_data",
+        "_exporter",
+        "_start",
+        "_token",
+    )
+
+    _ids = itertools.count(1)
+
+    def __init__(self, exporter, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+        self.parent = None
+        self.span_id = next(self._ids)
+        self.start_time = self.end_time = 0
+        self.duration = 0.0
+        self.exporter_data = None
+        self._exporter = exporter
+
+    def set_attribute(self, key: str, value):
+        """
+        set attribute flask_serialize.key on the span
+
+        :param key: ie: rows
+        :param value: the value
+        """
+        self.attributes[f"flask_serialize.{key}"] = value
+
+    def __enter__(self):
+        self.parent = _current_span.get()
+        self._token = _current_span.set(self)
+        self.start_time = time.time_ns()
+        self._start = perf_counter()
+        self._exporter.on_start(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.duration = perf_counter() - self._start
+        self.end_time = time.time_ns()
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attributes["error"] = True
+            self.attributes["exception.type"] = exc_type.__name__
+        self._exporter.on_end(self)
+
+    def __repr__(self):
+        return f"<FlaskSerializeSpan {self.name} {self.duration * 1000:.3f}ms {self.attributes}>"
+
+
+class _FsNullSpan:
+    """
+    span used when tracing is disabled
+    """
+
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_null_span = _FsNullSpan()
+_current_span = ContextVar("flask_serialize_span", default=None)
+
+
+def fs_span(operation: str, model=None):
+    """
+    return a span context manager for operation when tracing is enabled.  An operation
+    directly inside the same operation, ie: update calling update, is not repeated.
+
+    :param operation: get, list, create, update, delete or a sub-phase: query, access,
+    serialize, encode, commit, after_commit
+    :param model: (optional) model class to add as the model attribute
+    :return: context manager
+    """
+    tracer = _FsInstrumentation.tracer
+    if not tracer:
+        return _null_span
+    name = f"flask_serialize.{operation}"
+    parent = _current_span.get()
+    if parent is not None and parent.name == name:
+        return _null_span
+    attributes = {"flask_serialize.model": model.__name__} if model else {}
+    return FlaskSerializeSpan(tracer.exporter, name, attributes)
+
+
+def fs_span_attribute(key: str, value):
+    """
+    set an attribute on the current span
+
+    :param key: ie: rows, payload_bytes
+    :param value: the value
+    """
+    if _FsInstrumentation.tracer:
+        span = _current_span.get()
+        if span is not None:
+            span.set_attribute(key, value)
+
+
+def fs_count_rows(rows: int = 1):
+    """
+    record rows serialized for the current request
+
+    :param rows: number of rows serialized
+    """
+    if _FsInstrumentation.query_counters and has_app_context():
+        g._fs_rows = g.get("_fs_rows", 0) + rows
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    """
+    SQLAlchemy engine event to count statements for the current request
+    """
+    if not has_app_context():
+        return
+    counts = g.get("_fs_query_counts")
+    if counts is None:
+        return
+    sources = g.get("_fs_sources")
+    source = sources[-1] if sources else "other"
+    counts[source] = counts.get(source, 0) + 1
+
+
+def _before_cursor_timing(conn, cursor, statement, parameters, context, executemany):
+    """
+    SQLAlchemy engine event to start timing the query phase
+    """
+    if has_app_context():
+        _phase_enter("query")
+
+
+def _after_cursor_timing(*args):
+    """
+    SQLAlchemy engine event to stop timing the query phase
+    """
+    if has_app_context():
+        _phase_exit("query")
+
+
+def _listen(name: str, fn):
+    if not event.contains(Engine, name, fn):
+        event.listen(Engine, name, fn)
+
+
+def _unlisten(name: str, fn):
+    if event.contains(Engine, name, fn):
+        event.remove(Engine, name, fn)
+
+
+class FlaskSerializeQueryCounter:
+    """
+    Count SQL statements per request, attributed to the FlaskSerializeMixin method that
+    issued them.  Adds the count and sources as response headers and logs a summary.  Example:
+
+    query_counter = FlaskSerializeQueryCounter(app, max_per_row=2, strict="warn")
+
+    When strict is "warn" or "raise" and statements per serialized row exceeds max_per_row
+    a FlaskSerializeQueryCountWarning is issued or FlaskSerializeQueryCountExceeded raised.
+    """
+
+    header = "X-FS-Query-Count"
+    sources_header = "X-FS-Query-Sources"
+
+    def __init__(self, app=None, max_per_row: float = None, strict: str = None):
+        """
+        :param app: (optional) Flask app
+        :param max_per_row: statements per serialized row allowed in strict mode
+        :param strict: None, "warn" or "raise"
+        """
+        if strict not in (None, "warn", "raise"):
+            raise ValueError(f'strict must be None, "warn" or "raise" not: {strict}')
+        self.max_per_row = max_per_row
+        self.strict = strict
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        register request hooks on app and start listening to SQLAlchemy statements
+
+        :param app: Flask app
+        """
+        _listen("before_cursor_execute", _before_cursor_execute)
+        _FsInstrumentation.query_counters += 1
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def uninstall(self, app):
+        """
+        remove the request hooks of init_app from app and stop listening to SQLAlchemy
+        statements when no other query counter is installed
+
+        :param app: Flask app
+        """
+        app.before_request_funcs[None].remove(self._before_request)
+        app.after_request_funcs[None].remove(self._after_request)
+        _FsInstrumentation.query_counters -= 1
+        if not _FsInstrumentation.query_counters:
+            _unlisten("before_cursor_execute", _before_cursor_execute)
+
+    @staticmethod
+    def _before_request():
+        g._fs_query_counts = {}
+        g._fs_rows = 0
+
+    def summary(self) -> dict:
+        """
+        summary of the statements issued so far in the current request
+
+        :return: dict of total, rows, per_row, max_per_row and sources
+        """
+        sources = dict(g.get("_fs_query_counts") or {})
+        total = sum(sources.values())
+        rows = g.get("_fs_rows", 0)
+        return dict(
+            total=total,
+            rows=rows,
+            per_row=total / rows if rows else 0.0,
+            max_per_row=self.max_per_row,
+            sources=sources,
+        )
+
+    def _after_request(self, response):
+        if g.get("_fs_query_counts") is None:
+            return response
+        summary = self.summary()
+        response.headers[self.header] = str(summary["total"])
+        response.headers[self.sources_header] = ", ".join(
+            f"{source}={count}" for source, count in summary["sources"].items()
+        )
+        current_app.logger.debug(f"flask-serialize SQL statements: {summary}")
+        if (
+            self.strict
+            and self.max_per_row is not None
+            and summary["rows"]
+            and summary["per_row"] > self.max_per_row
+        ):
+            if self.strict == "raise":
+                raise FlaskSerializeQueryCountExceeded(summary)
+            warnings.warn(
+                str(FlaskSerializeQueryCountExceeded(summary)),
+                FlaskSerializeQueryCountWarning,
+            )
+        return response
+
+
+class FlaskSerializeServerTiming:
+    """
+    Add a Server-Timing header to responses breaking down the time spent in
+    FlaskSerializeMixin phases: query, hydrate, access-check, serialize, encode, update,
+    commit and after-commit, along with the total request time.  Times are exclusive,
+    so SQL issued while serializing counts as query, not serialize.  Example:
+
+    server_timing = FlaskSerializeServerTiming(app)
+
+    Server-Timing: query;dur=1.204, hydrate;dur=0.311, serialize;dur=2.517, encode;dur=0.402, total;dur=4.9
+    """
+
+    header = "Server-Timing"
+    phases = [
+        "query",
+        "hydrate",
+        "access-check",
+        "serialize",
+        "encode",
+        "update",
+        "commit",
+        "after-commit",
+    ]
+
+    def __init__(self, app=None):
+        """
+        :param app: (optional) Flask app
+        """
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        register request hooks on app and start timing SQLAlchemy statements
+
+        :param app: Flask app
+        """
+        _listen("before_cursor_execute", _before_cursor_timing)
+        _listen("after_cursor_execute", _after_cursor_timing)
+        _listen("handle_error", _after_cursor_timing)
+        _FsInstrumentation.server_timings += 1
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def uninstall(self, app):
+        """
+        remove the request hooks of init_app from app and stop timing SQLAlchemy
+        statements when no other server timing is installed
+
+        :param app: Flask app
+        """
+        app.before_request_funcs[None].remove(self._before_request)
+        app.after_request_funcs[None].remove(self._after_request)
+        _FsInstrumentation.server_timings -= 1
+        if not _FsInstrumentation.server_timings:
+            _unlisten("before_cursor_execute", _before_cursor_timing)
+            _unlisten("after_cursor_execute", _after_cursor_timing)
+            _unlisten("handle_error", _after_cursor_timing)
+
+    @staticmethod
+    def _before_request():
+        g._fs_timings = {}
+        g._fs_phase_stack = []
+        g._fs_request_start = perf_counter()
+
+    def timings(self) -> dict:
+        """
+        phase times so far in the current request
+
+        :return: dict of phase: milliseconds
+        """
+        timings = g.get("_fs_timings") or {}
+        order = self.phases + sorted(set(timings) - set(self.phases))
+        return {phase: timings[phase] * 1000 for phase in order if phase in timings}
+
+    def _after_request(self, response):
+        timings = self.timings()
+        # only responses where the mixin did some work
+        if not set(timings) - {"query"}:
+            return response
+        total = (perf_counter() - g._fs_request_start) * 1000
+        response.headers.add(
+            self.header,
+            ", ".join(
+                f"{phase};dur={ms:.3f}"
+                for phase, ms in list(timings.items()) + [("total", total)]
+            ),
+        )
+        return response
+
+
+class FlaskSerializeProfiler:
+    """
+    Accumulate call counts and total/max time spent in fs_as_dict per model, per field and
+    per converter across requests.  Times are inclusive, so a relationship field includes
+    the time to serialize its children.  Example:
+
+    profiler = FlaskSerializeProfiler(app, url="/fs_profile")
+    profiler.enable()
+    ...
+    profiler.stats()
+
+    When disabled fs_as_dict only checks a single class attribute.
+    """
+
+    def __init__(self, app=None, url: str = None, enabled: bool = False):
+        """
+        :param app: (optional) Flask app
+        :param url: (optional) url of a JSON stats endpoint
+        :param enabled: start profiling now
+        """
+        self._lock = threading.Lock()
+        self.reset()
+        if app is not None:
+            self.init_app(app, url)
+        if enabled:
+            self.enable()
+
+    def init_app(self, app, url: str = None):
+        """
+        add a JSON stats endpoint to app. GET url?reset=1 resets after returning stats.
+
+        :param app: Flask app
+        :param url: url of the endpoint, no endpoint when None
+        """
+        if url:
+            app.add_url_rule(
+                url, "flask_serialize_profile", self._stats_view, methods=["GET"]
+            )
+
+    def enable(self):
+        _FsInstrumentation.profiler = self
+
+    def disable(self):
+        if _FsInstrumentation.profiler is self:
+            _FsInstrumentation.profiler = None
+
+    @property
+    def enabled(self) -> bool:
+        return _FsInstrumentation.profiler is self
+
+    def reset(self):
+        with self._lock:
+            self._models = {}
+            self._fields = {}
+            self._converters = {}
+
+    @staticmethod
+    def _add(stats: dict, key, seconds: float, **extra):
+        stat = stats.get(key)
+        if stat is None:
+            stat = stats[key] = dict(calls=0, total=0.0, max=0.0, **extra)
+        stat["calls"] += 1
+        stat["total"] += seconds
+        if seconds > stat["max"]:
+            stat["max"] = seconds
+        return stat
+
+    def record_model(self, model: str, seconds: float):
+        """
+        record a complete fs_as_dict of model
+
+        :param model: model class name
+        :param seconds: elapsed time
+        """
+        with self._lock:
+            self._add(self._models, model, seconds)
+
+    def record_field(
+        self, model: str, field: str, converter: str, read: float, convert: float
+    ):
+        """
+        record reading and converting one field
+
+        :param model: model class name
+        :param field: field name
+        :param converter: converter name, "" when no converter
+        :param read: seconds to get the value, ie: evaluate a property or load a relationship
+        :param convert: seconds to convert the value
+        """
+        with self._lock:
+            stat = self._add(
+                self._fields,
+                (model, field),
+                read + convert,
+                read_total=0.0,
+                convert_total=0.0,
+                converter=converter,
+            )
+            stat["read_total"] += read
+            stat["convert_total"] += convert
+            if converter:
+                self._add(self._converters, converter, convert)
+
+    def stats(self) -> dict:
+        """
+        accumulated statistics, times in seconds
+
+        :return: dict of enabled, models with their fields and converters
+        """
+        with self._lock:
+            models = {
+                model: dict(stat, fields={}) for model, stat in self._models.items()
+            }
+            for (model, field), stat in self._fields.items():
+                models.setdefault(model, dict(calls=0, total=0.0, max=0.0, fields={}))[
+                    "fields"
+                ][field] = dict(stat)
+            return dict(
+                enabled=self.enabled,
+                models=models,
+                converters={k: dict(v) for k, v in self._converters.items()},
+            )
+
+    def _stats_view(self):
+        stats = self.stats()
+        if request.args.get("reset"):
+            self.reset()
+        return jsonify(stats)
+
+
+class FlaskSerializeSpanExporter:
+    """
+    Receives spans from FlaskSerializeTracer.  Override on_start and/or on_end.
+    """
+
+    def on_start(self, span: FlaskSerializeSpan):
+        """
+        called when span starts, span.parent is the enclosing span or None
+
+        :param span: the span
+        """
+
+    def on_end(self, span: FlaskSerializeSpan):
+        """
+        called when span ends with duration and all attributes set
+
+        :param span: the span
+        """
+
+
+class FlaskSerializeMemoryExporter(FlaskSerializeSpanExporter):
+    """
+    keep ended spans in a list, for tests and debugging
+    """
+
+    def __init__(self, max_spans: int = 10000):
+        """
+        :param max_spans: oldest spans are dropped after this many
+        """
+        self.max_spans = max_spans
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def on_end(self, span: FlaskSerializeSpan):
+        with self._lock:
+            self.spans.append(span)
+            if len(self.spans) > self.max_spans:
+                del self.spans[0]
+
+    def find(self, name: str) -> list:
+        """
+        ended spans called name
+
+        :param name: ie: flask_serialize.list or list
+        :return: list of spans
+        """
+        if not name.startswith("flask_serialize."):
+            name = f"flask_serialize.{name}"
+        with self._lock:
+            return [span for span in self.spans if span.name == name]
+
+    def clear(self):
+        with self._lock:
+            self.spans = []
+
+
+class FlaskSerializeOpenTelemetryExporter(FlaskSerializeSpanExporter):
+    """
+    Create OpenTelemetry spans, nested under the currently active OpenTelemetry span,
+    ie: the request span from opentelemetry-instrumentation-flask.
+    Requires the opentelemetry-api package.
+    """
+
+    def __init__(self, tracer=None):
+        """
+        :param tracer: (optional) OpenTelemetry tracer, default from the global provider
+        """
+        if otel_trace is None:
+            raise ImportError(
+                "FlaskSerializeOpenTelemetryExporter requires opentelemetry-api"
+            )
+        self.tracer = tracer or otel_trace.get_tracer("flask_serialize")
+
+    def on_start(self, span: FlaskSerializeSpan):
+        context = None
+        if span.parent is not None and span.parent.exporter_data is not None:
+            context = otel_trace.set_span_in_context(span.parent.exporter_data)
+        span.exporter_data = self.tracer.start_span(
+            span.name,
+            context=context,
+            attributes=span.attributes,
+            start_time=span.start_time,
+        )
+
+    def on_end(self, span: FlaskSerializeSpan):
+        otel_span = span.exporter_data
+        if otel_span is None:
+            return
+        otel_span.set_attributes(span.attributes)
+        if span.attributes.get("error"):
+            otel_span.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR))
+        otel_span.end(end_time=span.end_time)
+
+
+class FlaskSerializeTracer:
+    """
+    Emit spans for each FlaskSerializeMixin operation: get, list, create, update and
+    delete and their sub-phases: query, access, serialize, encode, commit and after_commit.
+    Spans have model, rows and payload_bytes attributes where known.  Example:
+
+    exporter = FlaskSerializeMemoryExporter()
+    tracer = FlaskSerializeTracer(exporter)
+    ...
+    exporter.find("list")
+
+    When disabled each instrumentation point only checks a single class attribute.
+    """
+
+    def __init__(
+        self, exporter: FlaskSerializeSpanExporter = None, enabled: bool = True
+    ):
+        """
+        :param exporter: receives the spans, default OpenTelemetry when installed else memory
+        :param enabled: start tracing now
+        """
+        if exporter is None:
+            exporter = (
+                FlaskSerializeOpenTelemetryExporter()
+                if otel_trace is not None
+                else FlaskSerializeMemoryExporter()
+            )
+        self.exporter = exporter
+        if enabled:
+            self.enable()
+
+    def enable(self):
+        _FsInstrumentation.tracer = self
+
+    def disable(self):
+        if _FsInstrumentation.tracer is self:
+            _FsInstrumentation.tracer = None
+
+    @property
+    def enabled(self) -> bool:
+        return _FsInstrumentation.tracer is self
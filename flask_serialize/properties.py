@@ -0,0 +1,171 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from time import monotonic
+
+from flask import has_request_context, request
+from sqlalchemy.orm.attributes import instance_state
+
+# on demand fields included by the call site
+_fs_include = ContextVar("flask_serialize_include", default=frozenset())
+# False while the include request arg is not read, ie: it names a field of the model
+_fs_include_arg = ContextVar("flask_serialize_include_arg", default=True)
+
+
+@contextmanager
+def fs_include_scope(names=None, request_arg=True):
+    """
+    include the on demand fields named for the duration, as well as those already included
+
+    :param names: list of field names or None
+    :param request_arg: False to ignore the include request arg for the duration
+    """
+    if not names and request_arg:
+        yield
+        return
+    token = _fs_include.set(_fs_include.get() | frozenset(names or ()))
+    arg_token = None if request_arg else _fs_include_arg.set(False)
+    try:
+        yield
+    finally:
+        if arg_token is not None:
+            _fs_include_arg.reset(arg_token)
+        _fs_include.reset(token)
+
+
+def fs_included() -> frozenset:
+    """
+    the on demand fields included by fs_include_scope and the include request arg, ie:
+    ?include=stats,history
+
+    :return: frozenset of field names
+    """
+    included = _fs_include.get()
+    if _fs_include_arg.get() and has_request_context():
+        arg = request.args.get("include")
+        if arg:
+            included = included | {name.strip() for name in arg.split(",")}
+    return included
+
+
+class FsTtlCache:
+    """
+    bounded least recently used cache of rows whose entries expire ttl seconds after
+    being set.  A row keeps a value per context, ie: the path it is serialized on.
+    """
+
+    __slots__ = ("ttl", "maxsize", "hits", "misses", "__entries", "__lock")
+
+    def __init__(self, ttl: float, maxsize: int):
+        """
+        :param ttl: seconds an entry is kept
+        :param maxsize: rows kept before the least recently used is dropped
+        """
+        if ttl <= 0 or maxsize <= 0:
+            raise ValueError("ttl and maxsize must be greater than 0")
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        # key: (expires, {context: value})
+        self.__entries = OrderedDict()
+        self.__lock = Lock()
+
+    def get(self, key, context, default=None):
+        """
+        :param key: the row key
+        :param context: the context of the value
+        :param default: returned when there is no live entry
+        :return: the cached value or default
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None:
+                if entry[0] > monotonic():
+                    self.__entries.move_to_end(key)
+                    value = entry[1].get(context, default)
+                    if value is not default:
+                        self.hits += 1
+                        return value
+                else:
+                    del self.__entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, context, value) -> None:
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None or entry[0] <= monotonic():
+                entry = self.__entries[key] = (monotonic() + self.ttl, {})
+            entry[1][context] = value
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.maxsize:
+                self.__entries.popitem(last=False)
+
+    def discard(self, key) -> None:
+        with self.__lock:
+            self.__entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> dict:
+        """
+        :return: dict of hits, misses and size in rows
+        """
+        with self.__lock:
+            return dict(hits=self.hits, misses=self.misses, size=len(self.__entries))
+
+
+class FlaskSerializeCachedProperty(property):
+    """
+    a property whose serialized value fs_as_dict caches per model and primary key, and
+    per the path, depth and include it is serialized with, see fs_cached_property.
+    Reading the attribute directly is not cached.
+    """
+
+    def __init__(self, fget, ttl: float = 60.0, maxsize: int = 1024, doc=None):
+        super().__init__(fget, doc=doc)
+        self.cache = FsTtlCache(ttl, maxsize)
+
+    @staticmethod
+    def key(item):
+        """
+        the cache key of item, its identity of model class and primary key
+
+        :param item: model instance
+        :return: identity key or None when item is not persisted
+        """
+        return instance_state(item).key
+
+    def cache_info(self) -> dict:
+        """
+        :return: dict of hits, misses and size
+        """
+        return self.cache.info()
+
+    def cache_clear(self) -> None:
+        self.cache.clear()
+
+
+def fs_cached_property(ttl: float = 60.0, maxsize: int = 1024):
+    """
+    decorate a model method as a property whose serialized value is cached, ie:
+
+        @fs_cached_property(ttl=300)
+        def stats(self):
+            ...
+
+    :param ttl: seconds a value is kept
+    :param maxsize: rows kept before the least recently used is dropped
+    :return: decorator
+    """
+
+    def decorator(fget):
+        return FlaskSerializeCachedProperty(fget, ttl=ttl, maxsize=maxsize)
+
+    return decorator
@@ -0,0 +1,549 @@
+import sys
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from urllib.parse import urlencode
+
+from flask import abort, has_request_context, request
+from sqlalchemy import func, select
+from sqlalchemy.orm import aliased, object_session, with_parent
+from sqlalchemy.orm.interfaces import ONETOMANY
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression
+
+from .instrumentation import fs_span_attribute
+
+# memo of the related objects serialized by the current response
+_fs_memo = ContextVar("flask_serialize_memo", default=None)
+# objects being serialized from the outermost to the one converting its relationships
+_fs_path = ContextVar("flask_serialize_path", default=None)
+# memo entry of an object that follows relationships, remembered by path
+_FS_BY_PATH = object()
+
+
+class _FsMemo:
+    """
+    dicts of related objects already serialized in a response, keyed by the identity key
+    of the object, (model, primary key, token), and the names of the fields serialized,
+    and the depth request arg of the response.  Dicts are shared by the rows of the
+    response unless share is False, when each row gets a copy.
+    """
+
+    __slots__ = ("dicts", "hits", "misses", "depth", "share")
+
+    # hits and misses of every response by model name
+    totals = {}
+    _lock = threading.Lock()
+
+    def __init__(self, depth: int = None, share: bool = True):
+        self.dicts = {}
+        self.hits = {}
+        self.misses = {}
+        self.depth = depth
+        self.share = share
+
+    def get(self, key):
+        """
+        the dict serialized for key counting a hit, or None counting a miss
+
+        :param key: (identity key, field names)
+        :return: dict or None
+        """
+        d = self.dicts.get(key)
+        counts = self.misses if d is None else self.hits
+        model = key[0][0].__name__
+        counts[model] = counts.get(model, 0) + 1
+        if d is not None and not self.share:
+            return _fs_copy(d)
+        return d
+
+    def key(self, identity, names: tuple, path) -> tuple:
+        """
+        the key of an object, including the path when it follows relationships
+
+        :param identity: identity key of the object
+        :param names: names of the fields serialized
+        :param path: path of the current serialization
+        :return: key
+        """
+        key = (identity, names)
+        if self.dicts.get(key) is _FS_BY_PATH:
+            key += (tuple(path.keys), path.limit)
+        return key
+
+    def add(self, key: tuple, d: dict, by_path: bool, path):
+        """
+        remember the dict of key
+
+        :param key: from key()
+        :param d: serialized object
+        :param by_path: True when the object followed relationships, which depend on path
+        :param path: path of the current serialization
+        """
+        if by_path and len(key) == 2:
+            self.dicts[key] = _FS_BY_PATH
+            key += (tuple(path.keys), path.limit)
+        self.dicts[key] = d
+
+    def add_totals(self):
+        """
+        add the counts of this response to the totals and the current span
+        """
+        if not (self.hits or self.misses):
+            return
+        fs_span_attribute("memo_hits", sum(self.hits.values()))
+        fs_span_attribute("memo_misses", sum(self.misses.values()))
+        with self._lock:
+            for model in self.hits.keys() | self.misses.keys():
+                total = self.totals.setdefault(model, dict(hits=0, misses=0))
+                total["hits"] += self.hits.get(model, 0)
+                total["misses"] += self.misses.get(model, 0)
+
+
+def _fs_copy(value):
+    """
+    :return: a copy of the dicts and lists of a serialized value, sharing the rest
+    """
+    if isinstance(value, dict):
+        return {k: _fs_copy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_fs_copy(v) for v in value]
+    return value
+
+
+@contextmanager
+def fs_memo_scope(request_depth: bool = True, share: bool = True, strict: bool = True):
+    """
+    serialize each related object once for the duration of a mixin response method, or a
+    batch of a streamed response.  A scope inside another uses the outer memo.
+
+    :param request_depth: False to ignore the depth request arg, ie: it names a field
+    :param share: False to give each row a copy of the dicts reused, ie: when they are
+        returned to the caller rather than encoded
+    :param strict: False to ignore a depth request arg that is not valid, ie: outside of
+        a response method
+    :throws: 400 when strict and the depth request arg is not valid
+    """
+    if _fs_memo.get() is not None:
+        yield
+        return
+    memo = _FsMemo(fs_request_depth(strict) if request_depth else None, share)
+    token = _fs_memo.set(memo)
+    try:
+        yield
+    finally:
+        _fs_memo.reset(token)
+        memo.add_totals()
+
+
+def fs_memo() -> _FsMemo:
+    """
+    :return: the memo of the current response or None outside of a mixin response
+    """
+    return _fs_memo.get()
+
+
+def fs_memo_stats(reset: bool = False) -> dict:
+    """
+    hits and misses of the related object memo of every response so far, by model name.
+    A hit is a related object serialized again in the same response and reused.
+
+    :param reset: clear the totals after reading them
+    :return: dict of model name: dict(hits, misses)
+    """
+    with _FsMemo._lock:
+        stats = {model: dict(counts) for model, counts in _FsMemo.totals.items()}
+        if reset:
+            _FsMemo.totals.clear()
+    return stats
+
+
+class _FsPath:
+    """
+    the objects being serialized, by identity key, from the outermost object to the one
+    whose relationships are being converted, and the deepest level of related objects
+    serialized in full.  The outermost object is level 0.
+    """
+
+    __slots__ = ("keys", "limit", "calls")
+
+    def __init__(self, limit: int):
+        self.keys = []
+        self.limit = limit
+        # relationships followed
+        self.calls = 0
+
+
+def fs_request_depth(strict: bool = True) -> int:
+    """
+    the depth request arg, ie: ?depth=1 serializes related objects but not theirs
+
+    :param strict: abort when not valid, otherwise ignore it
+    :return: int or None when not requested
+    :throws: 400 when strict and depth is not a positive int or 0
+    """
+    if not has_request_context():
+        return None
+    depth = request.args.get("depth")
+    if depth is None:
+        return None
+    if not depth.isdigit():
+        if strict:
+            abort(400, f"depth must be a positive int or 0 not: {depth}")
+        return None
+    return int(depth)
+
+
+def fs_path_enter():
+    """
+    the path of the current serialization, starting a path limited by the depth request
+    arg when there is none
+
+    :return: (_FsPath, token to reset with fs_path_exit or None when already started)
+    """
+    path = _fs_path.get()
+    if path is not None:
+        return path, None
+    path = _FsPath(_fs_path_limit())
+    return path, _fs_path.set(path)
+
+
+def _fs_path_limit() -> int:
+    """
+    :return: the deepest level serialized in full by a path started now
+    """
+    memo = _fs_memo.get()
+    depth = memo.depth if memo else fs_request_depth(strict=False)
+    return sys.maxsize if depth is None else depth
+
+
+def fs_path_key() -> tuple:
+    """
+    the objects being serialized and the deepest level serialized in full of the current
+    path, or of a path started now, which the relationships of an object depend on
+
+    :return: (tuple of identity keys, limit)
+    """
+    path = _fs_path.get()
+    if path is None:
+        return (), _fs_path_limit()
+    return tuple(path.keys), path.limit
+
+
+def fs_path_exit(token):
+    """
+    end the path started by fs_path_enter
+
+    :param token: from fs_path_enter
+    """
+    if token is not None:
+        _fs_path.reset(token)
+
+
+def fs_path() -> _FsPath:
+    """
+    :return: the path of the current serialization or None
+    """
+    return _fs_path.get()
+
+
+class FsRelatedPage:
+    """
+    the related objects of a collection relationship loaded for a row, a page of them
+    when the relationship has a limit
+    """
+
+    __slots__ = ("items", "total", "next", "ids", "paged")
+
+    def __init__(
+        self,
+        items: list,
+        total: int = None,
+        next_url: str = None,
+        ids: bool = False,
+        paged: bool = True,
+    ):
+        """
+        :param items: the related objects, or their primary keys when ids
+        :param total: number of related objects in the collection
+        :param next_url: url of the next page or None when this is the last
+        :param ids: True when items are primary keys
+        :param paged: False when items are all the related objects
+        """
+        self.items = items
+        self.total = total
+        self.next = next_url
+        self.ids = ids
+        self.paged = paged
+
+
+class FsRelationship:
+    """
+    a collection relationship of __fs_relationship_fields__ loaded for a list of parents
+    at once rather than by reading the relationship of each.  Options:
+
+    * mode - full, the related objects, ids, their primary keys, or count, the number of them
+    * modes - list of the modes the <relationship>_mode request arg may choose, default none
+    * limit - serialize the first limit related objects, with the total and the url of the
+      next page using the <relationship>_offset request arg
+    * order_by - field name, -field name for descending, SQLAlchemy order clause or list of
+      them, by default the relationship order_by or the primary key
+    """
+
+    __slots__ = (
+        "name",
+        "property",
+        "mode",
+        "request_modes",
+        "limit",
+        "order_by",
+        "mode_arg",
+        "offset_arg",
+    )
+
+    options = ("mode", "modes", "limit", "order_by")
+    modes = ("full", "ids", "count")
+
+    def __init__(self, model, name: str, options: dict):
+        """
+        :param model: model class of the relationship
+        :param name: relationship property name
+        :param options: dict of options
+        :throws: ValueError when an option or the relationship is not valid
+        """
+        unknown = set(options) - set(self.options)
+        if unknown:
+            raise ValueError(
+                f"{model.__name__}.{name} relationship options must be of {self.options} not: {sorted(unknown)}"
+            )
+        self.property = model.__mapper__.relationships.get(name)
+        if self.property is None or not self.property.uselist:
+            raise ValueError(
+                f"{model.__name__}.{name} relationship options need a collection relationship"
+            )
+        self.name = name
+        self.mode = options.get("mode", "full")
+        if self.mode not in self.modes:
+            raise ValueError(f"{model.__name__}.{name} mode must be of {self.modes}")
+        self.request_modes = tuple(options.get("modes") or ())
+        if not set(self.request_modes) <= set(self.modes):
+            raise ValueError(f"{model.__name__}.{name} modes must be of {self.modes}")
+        self.limit = options.get("limit")
+        if self.limit is not None and (
+            not isinstance(self.limit, int) or self.limit < 0
+        ):
+            raise ValueError(f"{model.__name__}.{name} limit must be an int >= 0")
+        self.order_by = self.__order_by(options.get("order_by"))
+        self.mode_arg = f"{name}_mode"
+        self.offset_arg = f"{name}_offset"
+
+    @property
+    def args(self) -> list:
+        """
+        :return: the request args of this relationship
+        """
+        args = []
+        if self.request_modes:
+            args.append(self.mode_arg)
+        if self.limit is not None:
+            args.append(self.offset_arg)
+        return args
+
+    def __order_by(self, order_by) -> list:
+        target = self.property.mapper
+        if order_by is None:
+            return list(self.property.order_by or target.primary_key)
+        if not isinstance(order_by, (list, tuple)):
+            order_by = [order_by]
+        clauses = []
+        for o in order_by:
+            if isinstance(o, str):
+                column = target.columns[o.lstrip("-")]
+                clauses.append(column.desc() if o.startswith("-") else column)
+            else:
+                clauses.append(o)
+        return clauses
+
+    def load(self, parents: list) -> list:
+        """
+        load the related objects of each parent
+
+        :param parents: model instances
+        :return: list of the relationship, FsRelatedPage or count, one per parent
+        """
+        mode = self.__request_mode()
+        if mode == "full" and self.limit is None:
+            # read as any relationship, using the loader options of the query
+            return [getattr(parent, self.name, "") for parent in parents]
+        offset = 0 if self.limit is None else self.__request_offset()
+        session = object_session(parents[0]) if parents else None
+        if session is None:
+            # not persisted, nothing to query
+            return [self.__load_list(parent, mode, offset) for parent in parents]
+        keys = self.__keys()
+        if keys:
+            return self.__load_keyed(session, parents, mode, offset, *keys)
+        return [self.__load_parent(session, parent, mode, offset) for parent in parents]
+
+    def __keys(self):
+        """
+        the parent column, the column with its value that relates the target and the
+        secondary table to join, when related by one column and nothing else.  Joins with
+        other conditions are loaded per parent with_parent.
+        """
+        relationship = self.property
+        if relationship.secondary is None:
+            pairs = relationship.local_remote_pairs
+            if (
+                relationship.direction is ONETOMANY
+                and len(pairs) == 1
+                and self.__equals(relationship.primaryjoin, *pairs[0])
+            ):
+                return pairs[0][0], pairs[0][1], None
+        elif (
+            len(relationship.synchronize_pairs) == 1
+            and len(relationship.secondary_synchronize_pairs) == 1
+            and self.__equals(
+                relationship.primaryjoin, *relationship.synchronize_pairs[0]
+            )
+            and self.__equals(
+                relationship.secondaryjoin,
+                *relationship.secondary_synchronize_pairs[0],
+            )
+        ):
+            local, remote = relationship.synchronize_pairs[0]
+            return local, remote, relationship.secondary
+        return None
+
+    @staticmethod
+    def __equals(clause, a, b) -> bool:
+        """
+        True when clause is a == b, or b == a, alone
+        """
+        if (
+            not isinstance(clause, BinaryExpression)
+            or clause.operator is not operators.eq
+        ):
+            return False
+        return (clause.left.compare(a) and clause.right.compare(b)) or (
+            clause.left.compare(b) and clause.right.compare(a)
+        )
+
+    def __load_keyed(self, session, parents, mode, offset, local, remote, secondary):
+        """
+        the related objects, primary keys or counts of all the parents with one query
+        numbering the related objects of each parent with row_number(), and one count query
+        """
+        local_key = self.property.parent.get_property_by_column(local).key
+        keys = [getattr(parent, local_key) for parent in parents]
+        wanted = {key for key in keys if key is not None}
+        paged = self.limit is not None
+        by_key = {key: [] for key in wanted}
+        totals = {}
+        if wanted and mode != "count":
+            target = self.property.mapper
+            row = (
+                func.row_number()
+                .over(partition_by=remote, order_by=self.order_by)
+                .label("fs_row")
+            )
+            columns = [target.class_] if mode == "full" else list(target.primary_key)
+            numbered = select(*columns, remote.label("fs_key"), row)
+            if secondary is not None:
+                numbered = numbered.join(secondary, self.property.secondaryjoin)
+            numbered = numbered.where(remote.in_(wanted)).subquery()
+            if mode == "full":
+                columns = [aliased(target.class_, numbered)]
+            else:
+                columns = [numbered.c[c.name] for c in target.primary_key]
+            statement = select(*columns, numbered.c.fs_key)
+            if paged:
+                statement = statement.where(
+                    numbered.c.fs_row > offset,
+                    numbered.c.fs_row <= offset + self.limit,
+                )
+            for row in session.execute(statement.order_by(numbered.c.fs_row)):
+                by_key[row[-1]].append(self.__item(row[:-1], mode))
+        if wanted and (paged or mode == "count"):
+            # counts the target rows, as the page query, not the rows of the secondary
+            count = select(remote, func.count()).select_from(self.property.mapper)
+            if secondary is not None:
+                count = count.join(secondary, self.property.secondaryjoin)
+            count = count.where(remote.in_(wanted)).group_by(remote)
+            totals = dict(session.execute(count).all())
+        if mode == "count":
+            return [totals.get(key, 0) for key in keys]
+        return [
+            self.__page(by_key.get(key, []), totals.get(key, 0), offset, mode)
+            for key in keys
+        ]
+
+    def __load_parent(self, session, parent, mode, offset):
+        """
+        the related objects, primary keys or count of one parent with a query and a count
+        query
+        """
+        criteria = with_parent(parent, self.property.class_attribute)
+        target = self.property.mapper
+        count = select(func.count()).select_from(target).where(criteria)
+        if mode == "count":
+            return session.scalar(count)
+        columns = [target.class_] if mode == "full" else list(target.primary_key)
+        statement = select(*columns).where(criteria).order_by(*self.order_by)
+        total = None
+        if self.limit is not None:
+            statement = statement.offset(offset).limit(self.limit)
+            total = session.scalar(count)
+        items = [self.__item(row, mode) for row in session.execute(statement)]
+        return self.__page(items, total, offset, mode)
+
+    def __load_list(self, parent, mode, offset):
+        """
+        the related objects, primary keys or count of a parent not in a session
+        """
+        items = list(getattr(parent, self.name))
+        if mode == "count":
+            return len(items)
+        if mode == "ids":
+            mapper = self.property.mapper
+            items = [
+                self.__item(mapper.primary_key_from_instance(item), mode)
+                for item in items
+            ]
+        total = len(items)
+        if self.limit is not None:
+            items = items[offset : offset + self.limit]
+        return self.__page(items, total, offset, mode)
+
+    @staticmethod
+    def __item(row, mode):
+        """
+        the object, the primary key or a tuple of a composite primary key of a row
+        """
+        if mode == "full" or len(row) == 1:
+            return row[0]
+        return tuple(row)
+
+    def __page(self, items: list, total: int, offset: int, mode) -> FsRelatedPage:
+        ids = mode == "ids"
+        if self.limit is None:
+            return FsRelatedPage(items, ids=ids, paged=False)
+        next_url = None
+        end = offset + len(items)
+        if end < total and has_request_context():
+            args = request.args.to_dict()
+            args[self.offset_arg] = end
+            next_url = f"{request.base_url}?{urlencode(args)}"
+        return FsRelatedPage(items, total, next_url, ids=ids)
+
+    def __request_mode(self) -> str:
+        if not has_request_context():
+            return self.mode
+        mode = request.args.get(self.mode_arg)
+        return mode if mode in self.request_modes else self.mode
+
+    def __request_offset(self) -> int:
+        if not has_request_context():
+            return 0
+        offset = request.args.get(self.offset_arg, "")
+        return int(offset) if offset.isdigit() else 0
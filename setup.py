@@ -53,4 +53,10 @@ setup(
     packages=["flask_serialize"],
     include_package_data=True,
     install_requires=["Permissive-Dict"],
+    extras_require={
+        "opentelemetry": ["opentelemetry-api"],
+        "msgpack": ["msgpack"],
+        "cbor": ["cbor2"],
+        "arrow": ["pyarrow"],
+    },
 )
@@ -0,0 +1,562 @@
+"""
+Micro-benchmarks for the flask-serialize serialization and write hot paths.
+
+Runs against the models of the test app using an in-memory SQLite database, unless
+SQLALCHEMY_DATABASE_URI is set.  The tables are dropped and recreated, so a database that
+already holds rows is refused without --force.  Examples, from the project root:
+
+    python -m test.benchmark run --rows 1,100,1000,10000 --output bench_results.json
+    python -m test.benchmark run --rows 100000 --fanout 0 --only fs_dict_list
+    python -m test.benchmark compare bench_baseline.json bench_results.json --threshold 10
+    python -m test.benchmark memory --rows 1000,10000 --output bench_memory.json
+
+The test app is not instrumented.  `run` also times a list request of the app with the query
+counter, profiler and Server-Timing installed against the bare app, named request[instrumented,...]
+and request[bare,...].
+
+`compare` exits with a non zero code when any benchmark is slower, or uses more peak memory,
+than the baseline by more than threshold percent.
+"""
+
+import argparse
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+import weakref
+from contextlib import contextmanager
+from datetime import datetime
+from importlib.metadata import version
+
+import sqlalchemy
+
+from flask_serialize import (
+    FlaskSerializeMixin,
+    FlaskSerializeProfiler,
+    FlaskSerializeQueryCounter,
+    FlaskSerializeServerTiming,
+)
+from test.load_test import check_database
+from test.test_flask_app import app, db, Setting, SubSetting, SimpleModel, DateTest
+
+DEFAULT_ROWS = "1,100,1000,10000"
+DEFAULT_FANOUT = "0,10"
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 10.0
+
+# models with different converter mixes
+# SimpleModel: string column and a property
+# SubSetting: DATETIME override, boolean, string
+# Setting: DATETIME, JSON, LOB, NUMERIC, FLOAT, properties and relationships
+MODELS = {"SimpleModel": SimpleModel, "SubSetting": SubSetting, "Setting": Setting}
+
+
+def timed(fn, repeat=DEFAULT_REPEAT):
+    """
+    run fn repeat times and return the list of elapsed seconds
+
+    :param fn: callable to time
+    :param repeat: number of runs
+    :return: list of float seconds
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def measure_memory(fn):
+    """
+    run fn while tracing memory allocations with tracemalloc
+
+    :param fn: callable to measure
+    :return: (peak bytes, bytes held with the result, bytes still retained after the result is released)
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start, _ = tracemalloc.get_traced_memory()
+        result = fn()
+        held, peak = tracemalloc.get_traced_memory()
+        del result
+        gc.collect()
+        retained, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - start, held - start, retained - start
+
+
+def retained_instances(model, rows=10) -> int:
+    """
+    count the instances of model still alive after being serialized and released.
+    Serialization should not keep references to instances, ie: a bound method of the
+    first instance cached in the _fs_get_props converters.
+
+    :param model: the model class, which should have at least one row
+    :param rows: number of instances to check
+    :return: number of instances still referenced
+    """
+    # forget cached props so the first serialization builds them again
+    FlaskSerializeMixin._FlaskSerializeMixin__fs_model_props.pop(model.__table__, None)
+    db.session.remove()
+    items = model.query.limit(rows).all()
+    model.fs_dict_list(items)
+    references = [weakref.ref(item) for item in items]
+    del items
+    db.session.remove()
+    gc.collect()
+    return sum(1 for r in references if r() is not None)
+
+
+def populate(rows, fanout=0):
+    """
+    recreate the database with rows of each model. Each Setting gets fanout SubSetting children.
+
+    :param rows: number of rows per model
+    :param fanout: number of SubSetting rows per Setting
+    """
+    db.drop_all()
+    db.create_all()
+    now = datetime.utcnow()
+    db.session.execute(
+        sqlalchemy.insert(SimpleModel),
+        [dict(value=f"value {n}") for n in range(rows)],
+    )
+    db.session.execute(
+        sqlalchemy.insert(Setting),
+        [
+            dict(
+                id=n + 1,
+                setting_type="bench",
+                key=f"key {n}",
+                value=f"value {n}",
+                number=n,
+                floaty=n / 3,
+                deci=n % 100,
+                j={"n": n, "ok": True},
+                lob=b"large binary object",
+                created=now,
+                updated=now,
+                scheduled=now,
+            )
+            for n in range(rows)
+        ],
+    )
+    sub_settings = [
+        dict(setting_id=n % rows + 1, flong=f"flong {n}", created=now, sub_updated=now)
+        for n in range(rows * fanout)
+    ]
+    # SubSetting rows of their own when there is no fan out
+    sub_settings = sub_settings or [
+        dict(flong=f"flong {n}", created=now, sub_updated=now) for n in range(rows)
+    ]
+    db.session.execute(sqlalchemy.insert(SubSetting), sub_settings)
+    db.session.execute(
+        sqlalchemy.insert(DateTest),
+        [dict(a_date=now, a_day=now.date(), a_time=now.time()) for n in range(rows)],
+    )
+    db.session.commit()
+
+
+def write_cases(rows):
+    """
+    benchmarks for the conversion of request values to db values
+
+    :param rows: number of conversions per model
+    :return: dict of name: callable
+    """
+    setting = Setting.query.first()
+    sub_setting = SubSetting.query.first()
+    convert_setting = (
+        setting._FlaskSerializeMixin__fs_convert_value_to_db_suitable_value
+    )
+    convert_sub = (
+        sub_setting._FlaskSerializeMixin__fs_convert_value_to_db_suitable_value
+    )
+    setting_values = [
+        ("value", "a string"),
+        ("number", "12"),
+        ("active", True),
+        ("floaty", 1.5),
+        ("j", '{"a": 1}'),
+        ("scheduled", "2020-01-02 03:04:05"),
+    ]
+    sub_values = [("flong", "a string"), ("boolean", "true"), ("created", "2020-01-02")]
+    # ISO 8601 variants sent by forms and javascript
+    date_values = [
+        ("scheduled", "2020-01-02T03:04:05"),
+        ("scheduled", "2020-01-02 03:04"),
+        ("scheduled", "2020-01-02"),
+        ("scheduled", "2020-01-02T03:04:05.123Z"),
+    ]
+
+    def convert(fn, values):
+        def run():
+            for _ in range(rows):
+                for name, value in values:
+                    fn(name, value)
+
+        return run
+
+    return {
+        f"convert_value_to_db[Setting,rows={rows}]": convert(
+            convert_setting, setting_values
+        ),
+        f"convert_value_to_db[SubSetting,rows={rows}]": convert(
+            convert_sub, sub_values
+        ),
+        f"convert_value_to_db[dates,rows={rows}]": convert(
+            convert_setting, date_values
+        ),
+    }
+
+
+def read_cases(rows, fanout):
+    """
+    benchmarks for serialization of the populated models
+
+    :param rows: number of rows per model
+    :param fanout: children per Setting
+    :return: dict of name: callable
+    """
+    cases = {}
+    for model_name, model in MODELS.items():
+        if fanout and model is not Setting:
+            # fan out only changes the Setting results
+            continue
+        items = model.query.all()
+        suffix = f"{model_name},rows={rows},fanout={fanout}"
+
+        def as_dict(items=items):
+            for item in items:
+                item.fs_as_dict
+
+        def get_props(items=items):
+            for item in items:
+                item._fs_get_props()
+
+        cases[f"fs_as_dict[{suffix}]"] = as_dict
+        cases[f"fs_dict_list[{suffix}]"] = lambda model=model, items=items: (
+            model.fs_dict_list(items)
+        )
+        cases[f"fs_json_list[{suffix}]"] = lambda model=model, items=items: (
+            model.fs_json_list(items).get_data()
+        )
+        cases[f"_fs_get_props[{suffix}]"] = get_props
+    if not fanout:
+        # Core select() of the columns against loading model instances
+        cases[f"fs_dict_list_query[DateTest,rows={rows}]"] = lambda: (
+            DateTest.fs_dict_list(DateTest.query)
+        )
+        cases[f"fs_dict_list_instances[DateTest,rows={rows}]"] = lambda: (
+            DateTest.fs_dict_list(DateTest.query.all())
+        )
+    return cases
+
+
+def request_case(model):
+    """
+    a list request of model through the request hooks of the app, ie: those of the
+    instrumentation when installed
+
+    :param model: the model class
+    :return: callable
+    """
+
+    def request():
+        app.preprocess_request()
+        app.process_response(model.fs_json_list(model.query))
+
+    return request
+
+
+@contextmanager
+def instrumented():
+    """
+    install the query counter, profiler and Server-Timing on the app for the duration
+    """
+    query_counter = FlaskSerializeQueryCounter(app)
+    server_timing = FlaskSerializeServerTiming(app)
+    profiler = FlaskSerializeProfiler(enabled=True)
+    try:
+        yield
+    finally:
+        profiler.disable()
+        server_timing.uninstall(app)
+        query_counter.uninstall(app)
+
+
+def memory_cases(rows, fanout):
+    """
+    memory benchmarks of list serialization, including loading from the query
+
+    :param rows: number of rows per model
+    :param fanout: children per Setting
+    :return: dict of name: callable
+    """
+    cases = {}
+    for model_name, model in MODELS.items():
+        if fanout and model is not Setting:
+            continue
+        suffix = f"{model_name},rows={rows},fanout={fanout}"
+        cases[f"memory:fs_dict_list[{suffix}]"] = lambda model=model: (
+            model.fs_dict_list(model.query)
+        )
+        cases[f"memory:fs_json_list[{suffix}]"] = lambda model=model: (
+            model.fs_json_list(model.query)
+        )
+    return cases
+
+
+def memory(args):
+    """
+    run the memory benchmarks, check for retained instances and save the results as JSON
+
+    :param args: parsed command line args
+    :return: exit code, 1 when instances are retained
+    """
+    results = {}
+    retained = {}
+    with app.test_request_context():
+        check_database(db, args.force)
+        for rows in [int(r) for r in args.rows.split(",")]:
+            for fanout in [int(f) for f in args.fanout.split(",")]:
+                populate(rows, fanout)
+                for name, fn in memory_cases(rows, fanout).items():
+                    if args.only and not any(o in name for o in args.only.split(",")):
+                        continue
+                    # warm up caches so they are not counted as retained
+                    fn()
+                    db.session.remove()
+                    peak, held, after = measure_memory(fn)
+                    db.session.remove()
+                    results[name] = dict(
+                        peak_bytes=peak,
+                        held_bytes=held,
+                        retained_bytes=after,
+                        peak_bytes_per_row=peak / rows,
+                        retained_bytes_per_row=after / rows,
+                        rows=rows,
+                    )
+                    print(
+                        f"{name:<60} peak {peak / 1024:10.1f} KiB {peak / rows:10.1f} B/row "
+                        f"retained {after / rows:8.1f} B/row"
+                    )
+        for model_name, model in MODELS.items():
+            retained[model_name] = retained_instances(model)
+            print(f"retained {model_name} instances: {retained[model_name]}")
+        db.drop_all()
+
+    write_results(args, results, retained_instances=retained)
+    return 1 if any(retained.values()) else 0
+
+
+def write_results(args, results: dict, **meta):
+    """
+    save results with details of the environment as JSON to args.output
+
+    :param args: parsed command line args
+    :param results: dict of name: result
+    :param meta: extra values for meta
+    :return: the output dict
+    """
+    output = dict(
+        meta=dict(
+            created=datetime.utcnow().isoformat(),
+            python=platform.python_version(),
+            platform=platform.platform(),
+            flask=version("flask"),
+            sqlalchemy=sqlalchemy.__version__,
+            **meta,
+        ),
+        results=results,
+    )
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2)
+    print(f"results written to: {args.output}")
+    return output
+
+
+def run(args):
+    """
+    run the benchmarks and save the results as JSON
+
+    :param args: parsed command line args
+    :return: results dict
+    """
+    results = {}
+    row_counts = [int(r) for r in args.rows.split(",")]
+    fanouts = [int(f) for f in args.fanout.split(",")]
+    with app.test_request_context():
+        check_database(db, args.force)
+        for rows in row_counts:
+            for fanout in fanouts:
+                populate(rows, fanout)
+                cases = read_cases(rows, fanout)
+                if fanout == fanouts[0]:
+                    cases.update(write_cases(rows))
+                time_cases(args, cases, rows, results)
+                if fanout == fanouts[0]:
+                    # the cost of the instrumentation against the bare app
+                    suffix = f"Setting,rows={rows}"
+                    request = request_case(Setting)
+                    time_cases(
+                        args, {f"request[bare,{suffix}]": request}, rows, results
+                    )
+                    with instrumented():
+                        time_cases(
+                            args,
+                            {f"request[instrumented,{suffix}]": request},
+                            rows,
+                            results,
+                        )
+                db.session.remove()
+        db.drop_all()
+
+    return write_results(args, results, repeat=args.repeat)
+
+
+def time_cases(args, cases: dict, rows: int, results: dict):
+    """
+    time cases not filtered out by args.only and add them to results
+
+    :param args: parsed command line args
+    :param cases: dict of name: callable
+    :param rows: number of rows per model
+    :param results: dict of name: result
+    """
+    for name, fn in cases.items():
+        if args.only and not any(o in name for o in args.only.split(",")):
+            continue
+        timings = timed(fn, args.repeat)
+        results[name] = dict(
+            min=min(timings),
+            median=statistics.median(timings),
+            per_row_us=statistics.median(timings) / rows * 1e6,
+            rows=rows,
+        )
+        print(
+            f"{name:<60} median {results[name]['median'] * 1000:10.3f} ms "
+            f"{results[name]['per_row_us']:10.2f} us/row"
+        )
+
+
+def compare_results(baseline: dict, current: dict, threshold: float) -> list:
+    """
+    compare two benchmark result sets
+
+    :param baseline: results dict from a previous run
+    :param current: results dict of the current run
+    :param threshold: percent slower, or more peak memory, than baseline that is a regression
+    :return: list of (name, metric, baseline value, current value, percent change, is regression)
+    """
+    comparison = []
+    for name, result in current["results"].items():
+        metric = "peak_bytes" if "peak_bytes" in result else "median"
+        base = baseline["results"].get(name)
+        if not base or not base.get(metric):
+            continue
+        change = (result[metric] - base[metric]) / base[metric] * 100
+        comparison.append(
+            (name, metric, base[metric], result[metric], change, change > threshold)
+        )
+    return comparison
+
+
+def compare(args) -> int:
+    """
+    print a comparison of current results to the baseline
+
+    :param args: parsed command line args
+    :return: exit code, 1 when there are regressions
+    """
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    regressions = 0
+    for name, metric, base, now, change, regressed in compare_results(
+        baseline, current, args.threshold
+    ):
+        regressions += regressed
+        flag = "REGRESSION" if regressed else ""
+        if metric == "median":
+            base, now, unit = base * 1000, now * 1000, "ms"
+        else:
+            base, now, unit = base / 1024, now / 1024, "KiB"
+        print(
+            f"{name:<60} {base:10.3f} {unit} -> {now:10.3f} {unit} {change:+7.1f}% {flag}"
+        )
+    print(f"{regressions} regression(s) beyond {args.threshold}%")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument(
+        "--rows", default=DEFAULT_ROWS, help="comma separated row counts"
+    )
+    run_parser.add_argument(
+        "--fanout",
+        default=DEFAULT_FANOUT,
+        help="comma separated SubSettings per Setting",
+    )
+    run_parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    run_parser.add_argument("--only", default="", help="comma separated name filters")
+    run_parser.add_argument("--output", default="bench_results.json")
+    run_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="drop the tables of a SQLALCHEMY_DATABASE_URI database that holds rows",
+    )
+    memory_parser = commands.add_parser(
+        "memory", help="measure peak and retained memory of list serialization"
+    )
+    memory_parser.add_argument(
+        "--rows", default=DEFAULT_ROWS, help="comma separated row counts"
+    )
+    memory_parser.add_argument(
+        "--fanout",
+        default=DEFAULT_FANOUT,
+        help="comma separated SubSettings per Setting",
+    )
+    memory_parser.add_argument(
+        "--only", default="", help="comma separated name filters"
+    )
+    memory_parser.add_argument("--output", default="bench_memory.json")
+    memory_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="drop the tables of a SQLALCHEMY_DATABASE_URI database that holds rows",
+    )
+    compare_parser = commands.add_parser(
+        "compare", help="compare results to a baseline"
+    )
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current", nargs="?", default="bench_results.json")
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="percent slower allowed",
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        return compare(args)
+    if args.command == "memory":
+        return memory(args)
+    run(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,423 @@
+"""
+Offline load test harness for fs_get_delete_put_post using the test app.
+
+Replays a weighted mix of GET-all, single GET, PUT, POST and DELETE requests from
+several threads, and optionally processes, against a file backed SQLite database so that
+lock contention is realistic.  The app runs either in-process using the Flask test client
+or under a local threaded WSGI server.  The database is a temporary file unless --database
+names one, which is refused when it already holds rows unless --force is given.  Examples,
+from the project root:
+
+    python -m test.load_test --threads 8 --requests 2000
+    python -m test.load_test --mode server --processes 2 --threads 4 --mix get_all=1,get=10,put=5
+    python -m test.load_test --json load_results.json
+    python -m test.load_test --instrumented
+
+Reports throughput and p50/p95/p99 latency per route.  The app is not instrumented unless
+--instrumented installs the query counter, profiler and Server-Timing.
+"""
+
+import argparse
+import json
+import logging
+import math
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+DEFAULT_MIX = "get_all=1,get=10,put=4,post=2,delete=1"
+
+# operation: (method, route format)
+OPERATIONS = {
+    "get_all": ("GET", "/setting_get_all"),
+    "get": ("GET", "/setting_get/{item_id}"),
+    "put": ("PUT", "/setting_put/{item_id}"),
+    "post": ("POST", "/setting_post"),
+    "delete": ("DELETE", "/setting_delete/{item_id}"),
+}
+
+
+def parse_mix(mix: str) -> dict:
+    """
+    parse a request mix of operation=weight pairs
+
+    :param mix: ie: get_all=1,get=10,put=4
+    :return: dict of operation: weight
+    """
+    weights = {}
+    for part in mix.split(","):
+        operation, _, weight = part.partition("=")
+        operation = operation.strip()
+        if operation not in OPERATIONS:
+            raise ValueError(
+                f"unknown operation: {operation} expected one of {list(OPERATIONS)}"
+            )
+        weights[operation] = float(weight or 1)
+    return weights
+
+
+def percentile(values: list, percent: float) -> float:
+    """
+    nearest rank percentile of values
+
+    :param values: list of numbers
+    :param percent: 0 to 100
+    :return: the percentile value or 0 when no values
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def import_app(database_uri: str, instrumented: bool = False):
+    """
+    import the test app configured to use database_uri
+
+    :param database_uri: SQLAlchemy database uri
+    :param instrumented: a copy of the app with the query counter, profiler and
+        Server-Timing installed
+    :return: the flask app and db
+    """
+    os.environ["SQLALCHEMY_DATABASE_URI"] = database_uri
+    from test.test_flask_app import app, db, create_instrumented_app, profiler
+
+    if instrumented:
+        app = create_instrumented_app()
+        profiler.enable()
+
+    app.config["TESTING"] = True
+    app.config["SECRET_KEY"] = "Testing"
+    app.config["WTF_CSRF_ENABLED"] = False
+    return app, db
+
+
+def check_database(db, force: bool = False):
+    """
+    refuse to drop the tables of a database that already holds rows, ie: a real database
+    named by mistake, unless force
+
+    :param db: flask_sqlalchemy db, within an app context
+    :param force: drop the tables anyway
+    """
+    import sqlalchemy
+
+    if force:
+        return
+    with db.engine.connect() as connection:
+        for name in sqlalchemy.inspect(connection).get_table_names():
+            query = (
+                sqlalchemy.select(sqlalchemy.literal(1))
+                .select_from(sqlalchemy.table(name))
+                .limit(1)
+            )
+            if connection.execute(query).first():
+                raise SystemExit(
+                    f"{db.engine.url!r} is not empty, table {name} has rows. "
+                    "Use --force to drop its tables."
+                )
+
+
+def seed(database_uri: str, rows: int, force: bool = False):
+    """
+    create the tables and add rows Settings
+
+    :param database_uri: SQLAlchemy database uri
+    :param rows: number of Setting rows
+    :param force: drop the tables of a database holding rows
+    """
+    import sqlalchemy
+
+    app, db = import_app(database_uri)
+    from test.test_flask_app import Setting
+
+    with app.app_context():
+        check_database(db, force)
+        db.drop_all()
+        db.create_all()
+        db.session.execute(
+            sqlalchemy.insert(Setting),
+            [
+                dict(setting_type="load", key=f"key {n}", value=f"value {n}", number=n)
+                for n in range(rows)
+            ],
+        )
+        db.session.commit()
+
+
+def request_body(operation: str, n: int):
+    """
+    JSON body for an update or create
+
+    :param operation: the operation name
+    :param n: sequence number to make values unique
+    :return: dict or None
+    """
+    if operation in ("put", "post"):
+        return dict(setting_type="load", key=f"key {operation} {n}", value=str(n))
+    return None
+
+
+def in_process_sender(app):
+    """
+    return a function that sends a request using a test client
+
+    :param app: the flask app
+    :return: fn(method, url, body) -> status code
+    """
+    client = app.test_client()
+
+    def send(method, url, body):
+        return client.open(url, method=method, json=body).status_code
+
+    return send
+
+
+def http_sender(base_url: str):
+    """
+    return a function that sends a request to a WSGI server
+
+    :param base_url: ie: http://127.0.0.1:5056
+    :return: fn(method, url, body) -> status code
+    """
+
+    def send(method, url, body):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(
+            base_url + url,
+            data=data,
+            method=method,
+            headers={"Content-Type": "application/json"} if data else {},
+        )
+        try:
+            with urllib.request.urlopen(req) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    return send
+
+
+def run_threads(send_factory, config: dict, worker: int) -> list:
+    """
+    replay the request mix from config['threads'] threads
+
+    :param send_factory: callable returning a send function per thread
+    :param config: run options
+    :param worker: worker process number to seed random sequences
+    :return: list of (operation, seconds, status)
+    """
+    weights = config["mix"]
+    operations = list(weights)
+    samples = []
+    lock = threading.Lock()
+    per_thread = config["requests"] // config["threads"]
+
+    def run_thread(thread_number):
+        rnd = random.Random(f"{worker}-{thread_number}")
+        send = send_factory()
+        thread_samples = []
+        for n in range(per_thread):
+            operation = rnd.choices(operations, [weights[o] for o in operations])[0]
+            method, url = OPERATIONS[operation]
+            url = url.format(item_id=rnd.randint(1, config["rows"]))
+            body = request_body(operation, n)
+            start = time.perf_counter()
+            try:
+                status = send(method, url, body)
+            except Exception:
+                status = 0
+            thread_samples.append((operation, time.perf_counter() - start, status))
+        with lock:
+            samples.extend(thread_samples)
+
+    threads = [
+        threading.Thread(target=run_thread, args=(t,)) for t in range(config["threads"])
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples
+
+
+def run_worker(config: dict, worker: int = 0) -> list:
+    """
+    run the threads of one worker process
+
+    :param config: run options
+    :param worker: worker number
+    :return: list of (operation, seconds, status)
+    """
+    if config["base_url"]:
+        return run_threads(lambda: http_sender(config["base_url"]), config, worker)
+    app, _ = import_app(config["database_uri"], config["instrumented"])
+    return run_threads(lambda: in_process_sender(app), config, worker)
+
+
+def serve(database_uri: str, instrumented: bool = False):
+    """
+    start the test app in a local threaded WSGI server on a free port
+
+    :param database_uri: SQLAlchemy database uri
+    :param instrumented: install the query counter, profiler and Server-Timing
+    :return: (server, base url)
+    """
+    from werkzeug.serving import make_server
+
+    app, _ = import_app(database_uri, instrumented)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def summarize(samples: list, elapsed: float) -> dict:
+    """
+    throughput and latency percentiles per route
+
+    :param samples: list of (operation, seconds, status)
+    :param elapsed: wall clock seconds of the run
+    :return: dict summary
+    """
+    by_operation = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    for operation, seconds, status in samples:
+        by_operation[operation].append(seconds)
+        statuses[operation][status] += 1
+
+    routes = {}
+    for operation, latencies in sorted(by_operation.items()):
+        method, url = OPERATIONS[operation]
+        routes[operation] = dict(
+            route=f"{method} {url}",
+            count=len(latencies),
+            throughput=len(latencies) / elapsed if elapsed else 0,
+            p50_ms=percentile(latencies, 50) * 1000,
+            p95_ms=percentile(latencies, 95) * 1000,
+            p99_ms=percentile(latencies, 99) * 1000,
+            max_ms=max(latencies) * 1000,
+            errors=sum(c for s, c in statuses[operation].items() if s == 0 or s >= 500),
+            statuses={str(s): c for s, c in sorted(statuses[operation].items())},
+        )
+    return dict(
+        requests=len(samples),
+        elapsed=elapsed,
+        throughput=len(samples) / elapsed if elapsed else 0,
+        routes=routes,
+    )
+
+
+def print_summary(summary: dict):
+    print(
+        f"{summary['requests']} requests in {summary['elapsed']:.2f}s "
+        f"{summary['throughput']:.1f} req/s"
+    )
+    print(
+        f"{'route':<34} {'count':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+        f"{'p99 ms':>8} {'max ms':>8} {'errors':>6}  statuses"
+    )
+    for r in summary["routes"].values():
+        print(
+            f"{r['route']:<34} {r['count']:>7} {r['throughput']:>8.1f} {r['p50_ms']:>8.2f} "
+            f"{r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['max_ms']:>8.2f} {r['errors']:>6}  "
+            f"{r['statuses']}"
+        )
+
+
+def run(args) -> dict:
+    """
+    seed the database, replay the mix and report
+
+    :param args: parsed command line args
+    :return: summary dict
+    """
+    database_file = args.database or os.path.join(
+        tempfile.mkdtemp(prefix="fs_load_"), "load.sqlite"
+    )
+    database_uri = f"sqlite:///{os.path.abspath(database_file)}"
+    seed(database_uri, args.rows, args.force)
+
+    server = None
+    base_url = ""
+    if args.mode == "server":
+        server, base_url = serve(database_uri, args.instrumented)
+
+    config = dict(
+        mix=parse_mix(args.mix),
+        requests=max(args.requests // args.processes, args.threads),
+        threads=args.threads,
+        rows=args.rows,
+        database_uri=database_uri,
+        base_url=base_url,
+        instrumented=args.instrumented,
+    )
+    start = time.perf_counter()
+    if args.processes > 1:
+        with multiprocessing.get_context("spawn").Pool(args.processes) as pool:
+            samples = [
+                s
+                for worker_samples in pool.starmap(
+                    run_worker, [(config, w) for w in range(args.processes)]
+                )
+                for s in worker_samples
+            ]
+    else:
+        samples = run_worker(config)
+    elapsed = time.perf_counter() - start
+    if server:
+        server.shutdown()
+
+    summary = summarize(samples, elapsed)
+    summary.update(
+        mode=args.mode,
+        processes=args.processes,
+        threads=args.threads,
+        mix=args.mix,
+        database=database_file,
+        instrumented=args.instrumented,
+    )
+    print_summary(summary)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument(
+        "--mode", choices=["in-process", "server"], default="in-process"
+    )
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="operation=weight,...")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--requests", type=int, default=1000, help="total requests")
+    parser.add_argument("--rows", type=int, default=100, help="Settings to seed")
+    parser.add_argument("--database", default="", help="SQLite file, default temporary")
+    parser.add_argument("--json", default="", help="write the summary to a JSON file")
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="drop the tables of a --database that holds rows",
+    )
+    parser.add_argument(
+        "--instrumented",
+        action="store_true",
+        help="install the query counter, profiler and Server-Timing",
+    )
+    run(parser.parse_args(argv))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
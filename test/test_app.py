@@ -1,17 +1,80 @@
+import csv
+import gzip
+import io
 import json
 import random
 import string
+import threading
 import time
 import unittest
+from unittest import mock
+from collections import OrderedDict
 from http import HTTPStatus
-from datetime import datetime
+from datetime import date, datetime, time as dt_time
 from pathlib import Path
 from sqlalchemy import text
 
 import flask_unittest
 
-from flask_serialize import FlaskSerializeMixin
-from test.test_flask_app import db, Setting, SubSetting, SimpleModel, DateTest
+try:
+    from opentelemetry.sdk import trace as otel_sdk
+except ImportError:
+    otel_sdk = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from flask_serialize.instrumentation import _FsInstrumentation
+from flask_serialize.properties import fs_cached_property
+from flask_serialize.related import FsRelationship
+from flask_serialize.converters import FsDateParser, FsDatetimeFormatter, FsConvertTypes
+from flask import Flask
+from flask_serialize import (
+    FlaskSerialize,
+    FlaskSerializeMixin,
+    FlaskSerializeQueryCountExceeded,
+    FlaskSerializeMemoryExporter,
+    FlaskSerializeOpenTelemetryExporter,
+    FlaskSerializeTracer,
+)
+from test.test_flask_app import (
+    db,
+    query_counter,
+    profiler,
+    create_instrumented_app,
+    uninstall_instrumented_app,
+    Setting,
+    SubSetting,
+    SimpleModel,
+    DateTest,
+    Document,
+    TimeSeries,
+    BadModel,
+    Single,
+    Category,
+    Product,
+    Purchase,
+    PurchaseLine,
+    Team,
+    Member,
+    Basket,
+    BasketItem,
+    Tag,
+    basket_tag,
+)
 
 
 def random_string(length=20):
@@ -510,6 +573,46 @@ class TestAll(TestBase):
         # explicit double conversion type
         assert item.a_date == datetime.strptime(date_value, "%Y-%m-%d")
 
+    def test_sqlite_date_time_columns(self, app, client):
+        rv = client.post(
+            "/datetest",
+            json=dict(
+                a_date="2004-05-23T10:20:30.123Z", a_day="2004-05-24", a_time="10:30"
+            ),
+        )
+        assert rv.status_code == 200, rv.data
+        item = DateTest.query.first()
+        assert item.a_date == datetime(2004, 5, 23, 10, 20, 30, 123000)
+        assert item.a_day == date(2004, 5, 24)
+        assert item.a_time == dt_time(10, 30)
+        rv = client.put(
+            f"/datetest/{item.id}",
+            json=dict(a_date="2004-05-23 20:20+10:00", a_day="2004-05-25T00:00"),
+        )
+        assert rv.status_code == 200, rv.data
+        item = DateTest.query.first()
+        assert item.a_date == datetime(2004, 5, 23, 10, 20)
+        assert item.a_day == date(2004, 5, 25)
+        rv = client.put(f"/datetest/{item.id}", json=dict(a_time="not a time"))
+        assert rv.status_code == 400
+
+    def test_date_parser(self, app, client):
+        parser = FsDateParser("datetime")
+        assert parser("2020-01-02T03:04:05.5Z") == datetime(2020, 1, 2, 3, 4, 5, 500000)
+        assert parser.last is parser.parsers[0]
+        # the parser that last succeeded is tried first
+        parser.last = parser.parsers[1]
+        assert parser("2020-01-02 03:04") == datetime(2020, 1, 2, 3, 4)
+        assert parser.last is parser.parsers[1]
+        # offset with seconds is only handled by fromisoformat
+        assert parser("2020-01-02T13:04:05+10:00:05") == datetime(2020, 1, 2, 3, 4)
+        assert parser.last is parser.parsers[0]
+        assert parser(date(2020, 1, 2)) == datetime(2020, 1, 2)
+        assert FsDateParser("time")("2020-01-02T03:04:05") == dt_time(3, 4, 5)
+        assert FsDateParser.for_column_type("VARCHAR") is None
+        with self.assertRaises(Exception):
+            parser("yesterday")
+
     def test_excluded(self, app, client):
         # create
         key = random_string()
@@ -959,6 +1062,1215 @@ class TestAll(TestBase):
         assert test_value in [item.get("value") for item in rv.json["data_items"]]
 
 
+class TestInstrumented(TestBase):
+    """
+    the test app with the query counter, profiler and server timing installed
+    """
+
+    def create_app(self):
+        instrumented = create_instrumented_app()
+        instrumented.config["TESTING"] = True
+        instrumented.config["SECRET_KEY"] = "Testing"
+        instrumented.config["WTF_CSRF_ENABLED"] = False
+        yield instrumented
+        uninstall_instrumented_app(instrumented)
+
+
+class TestQueryCount(TestInstrumented):
+    def tearDown(self, app, client):
+        query_counter.strict = query_counter.max_per_row = None
+        super().tearDown(app, client)
+
+    def test_query_count(self, app, client):
+        for n in range(2):
+            setting = TestAll.add_setting(client, key=random_string())
+            for _ in range(3):
+                setting.add_sub(random_string())
+        db.session.remove()
+        rv = client.get("/setting_get_all")
+        assert rv.status_code == 200
+        sources = dict(
+            s.split("=") for s in rv.headers["X-FS-Query-Sources"].split(", ")
+        )
+        assert sources["__get_all"] == "1", sources
+        # one lazy load per Setting, the last_sub_setting property loads sub_settings
+        assert sources["fs_as_dict:last_sub_setting"] == "2", sources
+        assert sources["fs_as_dict:single"] == "2", sources
+        assert int(rv.headers["X-FS-Query-Count"]) == sum(
+            int(c) for c in sources.values()
+        )
+        # strict
+        query_counter.max_per_row = 10
+        query_counter.strict = "raise"
+        assert client.get("/setting_get_all").status_code == 200
+        query_counter.max_per_row = 1
+        with self.assertRaises(FlaskSerializeQueryCountExceeded) as context:
+            client.get("/setting_get_all")
+        assert context.exception.summary["rows"] == 2
+        query_counter.strict = "warn"
+        with self.assertWarns(UserWarning):
+            client.get("/setting_get_all")
+
+    def test_uninstall(self, app, client):
+        from test.test_flask_app import app as test_app
+
+        # only the app of this test is instrumented
+        assert _FsInstrumentation.query_counters == 1
+        assert _FsInstrumentation.server_timings == 1
+        other = create_instrumented_app()
+        assert _FsInstrumentation.query_counters == 2
+        uninstall_instrumented_app(other)
+        assert _FsInstrumentation.query_counters == 1
+        assert _FsInstrumentation.server_timings == 1
+        with test_app.app_context():
+            db.create_all()
+        rv = test_app.test_client().get("/setting_get_all")
+        assert rv.status_code == 200
+        assert "X-FS-Query-Count" not in rv.headers
+        assert "Server-Timing" not in rv.headers
+        assert "X-FS-Query-Count" in client.get("/setting_get_all").headers
+
+
+class TestServerTiming(TestInstrumented):
+    def tearDown(self, app, client):
+        with app.app_context():
+            db.session.remove()
+
+    @staticmethod
+    def phases(rv) -> dict:
+        return {
+            p.split(";dur=")[0]: float(p.split(";dur=")[1])
+            for p in rv.headers["Server-Timing"].split(", ")
+        }
+
+    def test_server_timing(self, app, client):
+        setting = TestAll.add_setting(client, key=random_string())
+        setting.add_sub(random_string())
+        setting_id = setting.id
+        db.session.remove()
+        phases = self.phases(client.get("/setting_get_all"))
+        for phase in ["query", "hydrate", "access-check", "serialize", "encode"]:
+            assert phase in phases, phases
+        assert list(phases)[-1] == "total"
+        # exclusive times add up to no more than the total
+        assert sum(v for k, v in phases.items() if k != "total") <= phases["total"]
+
+        rv = client.post("/setting_post", data=dict(setting_type="timing", key="a"))
+        assert rv.status_code == 200
+        phases = self.phases(rv)
+        for phase in ["update", "commit", "after-commit", "serialize", "encode"]:
+            assert phase in phases, phases
+
+        rv = client.put(f"/setting_put/{setting_id}", json=dict(value="timed"))
+        assert rv.status_code == 200
+        assert "commit" in self.phases(rv)
+
+        phases = self.phases(client.delete(f"/setting_delete/{setting_id}"))
+        assert "access-check" in phases and "commit" in phases, phases
+        # routes not using the mixin are untouched
+        rv = client.get("/ping")
+        assert rv.json == dict(ok=True)
+        assert "Server-Timing" not in rv.headers
+
+
+class TestTracing(TestBase):
+    def setUp(self, app, client) -> None:
+        super().setUp(app, client)
+        self.exporter = FlaskSerializeMemoryExporter()
+        self.tracer = FlaskSerializeTracer(self.exporter)
+
+    def tearDown(self, app, client):
+        self.tracer.disable()
+        super().tearDown(app, client)
+
+    def test_tracing(self, app, client):
+        for n in range(3):
+            TestAll.add_setting(client, key=random_string())
+        creates = self.exporter.find("create")
+        assert len(creates) == 3
+        assert creates[0].attributes["flask_serialize.model"] == "Setting"
+        assert {s.name for s in self.exporter.spans if s.parent is creates[0]} >= {
+            "flask_serialize.commit",
+            "flask_serialize.after_commit",
+        }
+        self.exporter.clear()
+
+        rv = client.get("/setting_get_all")
+        assert rv.status_code == 200
+        (list_span,) = self.exporter.find("list")
+        assert list_span.attributes["flask_serialize.rows"] == 3
+        assert list_span.attributes["flask_serialize.payload_bytes"] == len(rv.data)
+        children = [s.name for s in self.exporter.spans if s.parent is list_span]
+        for name in ["query", "access", "serialize", "encode"]:
+            assert f"flask_serialize.{name}" in children, children
+
+        setting = Setting.query.first()
+        client.put(f"/setting_put/{setting.id}", json=dict(value="traced"))
+        (update,) = self.exporter.find("update")
+        assert update.parent is None
+        assert any(s.parent is update for s in self.exporter.find("commit"))
+
+        rv = client.delete(f"/setting_delete/{setting.id}")
+        assert rv.status_code == 200
+        assert len(self.exporter.find("delete")) == 1
+        client.get(f"/setting_get/{Setting.query.first().id}")
+        assert len(self.exporter.find("get")) == 1
+
+        # disabled
+        self.tracer.disable()
+        self.exporter.clear()
+        client.get("/setting_get_all")
+        assert self.exporter.spans == []
+
+    @unittest.skipUnless(otel_sdk, "opentelemetry-sdk not installed")
+    def test_open_telemetry(self, app, client):
+        from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+        from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+            InMemorySpanExporter,
+        )
+
+        TestAll.add_setting(client, key=random_string())
+        otel_exporter = InMemorySpanExporter()
+        provider = otel_sdk.TracerProvider()
+        provider.add_span_processor(SimpleSpanProcessor(otel_exporter))
+        self.tracer.exporter = FlaskSerializeOpenTelemetryExporter(
+            provider.get_tracer("test")
+        )
+        client.get("/setting_get_all")
+        spans = {span.name: span for span in otel_exporter.get_finished_spans()}
+        list_span = spans["flask_serialize.list"]
+        assert list_span.attributes["flask_serialize.rows"] == 1
+        assert spans["flask_serialize.serialize"].parent.span_id == (
+            list_span.context.span_id
+        )
+
+
+class TestProfiler(TestInstrumented):
+    def tearDown(self, app, client):
+        profiler.disable()
+        profiler.reset()
+        super().tearDown(app, client)
+
+    def test_profiler(self, app, client):
+        setting = TestAll.add_setting(client, key=random_string())
+        setting.add_sub(random_string())
+        expected = client.get("/setting_get_all").json
+        assert client.get("/fs_profile").json["models"] == {}
+
+        profiler.enable()
+        assert client.get("/setting_get_all").json == expected
+        stats = client.get("/fs_profile?reset=1").json
+        assert stats["enabled"]
+        setting_stats = stats["models"]["Setting"]
+        assert setting_stats["calls"] == 1
+        assert setting_stats["fields"]["prop_test"]["calls"] == 1
+        assert setting_stats["fields"]["prop_test"]["converter"] == (
+            "PROPERTY:FlaskSerializeMixin.__fs_property_converter__"
+        )
+        sub_settings = setting_stats["fields"]["sub_settings"]
+        assert sub_settings["total"] >= sub_settings["read_total"]
+        assert sub_settings["max"] >= 0
+        assert stats["models"]["SubSetting"]["calls"] >= 1
+        # updated and scheduled
+        date_short = "DATETIME:FlaskSerializeMixin.__fs_to_date_short__"
+        assert stats["converters"][date_short]["calls"] == 2
+        assert "DATETIME:SubSetting.__fs_to_date_short__" in stats["converters"]
+        # reset
+        assert profiler.stats()["models"] == {}
+        profiler.disable()
+        client.get("/setting_get_all")
+        assert profiler.stats()["models"] == {}
+
+
+class TestColumnSerialization(TestBase):
+    def tearDown(self, app, client):
+        with app.app_context():
+            db.session.remove()
+
+    def test_columnar_list_matches_fs_as_dict(self, app, client):
+        from test.benchmark import populate
+
+        with app.app_context():
+            populate(20, 2)
+            for model in [SubSetting, SimpleModel]:
+                items = model.query.all()
+                assert items[0]._fs_get_props().columnar
+                assert model.fs_dict_list(items) == [
+                    item._FlaskSerializeMixin__fs_as_exclude_json_dict()
+                    for item in items
+                ]
+            # fields chosen per instance are serialized a row at a time
+            assert not Setting.query.first()._fs_get_props().columnar
+
+    def test_core_read_matches_orm(self, app, client):
+        with app.app_context():
+            at = datetime(2020, 1, 2, 3, 4, 5, 678000)
+            db.session.add_all(
+                [
+                    DateTest(a_date=at, a_day=at.date(), a_time=at.time()),
+                    DateTest(a_date=None),
+                    BadModel(value="x"),
+                    Single(wang="wang"),
+                ]
+            )
+            db.session.commit()
+            for model in [DateTest, BadModel, Single]:
+                db.session.remove()
+                listed = model.fs_dict_list(model.query.order_by(model.id))
+                # no instances were hydrated
+                assert len(db.session.identity_map) == 0
+                assert listed == [
+                    item._FlaskSerializeMixin__fs_as_exclude_json_dict()
+                    for item in model.query.order_by(model.id)
+                ]
+            assert listed[0]["wang"] == "wang"
+            # instances are needed for properties and overridden access checks
+            for model in [SimpleModel, TimeSeries, SubSetting, Setting]:
+                db.session.add(model())
+                assert not model.query.first()._fs_get_props().core
+            db.session.remove()
+            with app.test_request_context():
+                data = DateTest.fs_json_list(
+                    DateTest.query.filter_by(a_date=at), output="columns"
+                ).json
+            assert data["columns"][data["fields"].index("a_date")] == [
+                "2020-01-02 03:04:05"
+            ]
+            with app.test_request_context():
+                rv = DateTest.fs_json_list(
+                    DateTest.query.order_by(DateTest.id), output="ndjson"
+                )
+                lines = rv.get_data(as_text=True).splitlines()
+            assert [json.loads(line)["id"] for line in lines] == [1, 2]
+
+    def test_json_writer_matches_provider(self, app, client):
+        with app.app_context():
+            values = ["plain", 'quo"te\\', "100% ünïcode ✓", "", "new\nline", "b"]
+            db.session.add_all([SimpleModel(value=v) for v in values])
+            db.session.add_all(
+                [
+                    TimeSeries(at=datetime(2020, 1, 2), reading=float("nan")),
+                    TimeSeries(at=datetime(2021, 1, 2), reading=1e-7),
+                    DateTest(a_date=datetime(2020, 1, 2), a_day=date(2020, 1, 2)),
+                ]
+            )
+            db.session.commit()
+            for model in [SimpleModel, TimeSeries, DateTest]:
+                with app.test_request_context():
+                    data = model.fs_json_list(model.query).get_data()
+                    expected = app.json.response(model.fs_dict_list(model.query))
+                    assert data == expected.get_data()
+            # filtered and sorted as dicts
+            SimpleModel.__fs_order_by_field_desc__ = "value"
+            try:
+                with app.test_request_context():
+                    rv = SimpleModel.fs_json_list(
+                        SimpleModel.query, prop_filters=dict(value="b", id=1)
+                    )
+            finally:
+                SimpleModel.__fs_order_by_field_desc__ = None
+            assert [i["value"] for i in rv.json] == ["plain", "b"]
+            with app.test_request_context():
+                rv = SimpleModel.fs_json_list(SimpleModel.query, output="ndjson")
+                lines = rv.get_data(as_text=True).splitlines()
+            assert lines == [
+                json.dumps(item, separators=(",", ":"), sort_keys=True)
+                for item in client.get("/simple").json
+            ]
+            # indented as the provider does in debug mode
+            app.debug = True
+            try:
+                with app.test_request_context():
+                    data = SimpleModel.fs_json_list(SimpleModel.query).get_data()
+            finally:
+                app.debug = False
+            assert data.startswith(b"[\n  {")
+
+    def test_list_format(self, app, client):
+        for n in range(3):
+            TestAll.add_setting(client, key=random_string(), value=str(n))
+            client.post("/simple_add", data=dict(value=str(n)))
+        for url in ["/setting_get_all", "/simple"]:
+            objects = client.get(url).json
+            rv = client.get(f"{url}?format=columns")
+            assert rv.status_code == 200, rv.data
+            fields, columns = rv.json["fields"], rv.json["columns"]
+            assert len(columns) == len(fields) and len(columns[0]) == len(objects)
+            assert [dict(zip(fields, row)) for row in zip(*columns)] == objects
+            rv = client.get(f"{url}?format=rows")
+            assert rv.json["fields"] == fields
+            assert [dict(zip(fields, row)) for row in rv.json["rows"]] == objects
+            # smaller than repeating the keys in every row
+            assert len(rv.data) < len(client.get(url).data)
+        # format is not a filter_by field
+        data = client.get("/setting_get_all?format=columns&value=1").json
+        assert data["columns"][data["fields"].index("value")] == ["1"]
+        assert client.get("/simple?format=xml").status_code == 400
+        # fs_json_list leaves the format arg to the route
+        with app.test_request_context("/?format=pdf"):
+            assert Setting.fs_json_list(Setting.query).status_code == 200
+            with self.assertRaises(ValueError):
+                Setting.fs_json_list(Setting.query, output="xml")
+
+    def test_reserved_arg_fields(self, app, client):
+        with app.app_context():
+            db.session.add_all(
+                [
+                    Document(name="a", format="pdf", depth=1),
+                    Document(name="b", format="csv", depth=2),
+                ]
+            )
+            db.session.commit()
+        # args naming fields of the model filter
+        rv = client.get("/document?format=csv")
+        assert rv.status_code == 200, rv.data
+        assert [d["name"] for d in rv.json] == ["b"]
+        rv = client.get("/document?depth=1")
+        assert [d["name"] for d in rv.json] == ["a"]
+        rv = client.get("/document?format=rows&depth=x")
+        assert rv.json == []
+
+    def test_datetime_format(self, app, client):
+        with app.app_context():
+            at = datetime(2020, 1, 2, 3, 4, 5, 678000)
+            db.session.add_all([TimeSeries(at=at, reading=1), TimeSeries(at=None)])
+            db.session.commit()
+            items = TimeSeries.query.order_by(TimeSeries.id).all()
+            items[1].at = None
+            epoch_ms = 1577934245678
+            assert items[0].fs_as_dict["at"] == epoch_ms
+            assert items[0].fs_as_dict["at_property"] == epoch_ms
+            listed = TimeSeries.fs_dict_list(items)
+            assert listed == [item.fs_as_dict for item in items]
+            assert listed[0]["at"] == epoch_ms and listed[1]["at"] == ""
+            # a custom converter still takes precedence
+            assert "DATETIME" not in TimeSeries.__fs_column_type_converters__
+
+        for mode, expected in [
+            ("iso", "2020-01-02T03:04:05"),
+            ("iso_us", "2020-01-02T03:04:05.678000"),
+            ("%d/%m/%Y", "02/01/2020"),
+        ]:
+            formatter = FsDatetimeFormatter(mode)
+            assert formatter(at) == expected
+            assert formatter.column([at, None]) == [expected, ""]
+        with self.assertRaises(ValueError):
+            FsDatetimeFormatter("unix")
+
+
+class TestCompileModels(TestBase):
+    def tearDown(self, app, client):
+        with app.app_context():
+            db.session.remove()
+
+    @staticmethod
+    def new_app(app):
+        # set up before its first request, as fs_init_app needs
+        new_app = Flask(__name__)
+        new_app.config.update(app.config)
+        db.init_app(new_app)
+        return new_app
+
+    def test_fs_init_app(self, app, client):
+        cache = FlaskSerializeMixin._FlaskSerializeMixin__fs_model_props
+        cache.clear()
+        models = FlaskSerializeMixin.fs_init_app(self.new_app(app))
+        assert {Setting, SubSetting, SimpleModel, DateTest, TimeSeries} <= set(models)
+        assert set(cache) == {model.__table__ for model in models}
+        props = cache[Setting.__table__]
+        with app.app_context():
+            db.session.add(Setting(key="k", setting_type="test"))
+            db.session.commit()
+            assert Setting.query.first()._fs_get_props() is props
+
+    def test_compile_on_first_request(self, app, client):
+        late_app = self.new_app(app)
+        fs_mixin = FlaskSerialize(db, late_app)
+
+        # defined after the app is set up, as models usually are
+        class LateModel(fs_mixin, db.Model):
+            id = db.Column(db.Integer, primary_key=True)
+
+        cache = FlaskSerializeMixin._FlaskSerializeMixin__fs_model_props
+        assert LateModel.__table__ not in cache
+        late_app.test_client().get("/")
+        assert LateModel.__table__ in cache
+
+    def test_concurrent_compile(self, app, client):
+        cache = FlaskSerializeMixin._FlaskSerializeMixin__fs_model_props
+        cache.pop(Setting.__table__, None)
+        barrier = threading.Barrier(8)
+        results = []
+
+        def compile_props():
+            with app.app_context():
+                barrier.wait()
+                results.append(Setting._FlaskSerializeMixin__fs_props())
+
+        threads = [threading.Thread(target=compile_props) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(results) == 8
+        assert all(props is cache[Setting.__table__] for props in results)
+
+    def test_convert_types(self, app, client):
+        defaults = dict(FlaskSerializeMixin.__fs_convert_types__)
+        with app.app_context():
+            props = Setting()._fs_get_props()
+            simple = SimpleModel()._fs_get_props()
+        # resolved per model and dialect without changing the shared defaults
+        assert FlaskSerializeMixin.__fs_convert_types__ == defaults
+        assert props.DIALECT == "sqlite"
+        convert_types = props.convert_types
+        assert convert_types.get(datetime).__name__.endswith("to_date_converter")
+        assert convert_types.get(int)("2") == 4
+        assert simple.convert_types.get(int) is None
+        with self.assertRaises(TypeError):
+            convert_types.types[int] = str
+        # nearest base class
+        assert convert_types.get(OrderedDict) is None
+        assert convert_types.lookup(OrderedDict) is convert_types.get(dict)
+        # type and str(type) keys and types not known until converted
+        registry = FsConvertTypes([{bool: 1}, {str(bool): 2, str(OrderedDict): 3}])
+        assert registry.get(bool) == 2
+        assert registry.lookup(OrderedDict) == 3
+
+
+class TestRelated(TestBase):
+    def tearDown(self, app, client):
+        with app.app_context():
+            db.session.remove()
+
+    def add_products(self):
+        categories = [Category(name="a"), Category(name="b")]
+        db.session.add_all(
+            Product(name=f"p{i}", category=categories[i % 2]) for i in range(6)
+        )
+        db.session.commit()
+
+    def test_memo(self, app, client):
+        with app.test_request_context():
+            self.add_products()
+            FlaskSerializeMixin.fs_memo_stats(reset=True)
+            items = Product.fs_dict_list(Product.query.order_by(Product.id))
+            assert items[0]["category"] == {"id": 1, "name": "a"}
+            # serialized once, each row has its own copy to alter
+            assert items[0]["category"] == items[2]["category"]
+            assert items[0]["category"] is not items[2]["category"]
+            items[0]["category"]["name"] = "x"
+            assert items[2]["category"]["name"] == "a"
+            assert FlaskSerializeMixin.fs_memo_stats() == {
+                "Category": dict(hits=4, misses=2)
+            }
+            rv = Product.fs_json_list(Product.query)
+            assert [item["category"]["name"] for item in rv.json] == list("ababab")
+            assert FlaskSerializeMixin.fs_memo_stats(reset=True) == {
+                "Category": dict(hits=8, misses=4)
+            }
+            assert FlaskSerializeMixin.fs_memo_stats() == {}
+            # outside of a response each fs_as_dict serializes its own
+            product = Product.query.first()
+            assert product.fs_as_dict["category"] is not product.fs_as_dict["category"]
+            assert FlaskSerializeMixin.fs_memo_stats() == {}
+
+    def test_on_demand(self, app, client):
+        with app.test_request_context():
+            self.add_products()
+            Category.product_count_calls = 0
+            items = Category.fs_dict_list(Category.query)
+            assert items == [dict(id=1, name="a"), dict(id=2, name="b")]
+            assert Category.product_count_calls == 0
+            items = Category.fs_dict_list(Category.query, include=["product_count"])
+            assert [item["product_count"] for item in items] == [3, 3]
+            assert Category.product_count_calls == 2
+            assert "product_count" not in Category.query.first().fs_as_dict
+
+        with app.test_request_context("/?include=product_count"):
+            rv = Product.fs_json_list(Product.query)
+            assert rv.json[0]["category"] == dict(id=1, name="a", product_count=3)
+            # serialized once per category
+            assert Category.product_count_calls == 4
+        with app.test_request_context():
+            rv = Category.fs_json_list(
+                Category.query, include=["product_count"], output="ndjson"
+            )
+            lines = [json.loads(line) for line in rv.get_data().splitlines()]
+            assert [line["product_count"] for line in lines] == [3, 3]
+
+        cache = FlaskSerializeMixin._FlaskSerializeMixin__fs_model_props
+        Category.__fs_on_demand_fields__ = ["name"]
+        cache.pop(Category.__table__)
+        try:
+            with app.app_context(), self.assertRaises(ValueError):
+                Category()._fs_get_props()
+        finally:
+            Category.__fs_on_demand_fields__ = ["product_count"]
+
+    def test_cached_property(self, app, client):
+        Category.label.cache_clear()
+        Category.label_calls = 0
+        with app.test_request_context():
+            self.add_products()
+            items = Category.fs_dict_list(Category.query, include=["label"])
+            assert [item["label"] for item in items] == ["a (3)", "b (3)"]
+            items = Category.fs_dict_list(Category.query, include=["label"])
+            assert [item["label"] for item in items] == ["a (3)", "b (3)"]
+            # converted once per row within the ttl
+            assert Category.label_calls == 2
+            assert Category.label.cache_info() == dict(hits=2, misses=2, size=2)
+            # reading the attribute is not cached
+            assert Category.query.first().label == "a (3)"
+            assert Category.label_calls == 3
+
+            # the value read is cached, converted values are not shared
+            Category.product_names.cache_clear()
+            query = Category.query.filter_by(id=1)
+            item = Category.fs_dict_list(query, include=["product_names"])[0]
+            item["product_names"].append("x")
+            item = Category.fs_dict_list(query, include=["product_names"])[0]
+            assert item["product_names"] == ["p0", "p2", "p4"]
+            assert Category.product_names.cache_info()["hits"] == 1
+
+        # related rows are serialized before they are cached, and per depth
+        Product.cached_category.cache_clear()
+        for depth in ("", "&depth=0", "", "&depth=0"):
+            with app.test_request_context(f"/?include=cached_category{depth}"):
+                items = Product.fs_dict_list(Product.query)
+                assert items[0]["cached_category"] == (
+                    {"id": 1} if depth else {"id": 1, "name": "a"}
+                )
+                # expires the related rows read, the next request has a new session
+                db.session.commit()
+        assert Product.cached_category.cache_info()["hits"] == 12
+
+        # updated through the mixin
+        rv = client.put("/category/1", data=dict(name="c"))
+        assert rv.status_code == 200
+        rv = client.get("/category?include=label")
+        assert [item["label"] for item in rv.json] == ["c (3)", "b (3)"]
+        assert Category.label_calls == 4
+        with app.test_request_context():
+            db.session.add(Product(name="p", category_id=2))
+            db.session.commit()
+            # not written through the mixin, served until the ttl
+            items = Category.fs_dict_list(Category.query, include=["label"])
+            assert items[1]["label"] == "b (3)"
+            # bounded by maxsize
+            db.session.add(Category(name="d"))
+            db.session.commit()
+            items = Category.fs_dict_list(Category.query, include=["label"])
+            assert [item["label"] for item in items] == ["c (3)", "b (3)", "d (0)"]
+            assert Category.label.cache_info()["size"] == 2
+
+        rv = client.delete("/category/3")
+        assert rv.status_code == 200
+        assert rv.json["item"]["id"] == 3
+        # the deleted row is dropped
+        assert Category.label.cache_info()["size"] == 1
+
+        with self.assertRaises(ValueError):
+            fs_cached_property(ttl=0)(lambda self: None)
+
+    def test_depth(self, app, client):
+        with app.test_request_context():
+            team = Team(name="t", members=[Member(name="a"), Member(name="b")])
+            db.session.add(team)
+            db.session.commit()
+            # objects being serialized are references
+            assert team.fs_as_dict["members"] == [
+                dict(id=1, name="a", team_id=1, team=dict(id=1)),
+                dict(id=2, name="b", team_id=1, team=dict(id=1)),
+            ]
+            assert team.members[0].fs_as_dict["team"] == dict(
+                id=1,
+                name="t",
+                members=[
+                    dict(id=1),
+                    dict(id=2, name="b", team_id=1, team=dict(id=1)),
+                ],
+            )
+            Team.__fs_relationship_depth__ = 1
+            try:
+                assert team.members[0].fs_as_dict["team"]["members"][1] == dict(
+                    id=2, name="b", team_id=1, team=dict(id=1)
+                )
+                Team.__fs_relationship_depth__ = 0
+                assert db.session.get(Member, 2).fs_as_dict["team"] == dict(
+                    id=1, name="t", members=[dict(id=1), dict(id=2)]
+                )
+            finally:
+                Team.__fs_relationship_depth__ = None
+
+        rv = client.get("/team/1?depth=0")
+        assert rv.json["members"] == [dict(id=1), dict(id=2)]
+        rv = client.get("/team?depth=1")
+        assert rv.json[0]["members"][0] == dict(
+            id=1, name="a", team_id=1, team=dict(id=1)
+        )
+        rv = client.get("/team?depth=-1")
+        assert rv.status_code == 400
+        # only the response methods reject it
+        with app.test_request_context("/?depth=-1"):
+            assert Team.fs_dict_list(Team.query)[0]["members"][1]["id"] == 2
+            assert Team.query.first().fs_as_dict["name"] == "t"
+
+
+class TestRelatedQueries(TestInstrumented):
+    """
+    relationships loaded for all the rows at once, counting the statements issued
+    """
+
+    def tearDown(self, app, client):
+        with app.app_context():
+            db.session.remove()
+
+    def add_baskets(self, baskets=2):
+        tags = [Tag(name=f"t{i}") for i in range(3)]
+        db.session.add_all(
+            Basket(
+                name=f"b{b}",
+                items=[BasketItem(name=f"b{b}i{i}") for i in range(5 - b)],
+                tags=tags[b:],
+            )
+            for b in range(baskets)
+        )
+        db.session.commit()
+
+    def test_relationship_modes(self, app, client):
+        with app.app_context():
+            self.add_baskets(3)
+            db.session.add(Team(name="t", members=[Member(), Member()]))
+            # an association row of a tag that no longer exists is not counted
+            db.session.execute(basket_tag.insert().values(basket_id=1, tag_id=99))
+            db.session.commit()
+        rv = client.get("/basket")
+        assert [b["item_count"] for b in rv.json] == [5, 4, 3]
+        sources = dict(
+            s.split("=") for s in rv.headers["X-FS-Query-Sources"].split(", ")
+        )
+        # one count query for every basket
+        assert sources["fs_as_dict:item_count"] == "1", sources
+
+        rv = client.get("/basket?items_mode=ids&tags_mode=count&item_count_mode=ids")
+        assert rv.status_code == 200, rv.data
+        assert rv.json[0]["items"] == dict(
+            items=[5, 4], total=5, next=rv.json[0]["items"]["next"]
+        )
+        assert "items_mode=ids" in rv.json[0]["items"]["next"]
+        assert [b["tags"] for b in rv.json] == [3, 2, 1]
+        assert [b["item_count"] for b in rv.json] == [
+            [1, 2, 3, 4, 5],
+            [6, 7, 8, 9],
+            [10, 11, 12],
+        ]
+        sources = dict(
+            s.split("=") for s in rv.headers["X-FS-Query-Sources"].split(", ")
+        )
+        assert sources["fs_as_dict:items"] == "2", sources
+        assert sources["fs_as_dict:tags"] == "1", sources
+        assert sources["fs_as_dict:item_count"] == "1", sources
+
+        # only the modes a relationship opts in to
+        rv = client.get("/basket?items_mode=count&tags_mode=ids")
+        assert rv.json[0]["items"]["items"][0]["name"] == "b0i4"
+        assert rv.json[0]["tags"]["items"] == [dict(id=1, name="t0")]
+        assert [b["tags"]["total"] for b in rv.json] == [3, 2, 1]
+        rv = client.get("/team/1?members_mode=count")
+        assert rv.json["members"][0]["team"] == dict(id=1)
+        with app.app_context(), self.assertRaises(ValueError):
+            FsRelationship(Basket, "items", dict(modes=["all"]))
+        # not persisted
+        with app.test_request_context("/?items_mode=ids"):
+            basket = Basket(items=[BasketItem(id=9)], tags=[])
+            assert basket.fs_as_dict["items"] == dict(items=[9], total=1, next=None)
+            assert basket.fs_as_dict["item_count"] == 0
+
+    def test_limited_relationship(self, app, client):
+        with app.app_context():
+            self.add_baskets()
+        rv = client.get("/basket/1")
+        assert rv.status_code == 200, rv.data
+        items = rv.json["items"]
+        assert [item["name"] for item in items["items"]] == ["b0i4", "b0i3"]
+        assert items["total"] == 5
+        assert items["next"] == "http://localhost/basket/1?items_offset=2"
+        items = client.get(items["next"]).json["items"]
+        assert [item["name"] for item in items["items"]] == ["b0i2", "b0i1"]
+        items = client.get(items["next"]).json["items"]
+        assert [item["name"] for item in items["items"]] == ["b0i0"]
+        assert items["next"] is None
+        # many to many
+        assert rv.json["tags"] == dict(
+            items=[dict(id=1, name="t0")],
+            total=3,
+            next="http://localhost/basket/1?tags_offset=1",
+        )
+
+        rv = client.get("/basket?items_offset=1")
+        assert rv.status_code == 200, rv.data
+        assert [b["items"]["total"] for b in rv.json] == [5, 4]
+        assert [[i["name"] for i in b["items"]["items"]] for b in rv.json] == [
+            ["b0i3", "b0i2"],
+            ["b1i2", "b1i1"],
+        ]
+        assert rv.json[1]["items"]["next"] == "http://localhost/basket?items_offset=3"
+        sources = dict(
+            s.split("=") for s in rv.headers["X-FS-Query-Sources"].split(", ")
+        )
+        # the page and the count of the items of every basket
+        assert sources["fs_as_dict:items"] == "2", sources
+        assert sources["fs_as_dict:tags"] == "2", sources
+        with app.app_context():
+            with self.assertRaises(ValueError):
+                FsRelationship(Basket, "items", dict(size=1))
+            with self.assertRaises(ValueError):
+                FsRelationship(BasketItem, "name", dict(limit=1))
+
+    def test_filtered_relationship(self, app, client):
+        with app.app_context():
+            self.add_baskets()
+            for item in BasketItem.query.filter(BasketItem.id.in_([1, 2, 6])):
+                item.active = False
+            db.session.commit()
+            assert len(db.session.get(Basket, 1).active_items) == 3
+        rv = client.get("/basket")
+        assert rv.status_code == 200, rv.data
+        # the join condition is kept, loading per basket
+        assert [[i["id"] for i in b["active_items"]["items"]] for b in rv.json] == [
+            [3, 4],
+            [7, 8],
+        ]
+        assert [b["active_items"]["total"] for b in rv.json] == [3, 3]
+        rv = client.get("/basket/1?active_items_offset=2")
+        assert rv.json["active_items"] == dict(
+            items=[dict(id=5, name="b0i4", active=True, basket_id=1)],
+            total=3,
+            next=None,
+        )
+        rv = client.get("/basket?active_items_mode=count")
+        assert [b["active_items"] for b in rv.json] == [3, 3]
+        rv = client.get("/basket/1?active_items_mode=ids&active_items_offset=2")
+        assert rv.json["active_items"] == dict(items=[5], total=3, next=None)
+
+    def add_purchases(self):
+        db.session.add_all(
+            Purchase(
+                name=f"p{p}",
+                gross=10.0 * p,
+                discount=1.5,
+                lines=[PurchaseLine(quantity=q) for q in range(1, p + 1)],
+            )
+            for p in range(3)
+        )
+        db.session.commit()
+
+    def test_expression_fields(self, app, client):
+        with app.app_context():
+            self.add_purchases()
+            item = Purchase.query.get(3).fs_as_dict
+            assert item == dict(
+                id=3,
+                name="p2",
+                gross=20.0,
+                discount=1.5,
+                line_count=2,
+                quantity=3,
+                net=18.5,
+            )
+        rv = client.get("/purchase")
+        assert rv.status_code == 200, rv.data
+        assert [(p["line_count"], p["quantity"], p["net"]) for p in rv.json] == [
+            (0, 0, -1.5),
+            (1, 1, 8.5),
+            (2, 3, 18.5),
+        ]
+        # selected with the rows
+        assert rv.headers["X-FS-Query-Count"] == "1"
+        # filtered in the database
+        rv = client.get("/purchase?line_count=1")
+        assert [p["name"] for p in rv.json] == ["p1"]
+        rv = client.get("/purchase?net=18.5")
+        assert [p["name"] for p in rv.json] == ["p2"]
+        # ordered in the database
+        Purchase.__fs_order_by_field_desc__ = "quantity"
+        try:
+            rv = client.get("/purchase?format=ndjson")
+            lines = [json.loads(line) for line in rv.get_data().splitlines()]
+            assert [line["name"] for line in lines] == ["p2", "p1", "p0"]
+        finally:
+            Purchase.__fs_order_by_field_desc__ = None
+        # not updated
+        rv = client.put("/purchase/2", json=dict(name="q", line_count=5))
+        assert rv.status_code == 200, rv.data
+        assert rv.json["item"]["name"] == "q"
+        assert rv.json["item"]["line_count"] == 1
+
+        cache = FlaskSerializeMixin._FlaskSerializeMixin__fs_model_props
+        for name in ("name", "lines", "missing"):
+            Purchase.__fs_expression_fields__ = [name]
+            cache.pop(Purchase.__table__, None)
+            try:
+                with app.app_context(), self.assertRaises(ValueError):
+                    Purchase()._fs_get_props()
+            finally:
+                Purchase.__fs_expression_fields__ = ["line_count", "quantity", "net"]
+        cache.pop(Purchase.__table__, None)
+
+
+class TestBinaryFormats(TestBase):
+    def tearDown(self, app, client):
+        with app.app_context():
+            db.session.remove()
+
+    def add_lob_setting(self, client) -> int:
+        key = random_string()
+        rv = client.post(
+            "/setting_post",
+            data=dict(setting_type="binary", key=key, lob="binary data"),
+        )
+        assert rv.status_code == 200, rv.data
+        return rv.json["id"]
+
+    @unittest.skipUnless(msgpack, "msgpack not installed")
+    def test_msgpack(self, app, client):
+        item_id = self.add_lob_setting(client)
+        as_json = client.get(f"/setting_get/{item_id}").json
+        assert as_json["lob"] == "binary data"
+
+        rv = client.get(
+            f"/setting_get/{item_id}", headers={"Accept": "application/msgpack"}
+        )
+        assert rv.status_code == 200
+        assert rv.mimetype == "application/msgpack"
+        assert "Accept" in rv.headers["Vary"]
+        item = msgpack.unpackb(rv.data)
+        # LOB values are not decoded to str
+        assert item.pop("lob") == b"binary data"
+        as_json.pop("lob")
+        assert item == as_json
+
+        rv = client.get(
+            "/setting_get_all?format=columns",
+            headers={"Accept": "application/x-msgpack"},
+        )
+        data = msgpack.unpackb(rv.data)
+        assert data["columns"][data["fields"].index("lob")] == [b"binary data"]
+        # JSON preferred
+        rv = client.get(
+            "/setting_get_all",
+            headers={"Accept": "application/json, application/msgpack;q=0.5"},
+        )
+        assert rv.mimetype == "application/json"
+        assert client.get("/setting_get_all").mimetype == "application/json"
+
+    @unittest.skipUnless(msgpack, "msgpack not installed")
+    def test_msgpack_columnar(self, app, client):
+        with app.app_context():
+            at = datetime(2020, 1, 2)
+            db.session.add(TimeSeries(at=at, reading=2.5, raw=b"\x00\x01"))
+            db.session.commit()
+            with app.test_request_context(headers={"Accept": "application/msgpack"}):
+                rv = TimeSeries.fs_json_list(TimeSeries.query)
+            (item,) = msgpack.unpackb(rv.get_data())
+            assert item["raw"] == b"\x00\x01"
+            assert item["at"] == 1577923200000 and item["reading"] == 2.5
+            # outside the response methods LOB values are still decoded
+            assert TimeSeries.query.first().fs_as_dict["raw"] == "\x00\x01"
+
+    @unittest.skipUnless(cbor2, "cbor2 not installed")
+    def test_cbor(self, app, client):
+        item_id = self.add_lob_setting(client)
+        rv = client.get(
+            f"/setting_get/{item_id}", headers={"Accept": "application/cbor"}
+        )
+        assert rv.mimetype == "application/cbor"
+        item = cbor2.loads(rv.data)
+        assert item["lob"] == b"binary data"
+        assert item["id"] == item_id
+
+
+class TestStreaming(TestBase):
+    def tearDown(self, app, client):
+        with app.app_context():
+            db.session.remove()
+
+    def test_ndjson_export(self, app, client):
+        for n in range(5):
+            TestAll.add_setting(client, key=f"k{n}", value=str(4 - n))
+            client.post("/simple_add", data=dict(value=str(n)))
+        for url in ["/setting_get_all", "/simple"]:
+            objects = client.get(url).json
+            rv = client.get(f"{url}?format=ndjson")
+            assert rv.status_code == 200, rv.data
+            assert rv.mimetype == "application/x-ndjson"
+            assert rv.is_streamed
+            lines = rv.get_data(as_text=True).splitlines()
+            assert [json.loads(line) for line in lines] == objects
+            rv = client.get(url, headers={"Accept": "application/x-ndjson"})
+            assert rv.mimetype == "application/x-ndjson"
+            assert len(rv.get_data(as_text=True).splitlines()) == len(objects)
+        # ordered by __fs_order_by_field__ in SQL and streamed in batches
+        SimpleModel.__fs_stream_batch_size__ = Setting.__fs_stream_batch_size__ = 2
+        try:
+            rv = client.get("/setting_get_all?format=ndjson")
+            values = [
+                json.loads(line)["value"]
+                for line in rv.get_data(as_text=True).splitlines()
+            ]
+            assert values == ["0", "1", "2", "3", "4"]
+            # prop_filters applied to each batch
+            rv = client.get("/setting_get_all?format=ndjson&key=k3")
+            assert [
+                json.loads(line)["value"]
+                for line in rv.get_data(as_text=True).splitlines()
+            ] == ["1"]
+        finally:
+            del SimpleModel.__fs_stream_batch_size__
+            del Setting.__fs_stream_batch_size__
+
+    def test_csv_export(self, app, client):
+        rv = client.get("/simple?format=csv")
+        assert rv.status_code == 200, rv.data
+        assert rv.get_data(as_text=True).splitlines() == ["id,value,prop"]
+        for n in range(3):
+            TestAll.add_setting(client, key=f"k{n}", value=str(n))
+            client.post("/simple_add", data=dict(value=str(n)))
+        # __fs_private_field__ key
+        TestAll.add_setting(client, key="private", value="3")
+        for url in ["/setting_get_all", "/simple"]:
+            objects = client.get(url).json
+            rv = client.get(f"{url}?format=csv")
+            assert rv.mimetype == "text/csv"
+            assert "attachment" in rv.headers["Content-Disposition"]
+            body = rv.get_data(as_text=True)
+            rows = list(csv.DictReader(io.StringIO(body)))
+            assert len(rows) == len(objects)
+            assert "updated" not in rows[0]
+            for row, item in zip(rows, objects):
+                for name, cell in row.items():
+                    value = item.get(name, "")
+                    if isinstance(value, (dict, list)):
+                        assert json.loads(cell) == value
+                    else:
+                        assert cell == str(value), name
+            rv = client.get(
+                url, headers={"Accept": "text/csv", "Accept-Encoding": "gzip"}
+            )
+            assert rv.headers["Content-Encoding"] == "gzip"
+            assert gzip.decompress(rv.data).decode() == body
+            if url == "/setting_get_all":
+                assert rows[-1]["key"] == "" and rows[-1]["value"] == "3"
+
+    @unittest.skipUnless(pyarrow, "pyarrow not installed")
+    def test_arrow_export(self, app, client):
+        for n in range(3):
+            TestAll.add_setting(client, key=f"k{n}", value=str(n))
+        TestAll.add_setting(client, key="private", value="3")
+        objects = client.get("/setting_get_all").json
+        Setting.__fs_stream_batch_size__ = 2
+        try:
+            rv = client.get("/setting_get_all?format=arrow")
+            assert rv.status_code == 200, rv.data
+            assert rv.mimetype == "application/vnd.apache.arrow.stream"
+            reader = pyarrow.ipc.open_stream(rv.data)
+            table = reader.read_all()
+            rv = client.get(
+                "/setting_get_all",
+                headers={"Accept": "application/vnd.apache.parquet"},
+            )
+            assert rv.mimetype == "application/vnd.apache.parquet"
+            assert pyarrow.parquet.read_table(io.BytesIO(rv.data)).equals(table)
+        finally:
+            del Setting.__fs_stream_batch_size__
+        assert [len(b) for b in table.to_batches()] == [2, 2]
+        assert set(table.column_names) == set(objects[0])
+        assert table.schema.field("id").type == pyarrow.int64()
+        assert table.schema.field("floaty").type == pyarrow.float64()
+        assert table.schema.field("scheduled").type == pyarrow.timestamp("us")
+        rows = table.to_pylist()
+        assert [r["value"] for r in rows] == [o["value"] for o in objects]
+        assert json.loads(rows[0]["j"]) == objects[0]["j"]
+        assert json.loads(rows[0]["single"]) == objects[0]["single"]
+        # __fs_private_field__
+        assert rows[-1]["key"] is None
+        assert client.get("/setting_get_all?format=arrow&key=k1").status_code == 200
+
+        with app.app_context():
+            at = datetime(2020, 1, 2, 3, 4, 5, 678000)
+            db.session.add(TimeSeries(at=at, reading=2.5, raw=b"\x00\x01"))
+            db.session.commit()
+            with app.test_request_context():
+                rv = TimeSeries.fs_json_list(TimeSeries.query, output="arrow")
+                (row,) = pyarrow.ipc.open_stream(rv.get_data()).read_all().to_pylist()
+            # typed values rather than __fs_datetime_format__ epoch_ms
+            assert row["at"] == at and row["reading"] == 2.5
+            assert row["raw"] == b"\x00\x01"
+
+    def test_ndjson_import(self, app, client):
+        item_id = TestAll.add_setting(client, key="existing", value="old").id
+        lines = [
+            dict(setting_type="import", key="one", value="1"),
+            "{not json",
+            dict(setting_type="import", key="devil", value="666"),
+            dict(id=item_id, setting_type="import", key="existing", value="new"),
+            [1, 2],
+            dict(setting_type="import", key="two", value="2"),
+        ]
+        body = "\n".join(
+            line if isinstance(line, str) else json.dumps(line) for line in lines
+        )
+        rv = client.post(
+            "/setting_post", data=body, content_type="application/x-ndjson"
+        )
+        assert rv.status_code == 200, rv.data
+        assert rv.json["created"] == 2 and rv.json["updated"] == 1
+        assert [e["line"] for e in rv.json["errors"]] == [2, 3, 5]
+        assert "Devils" in rv.json["errors"][1]["error"]
+        with app.app_context():
+            assert {s.key: s.value for s in Setting.query.all()} == dict(
+                existing="new", one="1", two="2"
+            )
+            # created with __fs_verify__(create=True)
+            assert Setting.query.filter_by(key="one").first().single.wang == "flang"
+
+            # an update that fails verification is not committed with the batch
+            with app.test_request_context():
+                summary = Setting.fs_ndjson_import(
+                    stream=io.BytesIO(
+                        b'{"key": "three", "setting_type": "import"}\n'
+                        + json.dumps(dict(id=item_id, key="")).encode()
+                    ),
+                    batch_size=1,
+                )
+            assert summary["created"] == 1 and summary["errors"][0]["line"] == 2
+            db.session.remove()
+            assert db.session.get(Setting, item_id).key == "existing"
+
+            # a failed __fs_after_commit__ is reported, the row stays committed
+            def after_commit(self, create=False):
+                if self.key == "four":
+                    raise Exception("after commit failed")
+
+            with app.test_request_context(), mock.patch.object(
+                Setting, "__fs_after_commit__", after_commit
+            ):
+                summary = Setting.fs_ndjson_import(
+                    stream=io.BytesIO(
+                        b'{"key": "four", "setting_type": "import"}\n'
+                        b'{"key": "five", "setting_type": "import"}'
+                    ),
+                )
+            assert summary["created"] == 2
+            assert summary["errors"] == [dict(line=1, error="after commit failed")]
+            assert Setting.query.filter_by(key="four").count() == 1
+
+    def test_ndjson_import_user(self, app, client):
+        with app.app_context():
+            db.session.add(Setting(setting_type="import", key="bob's", user="bob"))
+            db.session.commit()
+        body = "\n".join(
+            json.dumps(line)
+            for line in [
+                dict(id=1, value="pwned"),
+                dict(setting_type="import", key="alice's"),
+            ]
+        )
+        rv = client.post(
+            "/setting_user/alice", data=body, content_type="application/x-ndjson"
+        )
+        assert rv.status_code == 200, rv.data
+        # only rows of the user are updated, new rows are theirs
+        assert rv.json["updated"] == 0 and rv.json["created"] == 1
+        assert rv.json["errors"] == [dict(line=1, error="Not found")]
+        with app.app_context():
+            assert {s.key: (s.user, s.value) for s in Setting.query.all()} == {
+                "bob's": ("bob", ""),
+                "alice's": ("alice", ""),
+            }
+        rv = client.post(
+            "/setting_user/bob",
+            data=json.dumps(dict(id=1, value="own")),
+            content_type="application/x-ndjson",
+        )
+        assert rv.json["updated"] == 1
+        # routes import NDJSON when they opt in
+        rv = client.post("/simple_add", data=body, content_type="application/x-ndjson")
+        assert rv.status_code == 415
+
+
+class TestMemory(TestBase):
+    def tearDown(self, app, client):
+        with app.app_context():
+            db.session.remove()
+
+    def test_no_retained_instances(self, app, client):
+        from test.benchmark import populate, retained_instances
+
+        with app.app_context():
+            populate(10, 2)
+            for model in [Setting, SubSetting, SimpleModel]:
+                assert retained_instances(model) == 0, model
+
+    def test_list_peak_memory(self, app, client):
+        from test.benchmark import populate, measure_memory
+
+        rows = 200
+        with app.app_context():
+            populate(rows, 2)
+            # bytes per row upper bounds, about twice the measured values
+            for model, peak_per_row in [(SimpleModel, 4000), (Setting, 50000)]:
+                model.fs_dict_list(model.query)
+                peak, held, retained = measure_memory(
+                    lambda: model.fs_dict_list(model.query)
+                )
+                assert peak / rows < peak_per_row, (model, peak / rows)
+                assert retained / rows < 1000, (model, retained / rows)
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_compare_results(self):
+        from test.benchmark import compare_results
+
+        baseline = dict(
+            results=dict(
+                fast=dict(median=1.0), slow=dict(median=1.0), big=dict(peak_bytes=100)
+            )
+        )
+        current = dict(
+            results=dict(
+                fast=dict(median=1.05),
+                slow=dict(median=1.5),
+                new=dict(median=2),
+                big=dict(peak_bytes=200),
+            )
+        )
+        comparison = {c[0]: c for c in compare_results(baseline, current, 10.0)}
+        assert "new" not in comparison
+        assert not comparison["fast"][5]
+        assert comparison["slow"][5]
+        assert round(comparison["slow"][4]) == 50
+        assert comparison["big"][1] == "peak_bytes"
+        assert comparison["big"][5]
+
+
+class TestLoadTest(unittest.TestCase):
+    def test_parse_mix_and_percentiles(self):
+        from test.load_test import parse_mix, percentile, summarize
+
+        assert parse_mix("get=10,put") == {"get": 10.0, "put": 1.0}
+        with self.assertRaises(ValueError):
+            parse_mix("patch=1")
+        values = [n / 1000 for n in range(1, 101)]
+        assert percentile(values, 50) == 0.05
+        assert percentile(values, 99) == 0.099
+        assert percentile([], 99) == 0
+        summary = summarize([("get", 0.01, 200), ("get", 0.02, 500)], 1.0)
+        assert summary["routes"]["get"]["count"] == 2
+        assert summary["routes"]["get"]["errors"] == 1
+
+
 class TestVersion(unittest.TestCase):
     def test_version(self):
         version_file = "../VERSION"
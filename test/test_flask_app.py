@@ -8,6 +8,8 @@ from flask import Flask, redirect, url_for, Response, request, render_template,
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
 from flask_wtf import FlaskForm
+from sqlalchemy import func, select
+from sqlalchemy.ext.hybrid import hybrid_property
 from wtforms import (
     StringField,
     IntegerField,
@@ -22,6 +24,12 @@ from flask_serialize.flask_serialize import (
     FlaskSerializeMixin,
 )
 from flask_serialize.form_page import FormPageMixin
+from flask_serialize.properties import fs_cached_property
+from flask_serialize.instrumentation import (
+    FlaskSerializeQueryCounter,
+    FlaskSerializeProfiler,
+    FlaskSerializeServerTiming,
+)
 
 app: Flask = Flask("test_app")
 app.testing = True
@@ -33,6 +41,46 @@ db = SQLAlchemy(app)
 migrate = Migrate(app, db)
 FlaskSerializeMixin.db = db
 fs_mixin = FlaskSerialize(db)
+# installed on the apps of create_instrumented_app, the test app is not instrumented
+query_counter = FlaskSerializeQueryCounter()
+profiler = FlaskSerializeProfiler()
+server_timing = FlaskSerializeServerTiming()
+
+
+def create_instrumented_app() -> Flask:
+    """
+    a new app with the routes and config of the test app and the query counter, profiler
+    and server timing installed.  Uninstall with uninstall_instrumented_app.
+
+    :return: Flask app
+    """
+    instrumented = Flask(app.import_name, root_path=app.root_path)
+    instrumented.config.update(app.config)
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint != "static":
+            instrumented.add_url_rule(
+                rule.rule,
+                rule.endpoint,
+                app.view_functions[rule.endpoint],
+                methods=rule.methods,
+            )
+    db.init_app(instrumented)
+    query_counter.init_app(instrumented)
+    profiler.init_app(instrumented, url="/fs_profile")
+    server_timing.init_app(instrumented)
+    return instrumented
+
+
+def uninstall_instrumented_app(instrumented: Flask):
+    """
+    stop the instrumentation installed by create_instrumented_app
+
+    :param instrumented: app from create_instrumented_app
+    """
+    query_counter.uninstall(instrumented)
+    server_timing.uninstall(instrumented)
+    profiler.disable()
+
 
 # =========================
 # TINY TEST FLASK APP
@@ -72,6 +120,14 @@ def page_index(item_id=None):
     )
 
 
+@app.route("/ping", methods=["GET"])
+def route_ping():
+    """
+    a JSON route not using the mixin
+    """
+    return dict(ok=True)
+
+
 # Get all items as a json list.
 # post, put update
 # and get single
@@ -81,13 +137,13 @@ def page_index(item_id=None):
 @app.route("/setting_post/<int:item_id>", methods=["POST"])
 @app.route("/setting_put/<int:item_id>", methods=["PUT"])
 @app.route("/setting_get/<int:item_id>", methods=["GET"])
-@app.route("/setting_user/<user>", methods=["GET"])
+@app.route("/setting_user/<user>", methods=["GET", "POST"])
 @app.route("/setting_id_user/<int:item_id>/<user>", methods=["GET"])
 def route_setting_fs_get_delete_put_post(item_id=None, user=None):
     key = request.args.get("key")
     if key and request.method == "GET":
         return Setting.fs_get_delete_put_post(item_id, prop_filters={"key": key})
-    return Setting.fs_get_delete_put_post(item_id, user)
+    return Setting.fs_get_delete_put_post(item_id, user, ndjson_import=True)
 
 
 @app.route("/sub_setting_delete/<int:item_id>", methods=["DELETE"])
@@ -247,12 +303,41 @@ def route_badmodel(item_id=None):
     return BadModel.fs_get_delete_put_post(item_id)
 
 
+@app.route("/basket", methods=["GET"])
+@app.route("/basket/<int:item_id>", methods=["GET"])
+def route_basket(item_id=None):
+    return Basket.fs_get_delete_put_post(item_id)
+
+
+@app.route("/category", methods=["GET"])
+@app.route("/category/<int:item_id>", methods=["GET", "PUT", "DELETE"])
+def route_category(item_id=None):
+    return Category.fs_get_delete_put_post(item_id)
+
+
+@app.route("/purchase", methods=["GET"])
+@app.route("/purchase/<int:item_id>", methods=["GET", "PUT"])
+def route_purchase(item_id=None):
+    return Purchase.fs_get_delete_put_post(item_id)
+
+
+@app.route("/document", methods=["GET"])
+def route_document():
+    return Document.fs_get_delete_put_post()
+
+
 @app.route("/user", methods=["GET", "POST"])
 @app.route("/user/<int:item_id>", methods=["GET", "PUT", "DELETE"])
 def route_user(item_id=None):
     return User.fs_get_delete_put_post(item_id)
 
 
+@app.route("/team", methods=["GET"])
+@app.route("/team/<int:item_id>", methods=["GET"])
+def route_team(item_id=None):
+    return Team.fs_get_delete_put_post(item_id)
+
+
 @app.route("/user_add_data/<int:item_id>", methods=["POST"])
 def route_user_add_data(item_id):
     value = request.form.get("data", "")
@@ -325,16 +410,153 @@ class UserData(fs_mixin, db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
 
 
+class Team(fs_mixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120))
+    members = db.relationship("Member", backref="team", cascade="all, delete-orphan")
+
+    __fs_relationship_fields__ = ["members"]
+
+
+class Member(fs_mixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), default="member")
+    team_id = db.Column(db.Integer, db.ForeignKey("team.id"))
+
+    # back to the team that relates to this
+    __fs_relationship_fields__ = ["team"]
+
+
 class Single(fs_mixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     wang = db.Column(db.String(120), default="wang")
     setting_id = db.Column(db.Integer, db.ForeignKey("setting.id"))
 
 
+class Category(fs_mixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), default="category")
+
+    __fs_on_demand_fields__ = ["product_count", "label", "product_names"]
+    # times product_count and label have been evaluated
+    product_count_calls = 0
+    label_calls = 0
+
+    @property
+    def product_count(self):
+        Category.product_count_calls += 1
+        return Product.query.filter_by(category_id=self.id).count()
+
+    @fs_cached_property(ttl=60, maxsize=2)
+    def label(self):
+        Category.label_calls += 1
+        return f"{self.name} ({Product.query.filter_by(category_id=self.id).count()})"
+
+    @fs_cached_property(ttl=60)
+    def product_names(self):
+        return [p.name for p in Product.query.filter_by(category_id=self.id)]
+
+
+class Product(fs_mixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), default="product")
+    category_id = db.Column(db.Integer, db.ForeignKey("category.id"))
+    category = db.relationship("Category")
+
+    __fs_relationship_fields__ = ["category"]
+    __fs_on_demand_fields__ = ["cached_category"]
+
+    @fs_cached_property(ttl=60)
+    def cached_category(self):
+        return self.category
+
+
+basket_tag = db.Table(
+    "basket_tag",
+    db.Column("basket_id", db.Integer, db.ForeignKey("basket.id")),
+    db.Column("tag_id", db.Integer, db.ForeignKey("tag.id")),
+)
+
+
+class Tag(fs_mixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), default="tag")
+
+
+class BasketItem(fs_mixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), default="item")
+    active = db.Column(db.Boolean, default=True)
+    basket_id = db.Column(db.Integer, db.ForeignKey("basket.id"))
+
+
+class Basket(fs_mixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), default="basket")
+    items = db.relationship("BasketItem")
+    tags = db.relationship("Tag", secondary=basket_tag)
+    item_count = db.relationship("BasketItem", viewonly=True)
+    # joined by more than the foreign key
+    active_items = db.relationship(
+        "BasketItem",
+        primaryjoin="and_(Basket.id == BasketItem.basket_id, BasketItem.active)",
+        viewonly=True,
+    )
+
+    # loaded a page at a time
+    __fs_relationship_fields__ = [
+        ("items", dict(limit=2, order_by="-id", modes=["ids"])),
+        ("tags", dict(limit=1, modes=["count"])),
+        ("item_count", dict(mode="count", modes=["ids"])),
+        ("active_items", dict(limit=2, modes=["ids", "count"])),
+    ]
+
+
+class PurchaseLine(fs_mixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    purchase_id = db.Column(db.Integer, db.ForeignKey("purchase.id"))
+    quantity = db.Column(db.Integer, default=1)
+
+
+class Purchase(fs_mixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), default="purchase")
+    gross = db.Column(db.Float, default=0.0)
+    discount = db.Column(db.Float, default=0.0)
+    lines = db.relationship("PurchaseLine")
+    # correlated subqueries selected with the row
+    line_count = db.column_property(
+        select(func.count(PurchaseLine.id))
+        .where(PurchaseLine.purchase_id == id)
+        .scalar_subquery()
+    )
+    quantity = db.column_property(
+        select(func.coalesce(func.sum(PurchaseLine.quantity), 0))
+        .where(PurchaseLine.purchase_id == id)
+        .scalar_subquery()
+    )
+
+    @hybrid_property
+    def net(self):
+        return self.gross - self.discount
+
+    __fs_expression_fields__ = ["line_count", "quantity", "net"]
+
+
+class Document(fs_mixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), default="document")
+    # named as request args of the mixin
+    format = db.Column(db.String(10), default="pdf")
+    depth = db.Column(db.Integer, default=0)
+
+
 class DateTest(fs_mixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     a_date = db.Column(db.DateTime, default=datetime.utcnow)
-    __fs_update_fields__ = __fs_create_fields__ = ["a_date"]
+    a_day = db.Column(db.Date)
+    a_time = db.Column(db.Time)
+    __fs_update_fields__ = __fs_create_fields__ = ["a_date", "a_day", "a_time"]
 
 
 class Setting(FlaskSerializeMixin, FormPageMixin, db.Model):
@@ -520,6 +742,18 @@ class SimpleModel(fs_mixin, db.Model):
         return "<SimpleModel %r>" % (self.value)
 
 
+class TimeSeries(fs_mixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    at = db.Column(db.DateTime, default=datetime.utcnow)
+    reading = db.Column(db.Float, default=0.0)
+    raw = db.Column(db.LargeBinary)
+    __fs_datetime_format__ = "epoch_ms"
+
+    @property
+    def at_property(self):
+        return self.at
+
+
 class BadModel(fs_mixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     value = db.Column(db.String(30), default="")